@@ -1,9 +1,11 @@
 """Главная структура агента"""
-from agent.prompts.prompts import history_prompt, sys_prompt
+from agent.prompts.prompts import history_prompt, sys_prompt, prompt_relevance_step
 from agent.memory.get_prompts import get_history_prompt, final_answer
-from agent.parsing.parsing_state import post_form_instrument
-from agent.parsing.parsing_llm import ParseLLM
-from tools.tools import run_tools
+from agent.parsing.parsing_state import post_form_instrument, tool_keys
+from agent.parsing.parsing_llm import ParseLLM, answer_not_relevant
+from agent.tools.relevance import log_verdict
+from agent.tools.settings import AGENT_MAX_PARALLEL_TOOLS
+from tools.tools import run_tools, run_tools_parallel
 from loguru import logger
 
 
@@ -15,25 +17,48 @@ def main_agent(data: dict):
     parsing = ParseLLM()
     
     prompt = get_history_prompt(state, history_prompt, tools, query)
+    check_relevance = state.check_relevance
+    if check_relevance:
+        prompt += prompt_relevance_step
     answer_llm = parsing.get_main_answer_agent(
         new_prompt=prompt,
         prompt=sys_prompt
     )
+    if check_relevance:
+        state.check_relevance = False
+        verdict = answer_llm["Релевантность"]
+        if isinstance(verdict, str):
+            log_verdict(query, verdict.strip().lower() == "релевантные", source="agent.step")
+        if isinstance(verdict, str) and verdict.strip().lower() == "не релевантные":
+            logger.info(f"Первый шаг: запрос не релевантен ({answer_llm['Причина']})")
+            state.score = "not_relevant"
+            state.final = answer_llm["Ответ"] or answer_not_relevant(str(answer_llm["Причина"]))
+            return {
+                "user_query": query
+            }
     
     action_input = answer_llm["Инструмент"]
     state.thought = answer_llm["Мысли"]
     logger.info(f"Action: {action_input}")
     logger.info(f"Thought: {state.thought}")
     
-    name_tool = action_input.get("name_tool")
-    if name_tool and name_tool != "answer":
-        if name_tool in ("search_content", "create_repo"):
-            action_input["query"] = query
-            output_tool = run_tools(content=action_input)
-            post_form_instrument(action_input, output_tool, state)
+    # Один шаг может вернуть список независимых инструментов
+    actions = action_input if isinstance(action_input, list) else [action_input]
+    actions = [a for a in actions if isinstance(a, dict) and a.get("name_tool")]
+    to_run = [a for a in actions if a["name_tool"] != "answer"]
+    if to_run:
+        for action in to_run:
+            if action["name_tool"] in ("search_content", "create_repo"):
+                action["query"] = query
+        outputs = run_tools_parallel(to_run, max_workers=AGENT_MAX_PARALLEL_TOOLS)
+        state.tool_calls.extend(to_run)
+        # Несколько вызовов одного инструмента в шаге (два read_file) сохраняются раздельно
+        for action, output_tool, key in zip(to_run, outputs, tool_keys(to_run)):
+            post_form_instrument(action, output_tool, state, key)
+        # answer вместе с инструментами или поиск - после выполнения сразу финальный ответ
+        if len(to_run) < len(actions) or any(a["name_tool"] in ("search_content", "create_repo") for a in to_run):
             return final_answer(query, state)
-        output_tool = run_tools(content=action_input)
-        post_form_instrument(action_input, output_tool, state)
+        # Лимит считает шаги планирования, а не выполненные инструменты
         state.count_add()
         if state.count_steps == 7:
             logger.info("Достигнут максимум шагов (7)")
@@ -41,13 +66,14 @@ def main_agent(data: dict):
         return {
             "user_query": query
         }
-    elif name_tool and name_tool == "answer":
+    elif actions:
+        # Сразу answer на первом шаге - поиск по базе знаний
         if state.count_steps == 0:
             output_tool = run_tools(content={
                 "name_tool": "search_content",
                 "query": query
             })
-            post_form_instrument(action_input, output_tool, state)
+            post_form_instrument(actions[0], output_tool, state)
             return final_answer(query, state)
         return final_answer(query, state)
     return {
@@ -1,7 +1,9 @@
 """История и получение промптов"""
 from agent.memory.memory_state import State
 from agent.prompts.prompts import sys_final_answer
-from agent.tools.run_giga import llm
+from agent.memory.prompt_budget import PromptBudget
+from agent.tools.run_giga import llm, llm_stream
+from loguru import logger
 
 
 def get_history_prompt(
@@ -14,9 +16,12 @@ def get_history_prompt(
     tools_out = ""
     empty = "Инструменты не использовались"
     get_tools = state.history_tools
+    budget = PromptBudget()
     if get_tools:
         for name_tool, out_tool in get_tools.items():
+            out_tool = budget.fit(name_tool, out_tool, budget.history_budget)
             tools_out += f"Получен ответ от инструмента: **{name_tool}**\n{out_tool}\n{'-'*80}\n"
+    state.tokens_saved += budget.saved
     new_prompt = prompt.format(
         question=quest,
         tools=tools,
@@ -25,29 +30,65 @@ def get_history_prompt(
     return new_prompt
 
 
-def final_answer(query: str, state: State) -> dict:
-    """Формирование финального ответа от агента"""
+def get_final_prompt(query: str, state: State) -> str:
+    """Системный промпт финального ответа по результатам инструментов"""
     awer = "Вернуть статус генерации readme.md. Объяснить что нужно заменить данные, которые выделены красным на свои."
     awerage_repo = "Дай подробный отчет оценки ОФОРМЛЕНИЯ репозитория. Верни все комментарии, расскажи обо всех ошибках и дай рекомендации по их исправлению."
     score_repo_code = "Выведи структурированную таблицу по оценке кода. А так же предложи исправить код в репозитории, если код не соответствует стандартам."
     dop_inst = ""
-    if state.result_tools.get("search_content"):
-        state.final = state.result_tools.get("search_content")
-        return {"final_answer": state.result_tools.get("search_content")}
-    if state.result_tools.get("gen_readme"):
+    used = {key.split(" ", 1)[0] for key, out in state.result_tools.items() if out}
+    if "gen_readme" in used:
         dop_inst += f"\n- {awer}"
-    if state.result_tools.get("awerage_repo"):
+    if "awerage_repo" in used:
         dop_inst += f"\n- {awerage_repo}"
-    if state.result_tools.get("rate_repository"):
+    if "rate_repository" in used:
         dop_inst += f"\n- {score_repo_code}"
     tools = ""
-    for name_tool, out in state.result_tools.items():
+    budget = PromptBudget()
+    outputs = budget.fit_all(state.result_tools, budget.final_budget)
+    for name_tool, out in outputs.items():
         tools += f"*Инструмент: {name_tool}*\n\n{out}\n{'-'*80}\n\n"
-    final_prompt = sys_final_answer.format(
+    state.tokens_saved += budget.saved
+    if state.tokens_saved:
+        logger.info(f"Бюджет промптов: сэкономлено ~{state.tokens_saved} токенов")
+    return sys_final_answer.format(
         query_user=query,
         run_tools=tools,
         dop=dop_inst,
     )
-    fi_answer = llm(f"Верни структурированный ответ на запрос пользователя в формате Markdown. Последнее действие: {state.thought}", final_prompt)
+
+
+def get_final_query(state: State) -> str:
+    """Запрос на финальный ответ"""
+    return f"Верни структурированный ответ на запрос пользователя в формате Markdown. Последнее действие: {state.thought}"
+
+
+def final_answer(query: str, state: State) -> dict:
+    """Формирование финального ответа от агента"""
+    if state.on_token:
+        return final_answer_stream(query, state)
+    if state.result_tools.get("search_content"):
+        state.final = state.result_tools.get("search_content")
+        return {"final_answer": state.result_tools.get("search_content")}
+    fi_answer = llm(get_final_query(state), get_final_prompt(query, state), call_site="final_answer")
     state.final = fi_answer
     return {"final_answer": fi_answer}
+
+
+def final_answer_stream(query: str, state: State) -> dict:
+    """Финальный ответ с передачей фрагментов в state.on_token по мере генерации"""
+    if state.result_tools.get("search_content"):
+        state.final = state.result_tools.get("search_content")
+        state.on_token(state.final)
+        return {"final_answer": state.final}
+    parts = []
+    for piece in llm_stream(
+        get_final_query(state),
+        get_final_prompt(query, state),
+        call_site="final_answer",
+        metrics=state.stream_metrics
+    ):
+        parts.append(piece)
+        state.on_token(piece)
+    state.final = "".join(parts)
+    return {"final_answer": state.final}
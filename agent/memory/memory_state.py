@@ -19,6 +19,20 @@ class State(ParseLLM):
         self.prompt_tokens = -1
         self.completion_tokens = -1
         self.total_tokens = -1
+        self.tokens_saved = 0
+        self.on_token = None
+        self.check_relevance = False
+        self.plan = []
+        self.plan_failed = []
+        self.replans = 0
+        self.tool_calls = []
+        self.stream_metrics = {}
+
+    def __getstate__(self) -> dict:
+        """Состояние для checkpoint графа: callback потоковой выдачи не сохраняется"""
+        data = dict(self.__dict__)
+        data["on_token"] = None
+        return data
 
     def count_add(self) -> None:
         """Увеличить счётчик шагов"""
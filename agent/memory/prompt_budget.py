@@ -0,0 +1,149 @@
+"""Сборка промптов в пределах бюджета токенов
+
+Выводы инструментов (отчёты линтеров, содержимое файлов, черновики README)
+ужимаются до бюджета секции: у markdown отчётов сохраняются заголовки,
+таблицы и строки с оценками, у остальных - начало и конец текста.
+"""
+from agent.tools.settings import (
+    PROMPT_HISTORY_BUDGET,
+    PROMPT_FINAL_BUDGET,
+    PROMPT_HEAD_RATIO,
+)
+import re
+
+TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+def estimate_tokens(text: str) -> int:
+    """Быстрая локальная оценка числа токенов
+
+    Короткие слова и знаки препинания - один токен, длинные слова
+    (в т.ч. кириллица и идентификаторы) дробятся примерно по 5 символов.
+    """
+    if not text:
+        return 0
+    return sum(1 + (len(t) - 1) // 5 for t in TOKEN_RE.findall(text))
+
+
+def head_tail(text: str, budget: int, head_ratio: float = PROMPT_HEAD_RATIO) -> str:
+    """Оставить начало и конец текста по границам строк"""
+    if estimate_tokens(text) <= budget:
+        return text
+    lines = text.splitlines()
+    head_budget = int(budget * head_ratio)
+    tail_budget = budget - head_budget
+    head, tail = [], []
+    used = 0
+    for line in lines:
+        cost = estimate_tokens(line) + 1
+        if used + cost > head_budget:
+            break
+        head.append(line)
+        used += cost
+    used = 0
+    for line in reversed(lines[len(head):]):
+        cost = estimate_tokens(line) + 1
+        if used + cost > tail_budget:
+            break
+        tail.append(line)
+        used += cost
+    tail.reverse()
+    skipped = len(lines) - len(head) - len(tail)
+    if not head and not tail:
+        # Одна огромная строка - режем по символам
+        chars = max(budget * 3, 1)
+        return f"{text[:int(chars * head_ratio)]}\n[... текст сокращён ...]\n{text[-int(chars * (1 - head_ratio)):]}"
+    return "\n".join(head + [f"[... пропущено строк: {skipped} ...]"] + tail)
+
+
+def markdown_outline(text: str, budget: int) -> str:
+    """Сводка markdown отчёта: заголовки, таблицы и строки с оценками
+
+    Отчёт без такой структуры сокращается по началу и концу; если сводка
+    занимает меньше половины бюджета, остаток добирается тем же способом.
+    """
+    if estimate_tokens(text) <= budget:
+        return text
+    keep = [
+        line for line in text.splitlines()
+        if line.lstrip().startswith(("#", "|", "**")) or re.search(r"\d+\s*/\s*\d+", line)
+    ]
+    if not keep:
+        return head_tail(text, budget)
+    outline = head_tail("\n".join(keep), budget)
+    rest = budget - estimate_tokens(outline)
+    if rest <= budget // 2:
+        return outline
+    return outline + "\n[... фрагменты отчёта ...]\n" + head_tail(text, rest - 8)
+
+
+def fit_prompt(prompt: str, query: str, limit: int) -> tuple:
+    """Ужать системный промпт и запрос до limit токенов перед отправкой
+
+    Сокращается более длинная часть, при необходимости - обе.
+    Возвращает (prompt, query, сэкономлено токенов).
+    """
+    prompt_tokens, query_tokens = estimate_tokens(prompt), estimate_tokens(query)
+    before = prompt_tokens + query_tokens
+    if before <= limit:
+        return prompt, query, 0
+    if prompt_tokens >= query_tokens:
+        prompt = head_tail(prompt, max(limit - query_tokens, limit // 2))
+    else:
+        query = head_tail(query, max(limit - prompt_tokens, limit // 2))
+    if estimate_tokens(prompt) + estimate_tokens(query) > limit:
+        prompt = head_tail(prompt, limit // 2)
+        query = head_tail(query, limit - estimate_tokens(prompt))
+    return prompt, query, before - estimate_tokens(prompt) - estimate_tokens(query)
+
+
+# Политика сокращения вывода для каждого инструмента
+TOOL_POLICIES = {
+    "rate_repository": markdown_outline,
+    "awerage_repo": markdown_outline,
+    "gen_readme": head_tail,
+    "read_file": head_tail,
+    "show_files": head_tail,
+    "search_content": head_tail,
+}
+
+
+class PromptBudget:
+    """Ограничение секций промпта по токенам с подсчётом сэкономленного"""
+
+    def __init__(
+        self,
+        history_budget: int = PROMPT_HISTORY_BUDGET,
+        final_budget: int = PROMPT_FINAL_BUDGET
+    ):
+        self.history_budget = history_budget
+        self.final_budget = final_budget
+        self.saved = 0
+
+    def fit(self, name_tool: str, text: str, budget: int) -> str:
+        """Ужать вывод инструмента до budget токенов"""
+        text = str(text)
+        before = estimate_tokens(text)
+        if before <= budget:
+            return text
+        # Ключ повторного вызова в шаге - "имя {параметры}"
+        policy = TOOL_POLICIES.get(name_tool.split(" ", 1)[0], head_tail)
+        result = policy(text, budget)
+        self.saved += before - estimate_tokens(result)
+        return result
+
+    def fit_all(self, outputs: dict, budget: int) -> dict:
+        """Разделить бюджет секции между инструментами
+
+        Неиспользованный остаток коротких выводов переходит к длинным.
+        """
+        if not outputs:
+            return {}
+        sizes = {name: estimate_tokens(str(out)) for name, out in outputs.items()}
+        result = {}
+        left = budget
+        for count, name in enumerate(sorted(outputs, key=sizes.get), start=1):
+            share = left // (len(outputs) - count + 1)
+            result[name] = self.fit(name, outputs[name], share)
+            left -= min(sizes[name], share)
+        return {name: result[name] for name in outputs}
@@ -0,0 +1,184 @@
+"""Журнал запусков агента для возобновления после сбоя
+
+Граф агента сохраняет State после каждого узла в SQLite checkpointer
+(agent.state_graph.graph); журнал хранит параметры запуска и успешные
+ответы инструментов по точным параметрам вызова. Возобновлённый запуск
+продолжает граф с последнего сохранённого узла, а инструменты, успевшие
+выполниться в упавшем узле, берутся из журнала без повторного запуска.
+Успешно завершённый запуск удаляется из журнала и checkpointer.
+"""
+from agent.tools.settings import CHECKPOINT_ENABLED, CHECKPOINT_PATH, CHECKPOINT_TTL
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from loguru import logger
+from time import time
+import threading
+import sqlite3
+import json
+
+# Запуск агента текущего контекста
+CURRENT_RUN = ContextVar("agent_run", default=None)
+
+
+def call_key(content: dict) -> str:
+    """Ключ вызова инструмента: все параметры, кроме служебных"""
+    args = {k: v for k, v in content.items() if k != "prefetched"}
+    return json.dumps(args, ensure_ascii=False, sort_keys=True, default=str)
+
+
+class RunJournal:
+    """Параметры запусков и ответы их инструментов в SQLite"""
+
+    def __init__(self, path: str = CHECKPOINT_PATH, ttl: float = CHECKPOINT_TTL, enabled: bool = CHECKPOINT_ENABLED):
+        self.path = Path(path) if path else None
+        self.ttl = ttl
+        self.enabled = enabled and self.path is not None
+        self._lock = threading.Lock()
+        self._db_ready = False
+        self.counters = {"started": 0, "finished": 0, "failed": 0, "resumed": 0, "tool_hits": 0}
+
+    @contextmanager
+    def _connect(self):
+        """Соединение с SQLite: commit и закрытие по выходу"""
+        if not self._db_ready:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            if not self._db_ready:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS agent_runs ("
+                    "run_id TEXT PRIMARY KEY, task TEXT, mode TEXT, session_id TEXT, "
+                    "status TEXT, created REAL, updated REAL)"
+                )
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS agent_run_tools ("
+                    "run_id TEXT, key TEXT, output TEXT, PRIMARY KEY (run_id, key))"
+                )
+                self._db_ready = True
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    def start(self, run_id: str, task: str, mode: str, session_id: str = None) -> None:
+        """Записать новый запуск и удалить запуски старше ttl"""
+        if not self.enabled:
+            return
+        now = time()
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO agent_runs VALUES (?, ?, ?, ?, 'running', ?, ?)",
+                    (run_id, task, mode, session_id or "", now, now)
+                )
+                expired = [r[0] for r in conn.execute(
+                    "SELECT run_id FROM agent_runs WHERE updated < ?", (now - self.ttl,)
+                ).fetchall()]
+            for old_id in expired:
+                self.forget(old_id)
+        except sqlite3.Error as e:
+            logger.warning(f"Ошибка записи запуска {run_id}: {e}")
+        self._count("started")
+
+    def get(self, run_id: str):
+        """Параметры запуска {task, mode, session_id, status} или None"""
+        if not self.enabled:
+            return None
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT task, mode, session_id, status FROM agent_runs WHERE run_id = ?", (run_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"task": row[0], "mode": row[1], "session_id": row[2] or None, "status": row[3]}
+
+    def mark(self, run_id: str, status: str) -> None:
+        """Статус запуска: running, failed, resumed"""
+        if not self.enabled:
+            return
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "UPDATE agent_runs SET status = ?, updated = ? WHERE run_id = ?", (status, time(), run_id)
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Ошибка записи статуса запуска {run_id}: {e}")
+        if status in self.counters:
+            self._count(status)
+
+    def finish(self, run_id: str) -> None:
+        """Запуск завершён: возобновлять нечего"""
+        if not self.enabled:
+            return
+        self._count("finished")
+        self.forget(run_id)
+
+    def forget(self, run_id: str) -> None:
+        """Удалить запуск, ответы его инструментов и checkpoints графа"""
+        if not self.enabled:
+            return
+        from agent.state_graph.graph import clear_checkpoint
+        try:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM agent_runs WHERE run_id = ?", (run_id,))
+                conn.execute("DELETE FROM agent_run_tools WHERE run_id = ?", (run_id,))
+            clear_checkpoint(run_id)
+        except sqlite3.Error as e:
+            logger.warning(f"Ошибка удаления запуска {run_id}: {e}")
+
+    @contextmanager
+    def use(self, run_id: str):
+        """Запуск для инструментов внутри блока"""
+        token = CURRENT_RUN.set(run_id if self.enabled else None)
+        try:
+            yield run_id
+        finally:
+            CURRENT_RUN.reset(token)
+
+    def lookup(self, content: dict):
+        """Ответ инструмента, уже полученный в текущем запуске, или None"""
+        run_id = CURRENT_RUN.get()
+        if run_id is None:
+            return None
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT output FROM agent_run_tools WHERE run_id = ? AND key = ?", (run_id, call_key(content))
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Ошибка чтения журнала запуска {run_id}: {e}")
+            return None
+        if row is None:
+            return None
+        self._count("tool_hits")
+        return json.loads(row[0])
+
+    def remember(self, content: dict, output: dict) -> None:
+        """Сохранить успешный ответ инструмента текущего запуска"""
+        run_id = CURRENT_RUN.get()
+        if run_id is None or not isinstance(output, dict) or output.get("status") != 200:
+            return
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO agent_run_tools VALUES (?, ?, ?)",
+                    (run_id, call_key(content), json.dumps(output, ensure_ascii=False, default=str))
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Ошибка записи журнала запуска {run_id}: {e}")
+
+    def stats(self) -> dict:
+        """Запуски, возобновления и инструменты, взятые из журнала"""
+        with self._lock:
+            result = dict(self.counters)
+        result["enabled"] = self.enabled
+        return result
+
+
+JOURNAL = RunJournal()
@@ -0,0 +1,279 @@
+"""Многоходовые сессии агента: память в процессе + SQLite на диске
+
+Сессия хранит результаты инструментов предыдущих запросов (по точным
+параметрам вызова) и найденные документы. Новый запрос сессии начинает
+с этими результатами в истории, а повторный вызов инструмента с теми же
+параметрами берёт готовый ответ вместо запуска. search_content и
+create_repo зависят от текста запроса и не сохраняются; инструменты
+репозитория (tools.tool_memo) проверяются по голове ветки при каждом
+вызове и тоже не переносятся между запросами сессии.
+
+Сессии - LRU в памяти (AGENT_SESSIONS_IN_MEMORY) с записью каждой
+сессии в SQLite: вытесненная из памяти сессия подгружается с диска,
+сессии без обращений дольше AGENT_SESSION_TTL удаляются с обоих уровней.
+"""
+from agent.tools.settings import (
+    SESSION_DB_PATH,
+    SESSION_TTL,
+    SESSIONS_IN_MEMORY,
+    SESSION_MAX_TOOLS,
+    SESSION_MAX_CHARS,
+)
+from tools.tool_memo import TOOL_SOURCES
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from loguru import logger
+from time import time
+import threading
+import sqlite3
+import json
+
+# Инструменты, ответ которых зависит от текста запроса (search_content,
+# create_repo) или от текущего состояния ветки (read_file)
+NOT_REUSED = ("search_content", "create_repo", "read_file")
+
+# Сессия текущего запуска агента
+CURRENT_SESSION = ContextVar("agent_session", default=None)
+
+
+def reused(name_tool: str) -> bool:
+    """Хранится ли ответ инструмента в сессии"""
+    return name_tool not in NOT_REUSED and name_tool not in TOOL_SOURCES
+
+
+def tool_key(content: dict) -> str:
+    """Ключ вызова инструмента: имя и параметры без служебных полей"""
+    args = {k: v for k, v in content.items() if k not in ("query", "prefetched")}
+    return json.dumps(args, ensure_ascii=False, sort_keys=True, default=str)
+
+
+class AgentSession:
+    """Состояние диалога: результаты инструментов и найденные документы"""
+
+    def __init__(self, session_id: str, tools: list = None, relevant_doc: dict = None, turns: int = 0):
+        self.session_id = session_id
+        self.tools = OrderedDict((tool_key(t["content"]), t) for t in tools or [])
+        self.relevant_doc = relevant_doc or {}
+        self.turns = turns
+        self.accessed = time()
+        self.lock = threading.Lock()
+
+    def lookup(self, content: dict):
+        """Ответ инструмента с теми же параметрами из прошлых запросов или None"""
+        if not reused(content.get("name_tool")):
+            return None
+        with self.lock:
+            item = self.tools.get(tool_key(content))
+            return item["output"] if item else None
+
+    def remember(self, content: dict, output: dict) -> None:
+        """Сохранить успешный ответ инструмента"""
+        if not reused(content.get("name_tool")) or not isinstance(output, dict) or output.get("status") != 200:
+            return
+        content = {k: v for k, v in content.items() if k != "prefetched"}
+        key = tool_key(content)
+        with self.lock:
+            self.tools[key] = {"content": content, "output": output}
+            self.tools.move_to_end(key)
+            self._trim()
+
+    def _trim(self) -> None:
+        """Старые результаты вытесняются сверх лимита числа и размера"""
+        while len(self.tools) > SESSION_MAX_TOOLS:
+            self.tools.popitem(last=False)
+        while self.tools and len(json.dumps(list(self.tools.values()), ensure_ascii=False, default=str)) > SESSION_MAX_CHARS:
+            self.tools.popitem(last=False)
+
+    def seed(self, state) -> None:
+        """Перенести результаты прошлых запросов в новое состояние агента"""
+        from agent.parsing.parsing_state import post_form_instrument, tool_keys
+        with self.lock:
+            # Сессии, сохранённые до исключения инструментов репозитория
+            items = [item for item in self.tools.values() if reused(item["content"]["name_tool"])]
+            relevant_doc = dict(self.relevant_doc)
+        for item, key in zip(items, tool_keys([item["content"] for item in items])):
+            content = item["content"]
+            post_form_instrument(content, item["output"], state, key)
+            args = {k: v for k, v in content.items() if k not in ("name_tool", "query")}
+            state.history_tools[key] = (
+                f"(ранее в сессии, параметры {json.dumps(args, ensure_ascii=False, default=str)}) "
+                + state.history_tools[key]
+            )
+        if relevant_doc:
+            state.relevant_doc = relevant_doc
+
+    def absorb(self, state) -> None:
+        """Запомнить найденные документы после запроса"""
+        with self.lock:
+            if state.relevant_doc:
+                self.relevant_doc = dict(state.relevant_doc)
+            self.turns += 1
+
+    def to_json(self) -> str:
+        with self.lock:
+            return json.dumps({
+                "tools": list(self.tools.values()),
+                "relevant_doc": self.relevant_doc,
+                "turns": self.turns,
+            }, ensure_ascii=False, default=str)
+
+    @classmethod
+    def from_json(cls, session_id: str, raw: str) -> "AgentSession":
+        data = json.loads(raw)
+        return cls(session_id, data.get("tools"), data.get("relevant_doc"), data.get("turns", 0))
+
+
+class SessionStore:
+    """Сессии по идентификатору: LRU в памяти и SQLite с TTL простоя"""
+
+    def __init__(
+        self,
+        path: str = SESSION_DB_PATH,
+        ttl: float = SESSION_TTL,
+        memory_size: int = SESSIONS_IN_MEMORY
+    ):
+        self.path = Path(path) if path else None
+        self.ttl = ttl
+        self.memory_size = memory_size
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_ready = False
+        self.counters = {"created": 0, "memory_hits": 0, "disk_hits": 0, "evicted": 0, "tool_hits": 0, "tool_misses": 0}
+
+    @contextmanager
+    def _connect(self):
+        """Соединение с SQLite: commit и закрытие по выходу"""
+        if not self._db_ready:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            if not self._db_ready:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS agent_sessions ("
+                    "session_id TEXT PRIMARY KEY, state TEXT, accessed REAL)"
+                )
+                self._db_ready = True
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    def _evict_idle(self) -> None:
+        """Удалить из памяти сессии без обращений дольше ttl"""
+        deadline = time() - self.ttl
+        with self._lock:
+            for session_id in [s for s, item in self._memory.items() if item.accessed < deadline]:
+                del self._memory[session_id]
+                self.counters["evicted"] += 1
+
+    def _memory_put(self, session: AgentSession) -> None:
+        with self._lock:
+            self._memory[session.session_id] = session
+            self._memory.move_to_end(session.session_id)
+            # Вытесненные сессии остаются в SQLite
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def get(self, session_id: str) -> AgentSession:
+        """Сессия по идентификатору; новая, если её нет или она истекла"""
+        self._evict_idle()
+        with self._lock:
+            session = self._memory.get(session_id)
+            if session is not None:
+                self._memory.move_to_end(session_id)
+        if session is not None:
+            self._count("memory_hits")
+        elif self.path:
+            try:
+                with self._connect() as conn:
+                    row = conn.execute(
+                        "SELECT state, accessed FROM agent_sessions WHERE session_id = ?", (session_id,)
+                    ).fetchone()
+                if row and time() - row[1] <= self.ttl:
+                    session = AgentSession.from_json(session_id, row[0])
+                    self._count("disk_hits")
+            except (sqlite3.Error, json.JSONDecodeError) as e:
+                logger.warning(f"Ошибка чтения сессии {session_id}: {e}")
+        if session is None:
+            session = AgentSession(session_id)
+            self._count("created")
+        session.accessed = time()
+        self._memory_put(session)
+        return session
+
+    def save(self, session: AgentSession) -> None:
+        """Записать сессию на диск и удалить истёкшие"""
+        session.accessed = time()
+        self._memory_put(session)
+        if not self.path:
+            return
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO agent_sessions VALUES (?, ?, ?)",
+                    (session.session_id, session.to_json(), session.accessed)
+                )
+                conn.execute("DELETE FROM agent_sessions WHERE accessed < ?", (time() - self.ttl,))
+        except sqlite3.Error as e:
+            logger.warning(f"Ошибка записи сессии {session.session_id}: {e}")
+
+    def drop(self, session_id: str) -> None:
+        """Завершить сессию"""
+        with self._lock:
+            self._memory.pop(session_id, None)
+        if self.path and self.path.exists():
+            with self._connect() as conn:
+                conn.execute("DELETE FROM agent_sessions WHERE session_id = ?", (session_id,))
+
+    @contextmanager
+    def use(self, session_id: str = None):
+        """Сессия для запуска агента внутри блока (None - без сессии)"""
+        if not session_id:
+            yield None
+            return
+        session = self.get(session_id)
+        token = CURRENT_SESSION.set(session)
+        try:
+            yield session
+        finally:
+            CURRENT_SESSION.reset(token)
+            self.save(session)
+
+    def lookup(self, content: dict):
+        """Ответ инструмента из сессии текущего контекста или None"""
+        session = CURRENT_SESSION.get()
+        if session is None or not reused(content.get("name_tool")):
+            return None
+        output = session.lookup(content)
+        self._count("tool_misses" if output is None else "tool_hits")
+        return output
+
+    def remember(self, content: dict, output: dict) -> None:
+        """Сохранить ответ инструмента в сессию текущего контекста"""
+        session = CURRENT_SESSION.get()
+        if session is not None:
+            session.remember(content, output)
+
+    def stats(self) -> dict:
+        """Сессии в памяти и переиспользование инструментов"""
+        with self._lock:
+            result = dict(self.counters)
+            result["in_memory"] = len(self._memory)
+        looked = result["tool_hits"] + result["tool_misses"]
+        result["tool_hit_rate"] = round(result["tool_hits"] / looked, 4) if looked else 0.0
+        return result
+
+
+def current_session():
+    """Сессия агента текущего контекста или None"""
+    return CURRENT_SESSION.get()
+
+
+SESSIONS = SessionStore()
@@ -1,9 +1,15 @@
 """Парсинг LLM ответов"""
 from agent.parsing.parsing_text import parsing_input
 from agent.tools.run_giga import llm
+from agent.tools.model_router import ROUTER
 from agent.tools.exceptions import CustomError
-from agent.prompts.prompts import prompt_classification, final_classification
-import json
+from agent.tools.relevance import RELEVANCE, log_verdict
+from agent.prompts.prompts import (
+    prompt_classification,
+    final_classification,
+    prompt_repair_json,
+    not_relevant_reply,
+)
 
 
 class ParseLLM:
@@ -14,22 +20,34 @@ class ParseLLM:
         self.t_analyze = "Анализ файла: {analyze}\n"
         self.t_split = "-"*80 + "\n\n"
 
-    def get_llm_answer(self, new_prompt: str, sys_prompt: str) -> str:
-        """Получить ответ от LLM и распарсить"""
-        result = None
-        try:
-            answer = llm(new_prompt, sys_prompt)
-            answer = parsing_input(answer)
-            if not isinstance(answer, dict):
-                result = json.loads(answer)
-            result = answer
-        except CustomError:
-            result = self.get_llm_answer(new_prompt, sys_prompt)
-        return result
+    def get_llm_answer(self, new_prompt: str, sys_prompt: str, call_site: str = "agent.step") -> dict:
+        """Получить ответ от LLM и распарсить
+
+        Невалидный JSON исправляет лёгкая модель маршрута {call_site}.repair,
+        при повторной неудаче - модель эскалации.
+        """
+        answer = llm(new_prompt, sys_prompt, call_site=call_site)
+        result = parsing_input(answer)
+        repair_site = f"{call_site}.repair"
+        for escalate in (False, True):
+            if isinstance(result, dict):
+                return result
+            model_name, temperature = ROUTER.route(repair_site, escalate=escalate)
+            repaired = llm(
+                answer,
+                prompt_repair_json,
+                model_name=model_name,
+                temperature=temperature,
+                call_site=repair_site
+            )
+            result = parsing_input(repaired)
+        if isinstance(result, dict):
+            return result
+        raise CustomError(f"{call_site}: ответ LLM не является корректным JSON")
 
     def answer_read_file(self, query: str, prompt: str) -> str:
         """Результат чтения файла в ВВ"""
-        data = llm(query, prompt)
+        data = llm(query, prompt, call_site="agent.read_file")
         j = parsing_input(data)
         analize_file = j["analize_tool"]
         answer_llm = j["answer"]
@@ -55,24 +73,57 @@ class ParseLLM:
             "Мысли": answer.get("thought"),
             "Действие": answer.get("action"),
             "Инструмент": answer.get("action_input"),
+            "Релевантность": answer.get("classification"),
+            "Причина": answer.get("reason"),
+            "Ответ": answer.get("answer"),
         }
         return result
 
 
+def answer_not_relevant(data: str) -> str:
+    """Ответ пользователю на нерелевантный запрос по анализу классификации
+
+    С локальным классификатором релевантности - готовый шаблон без вызова LLM.
+    """
+    if RELEVANCE.enabled:
+        return not_relevant_reply
+    return llm(
+        "Верни ответ на вопрос:",
+        final_classification.format(data=data),
+        call_site="classification.final"
+    )
+
+
+def _is_classification(text: str) -> bool:
+    """Ответ классификации разобран: JSON со строкой classification"""
+    result = parsing_input(text)
+    return isinstance(result, dict) and isinstance(result.get("classification"), str)
+
+
 def classification_query(query: str, verbose=False):
     """Проверка запроса пользователя на релевантность"""
-    classification = llm(query, prompt_classification)
-    q = "Верни ответ на вопрос:"
+    # В кэш попадает только разобранный ответ: сбой формата не повторяется из кэша
+    classification = llm(query, prompt_classification, call_site="classification", validate=_is_classification)
     result = parsing_input(classification)
+    if not (isinstance(result, dict) and isinstance(result.get("classification"), str)):
+        # Лёгкая модель ответила не по формату - переспросить модель эскалации
+        model_name, temperature = ROUTER.route("classification", escalate=True)
+        classification = llm(
+            query,
+            prompt_classification,
+            model_name=model_name,
+            temperature=temperature,
+            call_site="classification",
+            validate=_is_classification
+        )
+        result = parsing_input(classification)
     if verbose:
         print(classification)
-    if (
-        isinstance(result, dict)
-        and isinstance(result["classification"], str)
-        and result["classification"].lower() == "релевантные"
-    ):
+    parsed = isinstance(result, dict) and isinstance(result.get("classification"), str)
+    relevant = parsed and result["classification"].lower() == "релевантные"
+    # Неразобранный ответ - не вердикт и не пишется в журнал обучения
+    if parsed:
+        log_verdict(query, relevant, source="llm")
+    if relevant:
         return query
-    answer = llm(
-        q, final_classification.format(data=classification)
-    )
-    return {"not_rel": answer}
+    return {"not_rel": answer_not_relevant(classification)}
@@ -1,33 +1,56 @@
 """Обработка результатов инструментов"""
 from agent.memory.memory_state import State
+import json
+
+
+def tool_keys(actions: list) -> list:
+    """Ключи результатов: имя инструмента, а для нескольких вызовов одного
+    инструмента с разными параметрами - имя с параметрами"""
+    def args(action):
+        return json.dumps(
+            {k: v for k, v in action.items() if k not in ("name_tool", "query", "prefetched")},
+            ensure_ascii=False, sort_keys=True, default=str
+        )
+    variants = {}
+    for action in actions:
+        variants.setdefault(action["name_tool"], set()).add(args(action))
+    return [
+        action["name_tool"] if len(variants[action["name_tool"]]) == 1 else f"{action['name_tool']} {args(action)}"
+        for action in actions
+    ]
 
 
 def post_form_instrument(
     action_input: dict,
     output_tool: str or list or dict,
-    state: State
+    state: State,
+    key: str = None
 ) -> None:
-    """Обработка результата выполнения инструмента"""
+    """Обработка результата выполнения инструмента
+
+    key - ключ в history_tools/result_tools (по умолчанию имя инструмента).
+    """
     name_tool = action_input["name_tool"]
+    key = key or name_tool
     if isinstance(output_tool, dict):
         if output_tool["status"] == 200:
             if name_tool == "search_content":
                 state.relevant_doc = output_tool["relevant_doc"]
                 state.texts = output_tool["chunks"]
                 state.score = output_tool["score"]
-            state.history_tools[name_tool] = (
+            state.history_tools[key] = (
                 f"**Инструмент {name_tool}** -> успешно выполнено! Ответ получен!\n"
                 f"{output_tool['answer'] if name_tool == 'show_files' else 'Файл открыт!' if name_tool == 'read_file' else 'Генерация readme завершена!' if name_tool == 'gen_readme' else ''}\n"
             )
-            state.result_tools[name_tool] = (
+            state.result_tools[key] = (
                 f"Готово! Измените текст, которые выделенны красным шрифтом на ваши актуальные данные. {output_tool['answer']}" 
                 if name_tool == "gen_readme" 
                 else output_tool["answer"]
             )
         else:
-            state.history_tools[name_tool] = (
+            state.history_tools[key] = (
                 f"**Инструмент {name_tool}** -> выполнился с ошибкой! Ошибка: {output_tool['answer']}!\n"
             )
-            state.result_tools[name_tool] = output_tool["answer"]
+            state.result_tools[key] = output_tool["answer"]
     else:
         raise KeyError("Ошибка в формате output_tool")
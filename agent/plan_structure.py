@@ -0,0 +1,121 @@
+"""Режим plan: один вызов планирования и выполнение инструментов по графу зависимостей"""
+from agent.prompts.prompts import plan_prompt, sys_prompt_plan
+from agent.memory.get_prompts import get_history_prompt, final_answer
+from agent.parsing.parsing_state import post_form_instrument, tool_keys
+from agent.parsing.parsing_llm import ParseLLM
+from agent.tools.settings import AGENT_MAX_PARALLEL_TOOLS, AGENT_PLAN_REPLANS
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from tools.tools import run_tools
+from loguru import logger
+import contextvars
+
+
+def normalize_plan(plan, query: str) -> list:
+    """Шаги плана: {"id", "content", "depends_on"}; шаги answer отбрасываются"""
+    steps = []
+    for i, item in enumerate(plan if isinstance(plan, list) else []):
+        if not isinstance(item, dict) or not item.get("name_tool") or item["name_tool"] == "answer":
+            continue
+        args = item.get("args") if isinstance(item.get("args"), dict) else {}
+        content = {**args, "name_tool": item["name_tool"]}
+        if content["name_tool"] in ("search_content", "create_repo"):
+            content["query"] = query
+        depends_on = item.get("depends_on") or []
+        steps.append({
+            "id": str(item.get("id") or f"s{i + 1}"),
+            "content": content,
+            "depends_on": [str(d) for d in depends_on] if isinstance(depends_on, list) else [str(depends_on)],
+        })
+    return steps
+
+
+def execute_dag(steps: list, runner=run_tools, max_workers: int = AGENT_MAX_PARALLEL_TOOLS) -> dict:
+    """Выполнить шаги с максимальным параллелизмом: {id: результат}
+
+    Шаг запускается, как только успешно выполнены все его зависимости;
+    шаги, зависящие от неуспешного, пропускаются. Ссылки на несуществующие
+    шаги игнорируются, шаги в цикле зависимостей не выполняются.
+    """
+    ids = {step["id"] for step in steps}
+    pending = {step["id"]: step for step in steps}
+    results, running = {}, {}
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        while pending or running:
+            progress = True
+            while progress:
+                progress = False
+                for sid, step in list(pending.items()):
+                    deps = [d for d in step["depends_on"] if d in ids and d != sid]
+                    failed = [d for d in deps if d in results and results[d].get("status") != 200]
+                    if failed:
+                        results[sid] = {"status": 424, "answer": f"Шаг пропущен: не выполнены шаги {', '.join(failed)}"}
+                    elif all(d in results for d in deps):
+                        future = pool.submit(contextvars.copy_context().run, runner, step["content"])
+                        running[future] = sid
+                    else:
+                        continue
+                    del pending[sid]
+                    progress = True
+            if not running:
+                for sid in pending:
+                    results[sid] = {"status": 400, "answer": "Шаг не выполнен: цикл зависимостей в плане"}
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                sid = running.pop(future)
+                try:
+                    results[sid] = future.result()
+                except Exception as e:
+                    logger.error(f"Ошибка шага плана {sid}: {str(e)}")
+                    results[sid] = {"status": 500, "answer": f"Ошибка: {str(e)}"}
+    return results
+
+
+def plan_agent(data: dict) -> dict:
+    """Узел планирования: весь план инструментов одним вызовом LLM"""
+    query = data.get("user_query")
+    state = data.get("pars_quest")
+    if state.plan_failed:
+        state.replans += 1
+        logger.info(f"Перепланирование после ошибок шагов: {state.plan_failed}")
+    prompt = get_history_prompt(state, plan_prompt, data.get("list_tools"), query)
+    answer = ParseLLM().get_llm_answer(prompt, sys_prompt_plan, call_site="agent.plan")
+    state.thought = answer.get("thought", "")
+    state.plan = normalize_plan(answer.get("plan"), query)
+    logger.info(f"План: {[(s['id'], s['content']['name_tool'], s['depends_on']) for s in state.plan]}")
+    return {
+        "user_query": query
+    }
+
+
+def execute_plan(data: dict) -> dict:
+    """Узел выполнения плана; пустой первый план - поиск по базе знаний, как в ReAct"""
+    query = data.get("user_query")
+    state = data.get("pars_quest")
+    steps = state.plan
+    if not steps and not state.history_tools:
+        steps = normalize_plan([{"name_tool": "search_content"}], query)
+    results = execute_dag(steps)
+    state.tool_calls.extend(step["content"] for step in steps)
+    state.plan_failed = []
+    for step, key in zip(steps, tool_keys([step["content"] for step in steps])):
+        output_tool = results[step["id"]]
+        post_form_instrument(step["content"], output_tool, state, key)
+        if output_tool.get("status") != 200:
+            state.plan_failed.append(step["id"])
+    return {
+        "user_query": query
+    }
+
+
+def should_replan(data: dict) -> str:
+    """Перепланировать только при ошибках шагов и в пределах AGENT_PLAN_REPLANS"""
+    state = data["pars_quest"]
+    if state.plan_failed and state.replans < AGENT_PLAN_REPLANS:
+        return "replan"
+    return "final"
+
+
+def final_plan(data: dict) -> dict:
+    """Узел финального ответа по результатам плана"""
+    return final_answer(data.get("user_query"), data.get("pars_quest"))
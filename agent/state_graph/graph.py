@@ -1,16 +1,75 @@
 """Граф состояний агента"""
 from agent.memory.memory_state import State, AgentState, should_continue
 from agent.main_structure import main_agent
+from agent.plan_structure import plan_agent, execute_plan, should_replan, final_plan
+from agent.memory.session_store import current_session
+from agent.memory.get_prompts import final_answer
+from agent.parsing.parsing_state import post_form_instrument
+from agent.tools.intent_router import log_intent
+from agent.tools.settings import AGENT_MODE, CHECKPOINT_ENABLED, CHECKPOINT_PATH
 from agent.parsing.parsing_text import parsing_html
-from tools.tools import get_tools
+from tools.tools import get_tools, run_tools
 from langgraph.graph import StateGraph, END
+from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from contextvars import ContextVar
+from pathlib import Path
+from loguru import logger
+import threading
+import sqlite3
+import copy
 
+# Callback потоковой выдачи для возобновлённого запуска (в checkpoint не сохраняется)
+_RESUME_ON_TOKEN = ContextVar("agent_resume_on_token", default=None)
 
-def agent(text: str):
-    """Главная функция граф агента с StateGraph"""
+
+class StateSaver(SqliteSaver):
+    """SqliteSaver для State: значения каналов через pickle, метаданные без writes
+
+    Метаданные checkpoint сериализуются только в JSON, а writes узла
+    содержат State - они не нужны для возобновления и не сохраняются.
+    """
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        metadata = {k: v for k, v in metadata.items() if k != "writes"}
+        return super().put(config, checkpoint, metadata, new_versions)
+
+
+def make_checkpointer(path: str = CHECKPOINT_PATH):
+    """SQLite checkpointer графа"""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+    return StateSaver(conn, serde=JsonPlusSerializer(pickle_fallback=True))
+
+
+def isolated(node):
+    """Узел работает с копией State и возвращает её
+
+    Узлы меняют State на месте, а checkpoint записывается в фоне: без
+    копии сохранённое после узла состояние могло бы включать изменения
+    следующего (упавшего) узла.
+    """
+    def run(data: dict):
+        state = copy.deepcopy(data["pars_quest"])
+        state.on_token = data["pars_quest"].on_token or _RESUME_ON_TOKEN.get()
+        result = node({**data, "pars_quest": state})
+        return {**(result or {}), "pars_quest": state}
+    run.__name__ = getattr(node, "__name__", "node")
+    return run
+
+
+def build_graph(show_tools=get_tools, run_tool=main_agent, checkpointer=None):
+    """Собрать и скомпилировать граф агента
+
+    Узлы не хранят данных запроса: всё состояние передаётся во входе
+    invoke, поэтому скомпилированный граф общий для всех запросов и
+    потоков процесса. С checkpointer State сохраняется после каждого узла.
+    """
+    if checkpointer is not None:
+        run_tool = isolated(run_tool)
     graph = StateGraph(AgentState)
-    graph.add_node("show_tools", get_tools)
-    graph.add_node("run_tool", main_agent)
+    graph.add_node("show_tools", show_tools)
+    graph.add_node("run_tool", run_tool)
     graph.add_conditional_edges(
         "run_tool",
         should_continue,
@@ -21,17 +80,147 @@ def agent(text: str):
     )
     graph.set_entry_point("show_tools")
     graph.add_edge("show_tools", "run_tool")
-    grap = graph.compile()
-    state = State()
-    result = grap.invoke(
+    return graph.compile(checkpointer=checkpointer)
+
+
+def build_plan_graph(show_tools=get_tools, plan=plan_agent, execute=execute_plan, final=final_plan, checkpointer=None):
+    """Граф режима plan: план -> выполнение по зависимостям -> финальный ответ
+
+    После выполнения с ошибками шагов граф возвращается к планированию.
+    """
+    if checkpointer is not None:
+        plan, execute, final = isolated(plan), isolated(execute), isolated(final)
+    graph = StateGraph(AgentState)
+    graph.add_node("show_tools", show_tools)
+    graph.add_node("plan", plan)
+    graph.add_node("execute", execute)
+    graph.add_node("final", final)
+    graph.set_entry_point("show_tools")
+    graph.add_edge("show_tools", "plan")
+    graph.add_edge("plan", "execute")
+    graph.add_conditional_edges(
+        "execute",
+        should_replan,
         {
-            "user_query": text,
-            "pars_quest": state,
+            "replan": "plan",
+            "final": "final",
         }
     )
+    graph.add_edge("final", END)
+    return graph.compile(checkpointer=checkpointer)
+
+
+# Графы компилируются один раз при импорте модуля
+GRAPH = build_graph()
+PLAN_GRAPH = build_plan_graph()
+GRAPHS = {"react": GRAPH, "plan": PLAN_GRAPH}
+
+# Checkpointer и графы с ним создаются при первом запуске с run_id
+_CHECKPOINTED = {}
+_CHECKPOINT_LOCK = threading.Lock()
+
+
+def checkpointer():
+    """SQLite checkpointer процесса (None - checkpoints выключены)"""
+    if not CHECKPOINT_ENABLED or not CHECKPOINT_PATH:
+        return None
+    with _CHECKPOINT_LOCK:
+        if "saver" not in _CHECKPOINTED:
+            saver = make_checkpointer()
+            _CHECKPOINTED.update(
+                saver=saver,
+                react=build_graph(checkpointer=saver),
+                plan=build_plan_graph(checkpointer=saver),
+            )
+    return _CHECKPOINTED["saver"]
+
+
+def _graph(mode: str, run_id: str = None) -> tuple:
+    """(граф, конфигурация invoke): запуск с run_id - отдельный поток checkpointer"""
+    if not run_id or checkpointer() is None:
+        return GRAPHS[mode], None
+    return _CHECKPOINTED[mode], {"configurable": {"thread_id": run_id}}
+
+
+def has_checkpoint(run_id: str) -> bool:
+    """Есть ли сохранённое состояние запуска"""
+    saver = checkpointer()
+    return saver is not None and saver.get_tuple({"configurable": {"thread_id": run_id}}) is not None
+
+
+def clear_checkpoint(run_id: str) -> None:
+    """Удалить checkpoints запуска"""
+    saver = checkpointer()
+    if saver is not None:
+        saver.delete_thread(run_id)
+
+
+def _result(text: str, result: dict, mode: str, session=None):
+    """(ответ, State) из итогового состояния графа"""
+    if session is not None:
+        session.absorb(result["pars_quest"])
+    log_intent(text, result["pars_quest"].tool_calls, mode)
     if result["pars_quest"].final:
         return parsing_html(result["pars_quest"].final), result["pars_quest"]
     answer = parsing_html(
         result.get("final_answer")
     ) if result.get("final_answer") else "Нет ответа"
     return answer, result["pars_quest"]
+
+
+def resume_graph(text: str, run_id: str, mode: str, on_token=None):
+    """Продолжить запуск с последнего сохранённого узла"""
+    graph, config = _graph(mode, run_id)
+    token = _RESUME_ON_TOKEN.set(on_token)
+    try:
+        logger.info(f"Возобновление запуска {run_id} с узлов {graph.get_state(config).next}")
+        result = graph.invoke(None, config)
+    finally:
+        _RESUME_ON_TOKEN.reset(token)
+    return _result(text, result, mode, current_session())
+
+
+def agent(text: str, on_token=None, check_relevance: bool = False, mode: str = None, run_id: str = None):
+    """Главная функция граф агента с StateGraph
+
+    on_token - callback для потоковой выдачи финального ответа по фрагментам;
+    check_relevance - первый шаг также оценивает релевантность запроса
+    (нерелевантный запрос завершается с state.score = "not_relevant");
+    mode - react или plan (None - AGENT_MODE);
+    run_id - идентификатор запуска для checkpoints (возобновление через resume_graph).
+    В сессии агента состояние начинается с результатов прошлых запросов.
+    """
+    mode = mode or AGENT_MODE
+    if mode not in GRAPHS:
+        raise ValueError(f"mode должен быть одним из {list(GRAPHS)}")
+    state = State()
+    state.on_token = on_token
+    state.check_relevance = check_relevance and mode == "react"
+    session = current_session()
+    if session is not None:
+        session.seed(state)
+    graph, config = _graph(mode, run_id)
+    result = graph.invoke(
+        {
+            "user_query": text,
+            "pars_quest": state,
+        },
+        config
+    )
+    return _result(text, result, mode, session)
+
+
+def agent_direct(text: str, content: dict, on_token=None):
+    """Запрос, разобранный маршрутизатором: один инструмент и финальный ответ без графа"""
+    state = State()
+    state.on_token = on_token
+    session = current_session()
+    if session is not None:
+        session.seed(state)
+    state.thought = f"Запрос однозначно требует инструмента {content['name_tool']}"
+    state.tool_calls.append(content)
+    post_form_instrument(content, run_tools(content=dict(content)), state)
+    final_answer(text, state)
+    if session is not None:
+        session.absorb(state)
+    return parsing_html(state.final) if state.final else "Нет ответа", state
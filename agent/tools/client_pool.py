@@ -0,0 +1,137 @@
+"""Пул переиспользуемых клиентов GigaChat"""
+from contextlib import contextmanager
+from typing import Any, Callable
+from loguru import logger
+import threading
+
+
+class GigaChatPool:
+    """Процессный пул клиентов по ключу (base_url, model, temperature)
+
+    Клиент создаётся один раз на ключ и держит keep-alive соединения
+    httpx, поэтому повторные вызовы llm() не тратят время на создание
+    клиента, TCP/TLS handshake и авторизацию. При смене токена клиент
+    выводится из пула и закрывается, когда его отпустит последний вызов,
+    взявший его через lease().
+    """
+
+    def __init__(self, factory: Callable[..., Any]):
+        self.factory = factory
+        self._clients = {}
+        self._tokens = {}
+        # id клиента -> число вызовов, использующих его сейчас
+        self._users = {}
+        # Клиенты со старым токеном, ждущие завершения своих вызовов
+        self._retired = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def get(
+        self,
+        base_url: str,
+        model: str,
+        temperature: float,
+        access_token: str = None,
+        **kwargs
+    ) -> Any:
+        """Получить клиент из пула или создать новый"""
+        with self._lock:
+            return self._get(base_url, model, temperature, access_token, **kwargs)
+
+    @contextmanager
+    def lease(
+        self,
+        base_url: str,
+        model: str,
+        temperature: float,
+        access_token: str = None,
+        **kwargs
+    ):
+        """Клиент из пула на время вызова: не закрывается, пока используется"""
+        with self._lock:
+            chat = self._get(base_url, model, temperature, access_token, **kwargs)
+            self._users[id(chat)] = self._users.get(id(chat), 0) + 1
+        try:
+            yield chat
+        finally:
+            with self._lock:
+                self._users[id(chat)] -= 1
+                idle = self._users[id(chat)] == 0
+                if idle:
+                    del self._users[id(chat)]
+                retired = idle and self._retired.pop(id(chat), None) is not None
+            if retired:
+                self._close_client(chat)
+
+    def _get(self, base_url, model, temperature, access_token, **kwargs) -> Any:
+        key = (base_url, model, temperature)
+        chat = self._clients.get(key)
+        if chat is not None and self._tokens.get(key) == access_token:
+            self.reused += 1
+            return chat
+        if chat is not None:
+            # Токен сменился - старый клиент больше не валиден; занятый
+            # закрывается после последнего вызова в lease()
+            if self._users.get(id(chat)):
+                self._retired[id(chat)] = chat
+            else:
+                self._close_client(chat)
+        chat = self.factory(
+            base_url=base_url,
+            access_token=access_token,
+            model=model,
+            temperature=temperature,
+            **kwargs
+        )
+        # HTTP клиент создаётся под блокировкой, чтобы потоки не плодили дубли
+        _ = chat._client  # pylint:disable=protected-access
+        self._clients[key] = chat
+        self._tokens[key] = access_token
+        self.created += 1
+        return chat
+
+    def stats(self) -> dict:
+        """Статистика использования пула"""
+        with self._lock:
+            return {
+                "clients": len(self._clients),
+                "retired": len(self._retired),
+                "created": self.created,
+                "reused": self.reused,
+            }
+
+    @staticmethod
+    def _close_client(chat: Any) -> None:
+        """Закрыть HTTP соединения клиента, если они были открыты"""
+        # _client у GigaChat - cached_property, создаётся при первом запросе
+        client = chat.__dict__.get("_client")
+        if client is None:
+            return
+        try:
+            client.close()
+        except Exception as e:  # pylint:disable=broad-exception-caught
+            logger.warning(f"Ошибка закрытия клиента GigaChat: {e}")
+
+    async def aclose(self) -> None:
+        """Закрыть асинхронные HTTP соединения клиентов"""
+        with self._lock:
+            clients = [*self._clients.values(), *self._retired.values()]
+        for chat in clients:
+            client = chat.__dict__.get("_client")
+            if client is None:
+                continue
+            try:
+                await client.aclose()
+            except Exception as e:  # pylint:disable=broad-exception-caught
+                logger.warning(f"Ошибка закрытия async клиента GigaChat: {e}")
+
+    def close(self) -> None:
+        """Закрыть все клиенты пула"""
+        with self._lock:
+            for chat in [*self._clients.values(), *self._retired.values()]:
+                self._close_client(chat)
+            self._clients.clear()
+            self._tokens.clear()
+            self._retired.clear()
+
@@ -11,6 +11,11 @@ class BlackList(GigaChatException):
     pass
 
 
+class CircuitOpen(GigaChatException):
+    """GigaChat временно отключён circuit breaker'ом"""
+    pass
+
+
 class CustomError(Exception):
     """Общее пользовательское исключение"""
     pass
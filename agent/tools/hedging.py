@@ -0,0 +1,141 @@
+"""Хеджирование запросов к GigaChat для срезания хвоста задержек
+
+Если вызов не вернулся за задержку хеджирования (перцентиль
+GIGA_HEDGE_PERCENTILE времени ответа этого места вызова по профилю
+процесса), отправляется дубликат и берётся ответ, пришедший первым.
+Второй запрос отменяется (GIGA_HEDGE_CANCEL=1) или дожидается в фоне,
+чтобы точно учесть потраченные токены. Доля хеджей ограничена
+GIGA_HEDGE_MAX_RATE от всех вызовов за минуту.
+"""
+from agent.tools.settings import (
+    HEDGE_ENABLED,
+    HEDGE_SITES,
+    HEDGE_PERCENTILE,
+    HEDGE_MIN_SAMPLES,
+    HEDGE_DEFAULT_DELAY,
+    HEDGE_MIN_DELAY,
+    HEDGE_MAX_RATE,
+    HEDGE_CANCEL,
+)
+from agent.tools.llm_profiler import PROFILER, percentile
+from agent.tools.resilience import RetryBudget
+from loguru import logger
+from time import perf_counter
+import threading
+import asyncio
+
+
+class Hedger:
+    """Политика хеджирования: задержка по перцентилю и глобальный лимит доли"""
+
+    def __init__(
+        self,
+        enabled: bool = HEDGE_ENABLED,
+        sites: tuple = HEDGE_SITES,
+        q: float = HEDGE_PERCENTILE,
+        min_samples: int = HEDGE_MIN_SAMPLES,
+        default_delay: float = HEDGE_DEFAULT_DELAY,
+        min_delay: float = HEDGE_MIN_DELAY,
+        max_rate: float = HEDGE_MAX_RATE,
+        cancel: bool = HEDGE_CANCEL
+    ):
+        self.enabled = enabled
+        self.sites = sites
+        self.q = q
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.cancel = cancel
+        self.budget = RetryBudget(ratio=max_rate, minimum=0)
+        self.counters = {
+            "calls": 0,
+            "hedged": 0,
+            "hedge_wins": 0,
+            "rate_limited": 0,
+            "extra_tokens": 0,
+            "extra_tokens_estimated": 0,
+        }
+        self._lock = threading.Lock()
+
+    def use(self, call_site: str, hedge: bool = None) -> bool:
+        """Хеджировать ли вызов: True/False - явно, None - по GIGA_HEDGE_SITES"""
+        if hedge is not None:
+            return hedge
+        return self.enabled and bool(call_site) and call_site.startswith(self.sites)
+
+    def delay(self, call_site: str) -> float:
+        """Задержка перед дубликатом по профилю времени ответа места вызова"""
+        latencies = PROFILER.latencies(call_site)
+        if len(latencies) < self.min_samples:
+            return self.default_delay
+        return max(self.min_delay, percentile(latencies, self.q))
+
+    def _count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += value
+
+    async def run(self, factory, call_site: str, usage=None, on_extra=None, estimate: int = 0):
+        """Выполнить factory() с хеджированием
+
+        usage(result) -> (prompt, completion, total) токенов проигравшего
+        запроса и его время выполнения передаются в on_extra(tokens, latency);
+        для отменённого запроса в статистику идёт оценка estimate токенов промпта.
+        """
+        self._count("calls")
+        self.budget.on_request()
+        started = {}
+        primary = asyncio.ensure_future(factory())
+        started[primary] = perf_counter()
+        delay = self.delay(call_site)
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+        if not self.budget.try_retry():
+            self._count("rate_limited")
+            return await primary
+        self._count("hedged")
+        logger.info(f"{call_site}: нет ответа за {delay:.2f} с, отправлен дубликат запроса")
+        hedge = asyncio.ensure_future(factory())
+        started[hedge] = perf_counter()
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    error = error or task.exception()
+                    continue
+                if task is hedge:
+                    self._count("hedge_wins")
+                for loser in pending:
+                    self._release(loser, usage, on_extra, estimate, started[loser])
+                return task.result()
+        raise error
+
+    def _release(self, task: asyncio.Future, usage, on_extra, estimate: int, started: float) -> None:
+        """Отменить проигравший запрос или дождаться его в фоне для учёта токенов"""
+        if self.cancel:
+            task.cancel()
+            self._count("extra_tokens_estimated", estimate)
+            return
+
+        def _done(future: asyncio.Future) -> None:
+            if future.cancelled() or future.exception() is not None:
+                return
+            tokens = usage(future.result()) if usage else (0, 0, 0)
+            self._count("extra_tokens", tokens[2])
+            if on_extra:
+                on_extra(tokens, perf_counter() - started)
+
+        task.add_done_callback(_done)
+
+    def stats(self) -> dict:
+        """Доля хеджей, выигрыши дубликата и лишние токены"""
+        with self._lock:
+            result = dict(self.counters)
+        result["enabled"] = self.enabled
+        result["hedge_rate"] = round(result["hedged"] / result["calls"], 4) if result["calls"] else 0.0
+        return result
+
+
+HEDGER = Hedger()
@@ -0,0 +1,235 @@
+"""Детерминированный маршрутизатор очевидных запросов
+
+Запросы вида "оцени код репозитория X" или "покажи файлы X" однозначно
+требуют одного инструмента: правило (регулярные выражения глаголов
+инструмента) плюс имя репозитория. Такой запрос выполняется сразу через
+run_tools и финальный ответ, без классификации и шагов планирования LLM.
+Правила - только повелительные глаголы инструмента ("оцени код", "покажи
+файлы"). Маршрут принимается, только если совпало ровно одно правило, запрос
+не вопрос, в нём нет связок нескольких действий и отрицаний перед глаголом
+инструмента и найден ровно один репозиторий; всё остальное уходит в обычный
+цикл агента.
+
+Инструменты, выбранные агентом LLM, пишутся в журнал AGENT_INTENT_LOG (если задан);
+по нему считается покрытие и точность правил:
+    python -m agent.tools.intent_router --report output/intent_queries.jsonl
+"""
+from agent.tools.settings import INTENT_ROUTER_ENABLED, INTENT_RULES_PATH, INTENT_LOG_PATH
+from pathlib import Path
+from loguru import logger
+from time import time
+import threading
+import argparse
+import fcntl
+import json
+import re
+
+# Правила по умолчанию: инструмент, шаблоны повелительных глаголов, нужен ли
+# репозиторий (needs_repo=False - правило только для запросов без репозитория)
+DEFAULT_RULES = [
+    {
+        "name_tool": "rate_repository",
+        "patterns": [
+            r"\b(?:оцени|проверь|проанализируй)\s+(?:качество\s+)?код\w*",
+            r"\b(?:запусти|прогони)\s+(?:pylint|линтер\w*)",
+        ],
+        "needs_repo": True,
+    },
+    {
+        "name_tool": "awerage_repo",
+        "patterns": [r"\b(?:оцени|проверь)\s+оформлени\w*"],
+        "needs_repo": True,
+    },
+    {
+        "name_tool": "show_files",
+        "patterns": [r"\b(?:покажи|выведи|перечисли)\s+(?:все\s+)?файл\w*"],
+        "needs_repo": True,
+    },
+    {
+        "name_tool": "gen_readme",
+        "patterns": [r"\b(?:сгенерируй|создай|напиши|составь|сделай)\s+(?:файл\s+)?readme"],
+        "needs_repo": True,
+    },
+    {
+        "name_tool": "info_tools",
+        "patterns": [r"\b(?:покажи|перечисли)\s+(?:свои\s+|твои\s+)?инструменты"],
+        "needs_repo": False,
+    },
+]
+
+# Вопрос ("что такое pylint?", "почему линтер ругается") - не команда, решает LLM
+QUESTION_PATTERN = re.compile(
+    r"\?|\b(?:что|как|почему|зачем|какой|какая|какое|какие|каким|какую|где|когда|сколько|ли)\b",
+    re.IGNORECASE
+)
+
+# Несколько действий в одном запросе ("оцени код и оформление") - решает LLM
+COMPOUND_PATTERN = re.compile(r"\b(?:и|а\s+также|затем|потом|после\s+этого|плюс)\b", re.IGNORECASE)
+
+# Отрицание в пределах двух слов перед глаголом инструмента ("не надо оценивать код")
+NEGATION_PATTERN = re.compile(r"\b(?:не|без|нельзя)\b(?:\s+\S+){0,2}\s*$", re.IGNORECASE)
+
+# Явное имя репозитория и ветки в тексте запроса
+REPO_PATTERN = re.compile(r"репозитори\w*\s+[«\"']?([A-Za-z0-9][A-Za-z0-9._-]*[A-Za-z0-9])", re.IGNORECASE)
+BRANCH_PATTERN = re.compile(r"ветк\w*\s+[«\"']?([A-Za-z0-9][A-Za-z0-9._/-]*)", re.IGNORECASE)
+
+
+def load_rules(path: str = INTENT_RULES_PATH) -> list:
+    """Правила из JSON файла (список как DEFAULT_RULES); нет файла - по умолчанию"""
+    if not path:
+        return DEFAULT_RULES
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"Правила маршрутизатора {path} не загружены: {e}")
+        return DEFAULT_RULES
+
+
+class IntentRouter:
+    """Правила "глагол инструмента + репозиторий" с подсчётом покрытия"""
+
+    def __init__(self, rules: list = None, enabled: bool = INTENT_ROUTER_ENABLED, known_repos=None):
+        self.enabled = enabled
+        self.rules = [
+            {**rule, "compiled": [re.compile(p, re.IGNORECASE) for p in rule["patterns"]]}
+            for rule in (rules if rules is not None else load_rules())
+        ]
+        self._known_repos = known_repos
+        self.counters = {"routed": 0, "fallthrough": 0}
+        self._lock = threading.Lock()
+
+    def known_repos(self) -> set:
+        """Репозитории проекта из общего кэша предзагрузки, без ожидания BitBucket"""
+        if self._known_repos is not None:
+            return self._known_repos()
+        from agent.tools.prefetch import PREFETCHER
+        return PREFETCHER.known_repos(wait=False)
+
+    def find_repos(self, query: str) -> list:
+        """Известные репозитории из запроса и явно названный "репозиторий X\""""
+        known = {repo.lower(): repo for repo in self.known_repos()}
+        found = []
+        for word in re.findall(r"[A-Za-z0-9][A-Za-z0-9._-]*[A-Za-z0-9]", query):
+            repo = known.get(word.lower())
+            if repo and repo not in found:
+                found.append(repo)
+        for match in REPO_PATTERN.findall(query):
+            if match.lower() not in (r.lower() for r in found):
+                found.append(known.get(match.lower(), match))
+        return found
+
+    def match(self, query: str):
+        """Параметры инструмента при однозначном совпадении или None"""
+        found = [(rule, m) for rule in self.rules for p in rule["compiled"] for m in p.finditer(query)]
+        if any(NEGATION_PATTERN.search(query[:m.start()]) for _, m in found):
+            return None
+        tools = list({id(rule): rule for rule, _ in found}.values())
+        if len(tools) != 1 or COMPOUND_PATTERN.search(query) or QUESTION_PATTERN.search(query):
+            return None
+        rule = tools[0]
+        content = {"name_tool": rule["name_tool"]}
+        repos = self.find_repos(query)
+        if not rule.get("needs_repo", True):
+            return None if repos else content
+        if len(repos) != 1:
+            return None
+        content["repository"] = repos[0]
+        branch = BRANCH_PATTERN.search(query)
+        if branch:
+            content["branch"] = branch.group(1)
+        return content
+
+    def route(self, query: str):
+        """Маршрут запроса с учётом в статистике (None - в цикл агента)"""
+        if not self.enabled:
+            return None
+        content = self.match(query)
+        with self._lock:
+            self.counters["routed" if content else "fallthrough"] += 1
+            if content:
+                key = f"tool:{content['name_tool']}"
+                self.counters[key] = self.counters.get(key, 0) + 1
+        if content:
+            logger.info(f"Маршрутизатор: {content}")
+        return content
+
+    def stats(self) -> dict:
+        """Доля запросов, обработанных без планирования LLM"""
+        with self._lock:
+            result = dict(self.counters)
+        total = result["routed"] + result["fallthrough"]
+        result["coverage"] = round(result["routed"] / total, 4) if total else 0.0
+        result["enabled"] = self.enabled
+        return result
+
+
+_LOG_LOCK = threading.Lock()
+
+
+def log_intent(query: str, tool_calls: list, mode: str, path: str = INTENT_LOG_PATH) -> None:
+    """Записать инструменты, выбранные агентом LLM для запроса"""
+    if not path or not tool_calls:
+        return
+    calls = [{k: c.get(k) for k in ("name_tool", "repository", "branch") if c.get(k)} for c in tool_calls]
+    line = json.dumps({"ts": round(time(), 3), "query": query, "tools": calls, "mode": mode}, ensure_ascii=False)
+    try:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with _LOG_LOCK, open(path, "a", encoding="utf-8") as f:
+            fcntl.lockf(f, fcntl.LOCK_EX)
+            try:
+                f.write(line + "\n")
+            finally:
+                fcntl.lockf(f, fcntl.LOCK_UN)
+    except OSError as e:
+        logger.warning(f"Не удалось записать журнал маршрутов {path}: {e}")
+
+
+def report(router: IntentRouter, paths: list) -> dict:
+    """Покрытие и точность правил на журнале выбора инструментов агентом
+
+    Маршрут верен, если агент вызвал тот же инструмент с тем же репозиторием;
+    exact - агент не вызывал ничего, кроме него.
+    """
+    total, routed, correct, exact = 0, 0, 0, 0
+    by_tool = {}
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                total += 1
+                content = router.match(item["query"])
+                if not content:
+                    continue
+                routed += 1
+                stats = by_tool.setdefault(content["name_tool"], {"routed": 0, "correct": 0})
+                stats["routed"] += 1
+                calls = [(c.get("name_tool"), c.get("repository")) for c in item.get("tools", [])]
+                if (content["name_tool"], content.get("repository")) in calls:
+                    correct += 1
+                    stats["correct"] += 1
+                    exact += len(set(calls)) == 1
+    return {
+        "queries": total,
+        "coverage": round(routed / total, 4) if total else 0.0,
+        "precision": round(correct / routed, 4) if routed else 0.0,
+        "exact": round(exact / routed, 4) if routed else 0.0,
+        "by_tool": by_tool,
+    }
+
+
+INTENT_ROUTER = IntentRouter()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Покрытие и точность маршрутизатора запросов")
+    parser.add_argument("--report", nargs="+", required=True, help="JSONL журналы {query, tools}")
+    parser.add_argument("--rules", default=INTENT_RULES_PATH, help="JSON файл правил")
+    args = parser.parse_args()
+    from agent.tools.prefetch import PREFETCHER
+    # Для отчёта список репозиториев загружается с ожиданием BitBucket
+    router = IntentRouter(load_rules(args.rules), known_repos=PREFETCHER.known_repos)
+    print(json.dumps(report(router, args.report), ensure_ascii=False, indent=2))
@@ -0,0 +1,185 @@
+"""Кэш ответов GigaChat: LRU в памяти + SQLite на диске
+
+Ключ - sha256 от (model, temperature, системный промпт, запрос), поэтому
+повторная классификация того же запроса или оценка неизменного README
+не уходит в GigaChat.
+
+Статистика:
+    python -m agent.tools.llm_cache
+"""
+from agent.tools.settings import (
+    CACHE_ENABLED,
+    CACHE_PATH,
+    CACHE_TTL,
+    CACHE_MEMORY_SIZE,
+    CACHE_MAX_ROWS,
+)
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from loguru import logger
+from time import time
+import threading
+import hashlib
+import sqlite3
+import json
+
+
+def make_key(model: str, temperature: float, prompt: str, query: str) -> str:
+    """Хэш содержимого запроса к LLM"""
+    raw = json.dumps([model, temperature, prompt, query], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """Двухуровневый кэш ответов LLM с TTL и ограничением размера"""
+
+    def __init__(
+        self,
+        path: str = CACHE_PATH,
+        ttl: float = CACHE_TTL,
+        memory_size: int = CACHE_MEMORY_SIZE,
+        max_rows: int = CACHE_MAX_ROWS,
+        enabled: bool = CACHE_ENABLED
+    ):
+        self.path = Path(path) if path else None
+        self.ttl = ttl
+        self.memory_size = memory_size
+        self.max_rows = max_rows
+        self.enabled = enabled
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_ready = False
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+
+    def use(self, cache: bool = None) -> bool:
+        """Решение для места вызова: False - без кэша; выключенный кэш не включается"""
+        return self.enabled and cache is not False
+
+    @contextmanager
+    def _connect(self):
+        """Соединение с SQLite: commit и закрытие по выходу"""
+        if not self._db_ready:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            if not self._db_ready:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_cache ("
+                    "key TEXT PRIMARY KEY, answer TEXT, created REAL, accessed REAL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON llm_cache(accessed)")
+                self._db_ready = True
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _memory_get(self, key: str):
+        with self._lock:
+            item = self._memory.get(key)
+            if item is None:
+                return None
+            answer, created = item
+            if time() - created > self.ttl:
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            return answer
+
+    def _memory_put(self, key: str, answer: str, created: float) -> None:
+        with self._lock:
+            self._memory[key] = (answer, created)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def get(self, key: str):
+        """Ответ из кэша или None"""
+        answer = self._memory_get(key)
+        if answer is not None:
+            self._count("memory_hits")
+            return answer
+        if self.path:
+            try:
+                with self._connect() as conn:
+                    row = conn.execute(
+                        "SELECT answer, created FROM llm_cache WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row and time() - row[1] <= self.ttl:
+                        conn.execute(
+                            "UPDATE llm_cache SET accessed = ? WHERE key = ?", (time(), key)
+                        )
+                        self._memory_put(key, row[0], row[1])
+                        self._count("disk_hits")
+                        return row[0]
+                    if row:
+                        conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            except sqlite3.Error as e:
+                logger.warning(f"Ошибка чтения кэша LLM: {e}")
+        self._count("misses")
+        return None
+
+    def put(self, key: str, answer: str) -> None:
+        """Сохранить ответ в обоих уровнях кэша"""
+        now = time()
+        self._memory_put(key, answer, now)
+        self._count("stores")
+        if not self.path:
+            return
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?)",
+                    (key, answer, now, now)
+                )
+                conn.execute("DELETE FROM llm_cache WHERE created < ?", (now - self.ttl,))
+                conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN ("
+                    "SELECT key FROM llm_cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                    (self.max_rows,)
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Ошибка записи кэша LLM: {e}")
+
+    def clear(self) -> None:
+        """Очистить кэш"""
+        with self._lock:
+            self._memory.clear()
+        if self.path and self.path.exists():
+            try:
+                with self._connect() as conn:
+                    conn.execute("DELETE FROM llm_cache")
+            except sqlite3.Error as e:
+                logger.warning(f"Ошибка очистки кэша LLM: {e}")
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    def stats(self) -> dict:
+        """Счётчики попаданий и размер кэша"""
+        with self._lock:
+            result = dict(self.counters)
+            result["memory_items"] = len(self._memory)
+        hits = result["memory_hits"] + result["disk_hits"]
+        lookups = hits + result["misses"]
+        result["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+        result["disk_items"] = 0
+        if self.path and self.path.exists():
+            try:
+                with self._connect() as conn:
+                    result["disk_items"] = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            except sqlite3.Error as e:
+                # Заблокированный или повреждённый файл не ломает /llm_stats
+                logger.warning(f"Ошибка чтения размера кэша LLM: {e}")
+                result["disk_items"] = None
+        return result
+
+
+CACHE = LLMCache()
+
+
+if __name__ == "__main__":
+    print(json.dumps(CACHE.stats(), ensure_ascii=False, indent=2))
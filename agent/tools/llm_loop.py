@@ -0,0 +1,114 @@
+"""Фоновый event loop для асинхронных вызовов GigaChat"""
+from typing import Any, Coroutine
+from agent.tools.settings import GIGA_MAX_CONCURRENCY
+import contextvars
+import asyncio
+import threading
+import atexit
+
+
+class LLMLoop:
+    """Один event loop на процесс для всех async вызовов LLM
+
+    Асинхронные httpx соединения привязаны к loop, в котором открыты,
+    поэтому пул клиентов обслуживается единственным фоновым loop, а
+    семафор ограничивает число одновременных запросов к GigaChat.
+    """
+
+    def __init__(self, max_concurrency: int = 8):
+        self.max_concurrency = max_concurrency
+        self._loop = None
+        self._thread = None
+        self._semaphore = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """Запустить loop в фоновом потоке при первом обращении"""
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._semaphore = asyncio.Semaphore(self.max_concurrency)
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever,
+                    name="llm-loop",
+                    daemon=True
+                )
+                self._thread.start()
+            return self._loop
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        """Семафор ограничения конкурентности (живёт в фоновом loop)"""
+        _ = self.loop
+        return self._semaphore
+
+    def set_concurrency(self, max_concurrency: int) -> None:
+        """Изменить лимит одновременных запросов"""
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency должен быть >= 1")
+        self.max_concurrency = max_concurrency
+
+        def _replace():
+            self._semaphore = asyncio.Semaphore(max_concurrency)
+
+        self.loop.call_soon_threadsafe(_replace)
+
+    @property
+    def started(self) -> bool:
+        """Запущен ли фоновый loop"""
+        return self._loop is not None
+
+    def in_loop(self) -> bool:
+        """Выполняется ли текущий код внутри фонового loop"""
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def _submit(self, coro: Coroutine):
+        """Запустить корутину в фоновом loop с контекстом вызывающего кода
+
+        Контекстные переменные (сессия GigaChat, профиль запроса,
+        приоритет) иначе не видны в потоке фонового loop.
+        """
+        context = contextvars.copy_context()
+
+        async def _in_context():
+            return await context.run(asyncio.ensure_future, coro)
+
+        return asyncio.run_coroutine_threadsafe(_in_context(), self.loop)
+
+    async def run(self, coro: Coroutine) -> Any:
+        """Выполнить корутину в фоновом loop из любого другого loop"""
+        if self.in_loop():
+            return await coro
+        return await asyncio.wrap_future(self._submit(coro))
+
+    def run_sync(self, coro: Coroutine) -> Any:
+        """Блокирующе выполнить корутину в фоновом loop"""
+        if self.in_loop():
+            raise RuntimeError("run_sync нельзя вызывать из фонового loop LLM")
+        return self._submit(coro).result()
+
+    def run_batch(self, coros: list, return_exceptions: bool = False) -> list:
+        """Конкурентно выполнить пачку корутин, сохраняя порядок результатов"""
+
+        async def _gather():
+            return await asyncio.gather(*coros, return_exceptions=return_exceptions)
+
+        return self.run_sync(_gather())
+
+    def close(self) -> None:
+        """Остановить фоновый loop"""
+        with self._lock:
+            if self._loop is None:
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+            self._loop = None
+            self._thread = None
+
+
+LLM_LOOP = LLMLoop(GIGA_MAX_CONCURRENCY)
+atexit.register(LLM_LOOP.close)
@@ -0,0 +1,254 @@
+"""Профиль вызовов GigaChat по местам вызова
+
+Для каждого call_site копятся время ответа, число повторов, токены
+(в т.ч. взятые из кэша сессии GigaChat) и размер промпта в символах. PROFILER - итоги процесса, профиль запроса
+агента включается через profile_request(). Ранжирование по p50/p95 и
+расходу токенов по журналу токенов (все процессы):
+    python -m agent.tools.llm_profiler --sort p95
+"""
+from agent.tools.settings import TOKENS_LEDGER_PATH, PROFILE_SAMPLES
+from agent.tools.token_ledger import read_records
+from contextlib import contextmanager
+from contextvars import ContextVar
+from collections import deque
+import threading
+import argparse
+import math
+import json
+
+# Границы корзин гистограммы времени ответа, сек
+LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 16, 32, float("inf"))
+
+SORT_KEYS = ("p50", "p95", "total_tokens", "calls")
+
+
+def percentile(values: list, q: float) -> float:
+    """Перцентиль по ближайшему рангу"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = math.ceil(q / 100 * len(ordered))
+    return ordered[min(len(ordered), max(rank, 1)) - 1]
+
+
+class SiteStats:
+    """Накопленная статистика одного места вызова"""
+
+    def __init__(self, samples: int = PROFILE_SAMPLES):
+        self.calls = 0
+        self.cache_hits = 0
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.prompt_chars = 0
+        self.latency_sum = 0.0
+        self.latencies = deque(maxlen=samples)
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+
+    def add(self, latency, retries, prompt_tokens, completion_tokens, prompt_chars, cached_tokens=0) -> None:
+        """Учесть вызов"""
+        self.calls += 1
+        self.retries += retries
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.cached_tokens += cached_tokens
+        self.prompt_chars += prompt_chars
+        self.latency_sum += latency
+        self.latencies.append(latency)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                self.buckets[i] += 1
+                break
+
+    def summary(self, call_site: str) -> dict:
+        """Строка отчёта"""
+        latencies = list(self.latencies)
+        return {
+            "call_site": call_site,
+            "calls": self.calls,
+            "cache_hits": self.cache_hits,
+            "retries": self.retries,
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "max": round(max(latencies, default=0.0), 3),
+            "total_time": round(self.latency_sum, 3),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.prompt_tokens + self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
+            "avg_prompt_chars": round(self.prompt_chars / self.calls) if self.calls else 0,
+        }
+
+
+class Profile:
+    """Статистика вызовов LLM, сгруппированная по call_site"""
+
+    def __init__(self, samples: int = PROFILE_SAMPLES):
+        self.samples = samples
+        self._sites = {}
+        self._lock = threading.Lock()
+
+    def _site(self, call_site: str) -> SiteStats:
+        if call_site not in self._sites:
+            self._sites[call_site] = SiteStats(self.samples)
+        return self._sites[call_site]
+
+    def record(
+        self,
+        call_site: str,
+        latency: float,
+        retries: int = 0,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        prompt_chars: int = 0,
+        cached_tokens: int = 0
+    ) -> None:
+        """Учесть вызов LLM"""
+        with self._lock:
+            self._site(call_site).add(latency, retries, prompt_tokens, completion_tokens, prompt_chars, cached_tokens)
+
+    def record_cache_hit(self, call_site: str) -> None:
+        """Учесть ответ из кэша (без обращения к GigaChat)"""
+        with self._lock:
+            self._site(call_site).cache_hits += 1
+
+    def latencies(self, call_site: str) -> list:
+        """Последние замеры времени ответа места вызова"""
+        with self._lock:
+            stats = self._sites.get(call_site)
+            return list(stats.latencies) if stats else []
+
+    def report(self, sort: str = "p95") -> list:
+        """Места вызова по убыванию sort (p50, p95, total_tokens, calls)"""
+        if sort not in SORT_KEYS:
+            raise ValueError(f"sort должен быть одним из {SORT_KEYS}")
+        with self._lock:
+            rows = [stats.summary(site) for site, stats in self._sites.items()]
+        return sorted(rows, key=lambda row: row[sort], reverse=True)
+
+    def histogram(self) -> dict:
+        """Гистограммы времени ответа: {call_site: {"<=0.25": n, ...}}"""
+        labels = [f"<={b:g}" if b != float("inf") else "+inf" for b in LATENCY_BUCKETS]
+        with self._lock:
+            return {
+                site: dict(zip(labels, stats.buckets))
+                for site, stats in self._sites.items()
+            }
+
+    def totals(self) -> dict:
+        """Суммарные вызовы, время и токены"""
+        with self._lock:
+            sites = list(self._sites.values())
+        return {
+            "calls": sum(s.calls for s in sites),
+            "cache_hits": sum(s.cache_hits for s in sites),
+            "retries": sum(s.retries for s in sites),
+            "llm_time": round(sum(s.latency_sum for s in sites), 3),
+            "prompt_tokens": sum(s.prompt_tokens for s in sites),
+            "completion_tokens": sum(s.completion_tokens for s in sites),
+            "cached_tokens": sum(s.cached_tokens for s in sites),
+        }
+
+    def reset(self) -> None:
+        """Сбросить статистику"""
+        with self._lock:
+            self._sites.clear()
+
+
+PROFILER = Profile()
+
+# Профиль текущего запроса агента (None - вне profile_request)
+REQUEST_PROFILE = ContextVar("llm_request_profile", default=None)
+
+
+def current_request():
+    """Профиль текущего запроса или None"""
+    return REQUEST_PROFILE.get()
+
+
+@contextmanager
+def profile_request():
+    """Собирать вызовы LLM внутри блока в отдельный профиль запроса"""
+    profile = Profile()
+    token = REQUEST_PROFILE.set(profile)
+    try:
+        yield profile
+    finally:
+        REQUEST_PROFILE.reset(token)
+
+
+def record_call(
+    call_site: str,
+    latency: float,
+    retries: int = 0,
+    prompt_tokens: int = 0,
+    completion_tokens: int = 0,
+    prompt_chars: int = 0,
+    cached_tokens: int = 0,
+    profile: Profile = None
+) -> None:
+    """Учесть вызов в профиле процесса и профиле запроса"""
+    args = (call_site, latency, retries, prompt_tokens, completion_tokens, prompt_chars, cached_tokens)
+    PROFILER.record(*args)
+    profile = profile or current_request()
+    if profile is not None:
+        profile.record(*args)
+
+
+def record_cache_hit(call_site: str, profile: Profile = None) -> None:
+    """Учесть попадание в кэш в профиле процесса и профиле запроса"""
+    PROFILER.record_cache_hit(call_site)
+    profile = profile or current_request()
+    if profile is not None:
+        profile.record_cache_hit(call_site)
+
+
+def format_report(rows: list) -> str:
+    """Текстовая таблица отчёта"""
+    header = (
+        f"{'call_site':<40} {'calls':>6} {'retry':>5} {'p50':>7} {'p95':>7} {'max':>7} "
+        f"{'prompt':>9} {'cached':>8} {'compl':>8} {'chars':>7}"
+    )
+    lines = [header, "-" * len(header)]
+    for row in rows:
+        lines.append(
+            f"{row['call_site'][:40]:<40} {row['calls']:>6} {row['retries']:>5} "
+            f"{row['p50']:>7.2f} {row['p95']:>7.2f} {row['max']:>7.2f} "
+            f"{row['prompt_tokens']:>9} {row['cached_tokens']:>8} "
+            f"{row['completion_tokens']:>8} {row['avg_prompt_chars']:>7}"
+        )
+    return "\n".join(lines)
+
+
+def profile_from_ledger(path: str = TOKENS_LEDGER_PATH) -> Profile:
+    """Профиль по записям журнала токенов всех процессов"""
+    profile = Profile(samples=None)
+    for record in read_records(path):
+        profile.record(
+            record.get("call_site") or "unknown",
+            record.get("latency", 0.0),
+            record.get("retries", 0),
+            record.get("prompt_tokens", 0),
+            record.get("completion_tokens", 0),
+            record.get("prompt_chars", 0),
+            record.get("cached_tokens", 0)
+        )
+    return profile
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Профиль вызовов GigaChat по местам вызова")
+    parser.add_argument("--ledger", default=TOKENS_LEDGER_PATH)
+    parser.add_argument("--sort", default="p95", choices=SORT_KEYS)
+    parser.add_argument("--json", action="store_true", help="Вывод в JSON с гистограммами")
+    args = parser.parse_args()
+    ledger_profile = profile_from_ledger(args.ledger)
+    if args.json:
+        print(json.dumps({
+            "report": ledger_profile.report(args.sort),
+            "histogram": ledger_profile.histogram(),
+            "totals": ledger_profile.totals(),
+        }, ensure_ascii=False, indent=2))
+    else:
+        print(format_report(ledger_profile.report(args.sort)))
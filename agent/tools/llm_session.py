@@ -0,0 +1,32 @@
+"""Сессии GigaChat для кэширования префикса промптов
+
+GigaChat кэширует обработанный префикс сообщений в пределах сессии
+(заголовок X-Session-ID): если следующий запрос начинается с того же
+системного промпта и той же статичной части, эти токены не обрабатываются
+заново и возвращаются в usage как precached_prompt_tokens. Поэтому запуск
+агента и многошаговые инструменты отправляют все вызовы с одним
+идентификатором, а изменяемая часть промпта стоит в конце.
+"""
+from agent.tools.settings import SESSION_CACHE
+from gigachat.context import session_id_cvar
+from contextlib import contextmanager
+from uuid import uuid4
+
+
+def current_session():
+    """Идентификатор сессии текущего контекста или None"""
+    return session_id_cvar.get()
+
+
+@contextmanager
+def llm_session(session_id: str = None, enabled: bool = SESSION_CACHE):
+    """Отправлять вызовы LLM внутри блока с одним X-Session-ID"""
+    if not enabled:
+        yield None
+        return
+    session_id = session_id or str(uuid4())
+    token = session_id_cvar.set(session_id)
+    try:
+        yield session_id
+    finally:
+        session_id_cvar.reset(token)
@@ -0,0 +1,115 @@
+"""Маршрутизация вызовов GigaChat по моделям
+
+Каждое место вызова (call_site) получает модель и температуру из
+таблицы маршрутов. Простые массовые вызовы (классификация, исправление
+JSON, ответ на нерелевантный запрос) идут в лёгкую модель, остальные -
+в модель по умолчанию. Если ответ лёгкой модели не разбирается, место
+вызова переспрашивает модель эскалации.
+
+Таблица по умолчанию дополняется JSON файлом GIGA_ROUTES_FILE и
+переменной GIGA_ROUTES того же формата:
+    {"classification": {"model": "GigaChat-2", "temperature": 0.1, "escalate": "GigaChat-2-Max"}}
+Маршрут ищется по точному call_site, затем по его префиксам
+("agent.step.repair" -> "agent.step" -> "agent").
+"""
+from agent.tools.settings import (
+    MODEL_DEFAULT,
+    MODEL_LIGHT,
+    MODEL_TEMPERATURE,
+    ROUTES_FILE,
+    ROUTES_JSON,
+)
+from loguru import logger
+import threading
+import json
+
+DEFAULT_ROUTES = {
+    "classification": {"model": MODEL_LIGHT, "escalate": MODEL_DEFAULT},
+    "classification.final": {"model": MODEL_LIGHT},
+    "agent.step.repair": {"model": MODEL_LIGHT, "escalate": MODEL_DEFAULT},
+}
+
+
+def load_routes(path: str = ROUTES_FILE, inline: str = ROUTES_JSON) -> dict:
+    """Таблица маршрутов: по умолчанию + файл + переменная окружения"""
+    routes = {site: dict(route) for site, route in DEFAULT_ROUTES.items()}
+    sources = []
+    if path:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                sources.append(json.load(f))
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Не удалось прочитать таблицу маршрутов {path}: {e}")
+    if inline:
+        try:
+            sources.append(json.loads(inline))
+        except json.JSONDecodeError as e:
+            logger.warning(f"Некорректный GIGA_ROUTES: {e}")
+    for source in sources:
+        for site, route in source.items():
+            routes.setdefault(site, {}).update(route)
+    return routes
+
+
+class ModelRouter:
+    """Выбор модели и температуры по месту вызова"""
+
+    def __init__(
+        self,
+        routes: dict = None,
+        default_model: str = MODEL_DEFAULT,
+        default_temperature: float = MODEL_TEMPERATURE
+    ):
+        self.routes = DEFAULT_ROUTES if routes is None else routes
+        self.default_model = default_model
+        self.default_temperature = default_temperature
+        self.escalations = {}
+        self._lock = threading.Lock()
+
+    def _find(self, call_site: str) -> dict:
+        """Маршрут по call_site или ближайшему префиксу"""
+        parts = (call_site or "").split(".")
+        while parts:
+            route = self.routes.get(".".join(parts))
+            if route is not None:
+                return route
+            parts.pop()
+        return {}
+
+    def route(self, call_site: str, escalate: bool = False) -> tuple:
+        """(модель, температура) для места вызова
+
+        escalate=True - модель эскалации маршрута (по умолчанию основная).
+        """
+        route = self._find(call_site)
+        temperature = route.get("temperature", self.default_temperature)
+        if not escalate:
+            return route.get("model", self.default_model), temperature
+        model = route.get("escalate", self.default_model)
+        with self._lock:
+            self.escalations[call_site] = self.escalations.get(call_site, 0) + 1
+        logger.info(f"{call_site}: эскалация на модель {model}")
+        return model, temperature
+
+    def resolve(self, call_site: str, model_name: str = None, temperature: float = None) -> tuple:
+        """Дополнить явно заданные модель и температуру значениями маршрута"""
+        if model_name is not None and temperature is not None:
+            return model_name, temperature
+        route_model, route_temperature = self.route(call_site)
+        return (
+            route_model if model_name is None else model_name,
+            route_temperature if temperature is None else temperature
+        )
+
+    def stats(self) -> dict:
+        """Таблица маршрутов и число эскалаций по местам вызова"""
+        with self._lock:
+            escalations = dict(self.escalations)
+        return {
+            "default": {"model": self.default_model, "temperature": self.default_temperature},
+            "routes": self.routes,
+            "escalations": escalations,
+        }
+
+
+ROUTER = ModelRouter(load_routes())
@@ -0,0 +1,277 @@
+"""Спекулятивная предзагрузка на время работы агента
+
+Пока идут классификация и планирование, в фоне выполняется поиск по базе
+знаний (get_relevant, без LLM) по тексту запроса и клонирование
+репозиториев, названных в запросе. Если агент выбирает search_content с
+тем же запросом, инструмент получает готовый результат поиска; git_clone
+инструментов оценки забирает готовый клон из каталога .prefetch (в том
+числе в процессе Flask API). Клон репозитория общий для запусков,
+назвавших его в запросе: он убирается, когда завершился последний из них,
+и засчитывается попаданием, только если инструмент действительно его
+забрал. Невостребованное отбрасывается и учитывается как лишняя работа.
+"""
+from agent.tools.settings import PREFETCH_ENABLED, PREFETCH_WAIT, PREFETCH_REPOS_TTL
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from time import time, perf_counter
+from loguru import logger
+import contextvars
+import threading
+import re
+
+# Предзагрузка текущего запуска агента
+PREFETCH_RUN = ContextVar("agent_prefetch_run", default=None)
+
+# Кандидаты в имена репозиториев: слова из латиницы, цифр, "-", "_" и "."
+SLUG_PATTERN = re.compile(r"[A-Za-z0-9][A-Za-z0-9._-]*[A-Za-z0-9]")
+
+
+def _timed(fn, *args):
+    """(результат, секунды выполнения)"""
+    start = perf_counter()
+    result = fn(*args)
+    return result, perf_counter() - start
+
+
+def _search_relevant(query: str) -> dict:
+    from tools.search_content import Search
+    return Search().get_relevant(query)
+
+
+def _clone(repo: str) -> dict:
+    from tools.git import Git
+    return Git().prefetch_clone(repo)
+
+
+def _settle_prefetched(repo: str) -> str:
+    from tools.git import Git
+    return Git().settle_prefetched(repo)
+
+
+def _list_repos() -> set:
+    """Репозитории проекта BitBucket и уже склонированные локально"""
+    from tools.bitbucket import ConnectionAPI
+    from tools.git import PREFETCH_DIR
+    api = ConnectionAPI()
+    repos = set()
+    result = api.get_repos_list()
+    if result.get("status") == 200:
+        repos.update(r for r in result["answer"] if r)
+    clone_dir = Path(api.clone_repo_path)
+    if clone_dir.is_dir():
+        repos.update(p.name for p in clone_dir.iterdir() if p.is_dir() and p.name != PREFETCH_DIR)
+    return repos
+
+
+class PrefetchRun:
+    """Задачи предзагрузки одного запуска агента"""
+
+    def __init__(self, query: str):
+        self.query = query
+        self.search = None
+        self.search_used = False
+        self.clones = {}
+        self.closed = False
+        self.started = time()
+        self.lock = threading.Lock()
+
+    def summary(self) -> dict:
+        """Что было предзагружено и что из этого пригодилось"""
+        return {
+            "search": None if self.search is None else ("hit" if self.search_used else "wasted"),
+            "clones": list(self.clones),
+        }
+
+
+class Prefetcher:
+    """Фоновая предзагрузка поиска и клонов со статистикой попаданий"""
+
+    def __init__(
+        self,
+        enabled: bool = PREFETCH_ENABLED,
+        max_workers: int = 2,
+        wait: float = PREFETCH_WAIT,
+        repos_ttl: float = PREFETCH_REPOS_TTL
+    ):
+        self.enabled = enabled
+        self.wait = wait
+        self.repos_ttl = repos_ttl
+        self.counters = {
+            "runs": 0,
+            "search_started": 0, "search_hits": 0, "search_wasted": 0,
+            "clone_started": 0, "clone_hits": 0, "clone_wasted": 0,
+            "errors": 0,
+            "saved_seconds": 0.0, "wasted_seconds": 0.0,
+        }
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="prefetch")
+        self._repos = (0.0, set())
+        # Запуски, ожидающие клон репозитория, и время клонирования в этом процессе
+        self._clone_refs = {}
+        self._clone_seconds = {}
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def _count(self, key: str, value=1) -> None:
+        with self._lock:
+            self.counters[key] += value
+
+    def _submit(self, fn, *args):
+        return self._pool.submit(contextvars.copy_context().run, _timed, fn, *args)
+
+    def known_repos(self, wait: bool = True) -> set:
+        """Имена репозиториев, кэш на repos_ttl секунд
+
+        wait=False не ждёт BitBucket: возвращает текущий кэш (возможно
+        пустой) и обновляет его в фоне.
+        """
+        with self._lock:
+            loaded, repos = self._repos
+            stale = time() - loaded >= self.repos_ttl
+            refresh = stale and not wait and not self._refreshing
+            if refresh:
+                self._refreshing = True
+        if not stale:
+            return repos
+        if not wait:
+            if refresh:
+                self._pool.submit(self._refresh_repos)
+            return repos
+        try:
+            repos = _list_repos()
+        except Exception as e:
+            logger.debug(f"Список репозиториев для предзагрузки недоступен: {str(e)}")
+            repos = set()
+        with self._lock:
+            self._repos = (time(), repos)
+        return repos
+
+    def _refresh_repos(self) -> None:
+        try:
+            self.known_repos()
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def detect_repos(self, query: str, limit: int = 2) -> list:
+        """Известные репозитории, названные в запросе"""
+        known = {repo.lower(): repo for repo in self.known_repos()}
+        found = []
+        for word in SLUG_PATTERN.findall(query):
+            repo = known.get(word.lower())
+            if repo and repo not in found:
+                found.append(repo)
+        return found[:limit]
+
+    def _prefetch_repos(self, run: PrefetchRun) -> None:
+        """Найти репозитории в запросе и запустить их клонирование"""
+        for repo in self.detect_repos(run.query):
+            with run.lock:
+                if run.closed:
+                    return
+                with self._lock:
+                    self._clone_refs[repo] = self._clone_refs.get(repo, 0) + 1
+                run.clones[repo] = self._submit(_clone, repo)
+            self._count("clone_started")
+
+    @contextmanager
+    def run(self, query: str):
+        """Предзагрузка на время запуска агента; в конце - учёт попаданий и уборка"""
+        if not self.enabled or not query:
+            yield None
+            return
+        run = PrefetchRun(query)
+        self._count("runs")
+        run.search = self._submit(_search_relevant, query)
+        self._count("search_started")
+        self._pool.submit(contextvars.copy_context().run, self._prefetch_repos, run)
+        token = PREFETCH_RUN.set(run)
+        try:
+            yield run
+        finally:
+            PREFETCH_RUN.reset(token)
+            self._finish(run)
+
+    def take_search(self, query: str):
+        """Готовый результат поиска для search_content с тем же запросом (None - промах)"""
+        run = PREFETCH_RUN.get()
+        if run is None or run.search is None or run.search_used or query != run.query:
+            return None
+        waited = perf_counter()
+        try:
+            result, seconds = run.search.result(timeout=self.wait)
+        except FutureTimeout:
+            return None
+        except Exception as e:
+            logger.debug(f"Ошибка предзагрузки поиска: {str(e)}")
+            self._count("errors")
+            return None
+        waited = perf_counter() - waited
+        run.search_used = True
+        self._count("search_hits")
+        self._count("saved_seconds", max(0.0, seconds - waited))
+        return result
+
+    def _finish(self, run: PrefetchRun) -> None:
+        """Невостребованный поиск и неиспользованные клоны - в лишнюю работу"""
+        with run.lock:
+            run.closed = True
+            clones = dict(run.clones)
+        if run.search is not None and not run.search_used:
+            self._count("search_wasted")
+            if not run.search.cancel():
+                run.search.add_done_callback(self._wasted_time)
+        for repo, future in clones.items():
+            future.add_done_callback(lambda f, repo=repo: self._settle_clone(repo, f))
+        logger.debug(f"Предзагрузка запуска: {run.summary()}")
+
+    def _wasted_time(self, future) -> None:
+        try:
+            _, seconds = future.result()
+        except Exception:
+            self._count("errors")
+            return
+        self._count("wasted_seconds", seconds)
+
+    def _settle_clone(self, repo: str, future) -> None:
+        """После последнего запуска, ждавшего клон: забран git_clone - попадание,
+        остался в .prefetch - удаляется как лишняя работа"""
+        try:
+            result, seconds = future.result()
+        except Exception:
+            self._count("errors")
+            result, seconds = {}, 0.0
+        if result.get("cloned"):
+            with self._lock:
+                self._clone_seconds[repo] = self._clone_seconds.get(repo, 0.0) + seconds
+        elif result and result.get("status") not in (200, 409):
+            self._count("errors")
+        with self._lock:
+            self._clone_refs[repo] -= 1
+            if self._clone_refs[repo] > 0:
+                return
+            del self._clone_refs[repo]
+            seconds = self._clone_seconds.pop(repo, 0.0)
+        outcome = _settle_prefetched(repo)
+        if outcome == "taken":
+            self._count("clone_hits")
+            self._count("saved_seconds", seconds)
+        elif outcome == "discarded":
+            self._count("clone_wasted")
+            self._count("wasted_seconds", seconds)
+
+    def stats(self) -> dict:
+        """Попадания, лишняя работа и сэкономленное время"""
+        with self._lock:
+            result = dict(self.counters)
+        for kind in ("search", "clone"):
+            settled = result[f"{kind}_hits"] + result[f"{kind}_wasted"]
+            result[f"{kind}_hit_rate"] = round(result[f"{kind}_hits"] / settled, 4) if settled else 0.0
+        result["saved_seconds"] = round(result["saved_seconds"], 3)
+        result["wasted_seconds"] = round(result["wasted_seconds"], 3)
+        result["enabled"] = self.enabled
+        return result
+
+
+PREFETCHER = Prefetcher()
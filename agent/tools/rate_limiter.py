@@ -0,0 +1,298 @@
+"""Ограничение частоты запросов к GigaChat: token bucket на RPS и TPM
+
+Состояние вёдер хранится в SQLite (GIGA_RATE_STATE), поэтому лимит общий
+для всех потоков и процессов хоста: Flask воркеров и запусков агента.
+Каждая попытка запроса (в т.ч. повтор) забирает один запрос из ведра RPS
+и оценку токенов из ведра TPM; после ответа оценка уточняется по usage.
+Асинхронные вызовы обращаются к общему SQLite файлу из пула потоков,
+чтобы транзакция BEGIN IMMEDIATE не блокировала event loop.
+
+Приоритеты: interactive (шаги агента) и batch (оценка репозиториев,
+генерация README). Внутри процесса batch ждёт, пока есть ожидающие
+interactive запросы, а между процессами batch не может забрать последние
+GIGA_RATE_BATCH_RESERVE ёмкости ведра.
+"""
+from agent.tools.settings import (
+    RATE_RPS,
+    RATE_BURST,
+    RATE_TPM,
+    RATE_STATE_PATH,
+    RATE_BATCH_RESERVE,
+    RATE_BATCH_SITES,
+    RATE_COMPLETION_ESTIMATE,
+)
+from agent.memory.prompt_budget import estimate_tokens
+from agent.tools.llm_profiler import percentile
+from contextlib import contextmanager
+from contextvars import ContextVar
+from collections import deque
+from pathlib import Path
+from loguru import logger
+from time import time, sleep, monotonic
+import threading
+import sqlite3
+import asyncio
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+PRIORITIES = (INTERACTIVE, BATCH)
+
+# Приоритет текущего вызова LLM (выставляется по call_site в run_giga)
+CALL_PRIORITY = ContextVar("giga_call_priority", default=INTERACTIVE)
+
+
+def priority_for(call_site: str) -> str:
+    """Класс приоритета по префиксу места вызова"""
+    if call_site and call_site.startswith(RATE_BATCH_SITES):
+        return BATCH
+    return INTERACTIVE
+
+
+def set_call_priority(call_site: str) -> None:
+    """Выставить приоритет для следующего запроса в текущем контексте"""
+    CALL_PRIORITY.set(priority_for(call_site))
+
+
+class BucketStore:
+    """Уровни вёдер: в памяти процесса или в общем SQLite файле"""
+
+    def __init__(self, path: str = RATE_STATE_PATH):
+        self.path = Path(path) if path else None
+        self._levels = {}
+        self._lock = threading.Lock()
+        self._db_ready = False
+
+    @contextmanager
+    def _connect(self):
+        """Транзакция с эксклюзивной блокировкой записи"""
+        if not self._db_ready:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        try:
+            if not self._db_ready:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS buckets ("
+                    "name TEXT PRIMARY KEY, level REAL, updated REAL)"
+                )
+                self._db_ready = True
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _take(levels: dict, needs: list, now: float) -> float:
+        """Забрать amount из всех вёдер или вернуть паузу до готовности
+
+        needs: [(name, amount, capacity, rate, reserve)]. levels изменяется
+        на месте: {name: (level, updated)}.
+        """
+        wait = 0.0
+        refilled = {}
+        for name, amount, capacity, rate, reserve in needs:
+            level, updated = levels.get(name, (capacity, now))
+            level = min(capacity, level + rate * max(0.0, now - updated))
+            refilled[name] = level
+            # Запрос больше ёмкости не должен ждать вечно - уходит в долг
+            need = min(amount, capacity * (1 - reserve)) + capacity * reserve
+            if level < need:
+                wait = max(wait, (need - level) / rate)
+        for name, amount, *_ in needs:
+            level = refilled[name] - (amount if wait == 0 else 0)
+            levels[name] = (level, now)
+        return wait
+
+    def take(self, needs: list) -> float:
+        """Атомарно забрать ресурсы; 0 - успешно, иначе пауза в секундах"""
+        now = time()
+        if self.path is None:
+            with self._lock:
+                return self._take(self._levels, needs, now)
+        try:
+            with self._connect() as conn:
+                names = [n[0] for n in needs]
+                rows = conn.execute(
+                    f"SELECT name, level, updated FROM buckets WHERE name IN ({','.join('?' * len(names))})",
+                    names
+                ).fetchall()
+                levels = {name: (level, updated) for name, level, updated in rows}
+                wait = self._take(levels, needs, now)
+                conn.executemany(
+                    "INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)",
+                    [(name, level, updated) for name, (level, updated) in levels.items()]
+                )
+                return wait
+        except sqlite3.Error as e:
+            # Общее состояние недоступно - ограничиваем хотя бы в процессе
+            logger.warning(f"Ошибка состояния rate limiter {self.path}: {e}")
+            with self._lock:
+                return self._take(self._levels, needs, now)
+
+    def adjust(self, name: str, delta: float, capacity: float) -> None:
+        """Вернуть (delta < 0) или дозабрать (delta > 0) ресурс без ожидания"""
+        now = time()
+        if self.path is None:
+            with self._lock:
+                level, updated = self._levels.get(name, (capacity, now))
+                self._levels[name] = (min(capacity, level - delta), updated)
+            return
+        try:
+            with self._connect() as conn:
+                row = conn.execute("SELECT level, updated FROM buckets WHERE name = ?", (name,)).fetchone()
+                level, updated = row if row else (capacity, now)
+                conn.execute(
+                    "INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)",
+                    (name, min(capacity, level - delta), updated)
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Ошибка состояния rate limiter {self.path}: {e}")
+
+
+class RateLimiter:
+    """Token bucket на запросы в секунду и токены в минуту с приоритетами"""
+
+    def __init__(
+        self,
+        rps: float = RATE_RPS,
+        burst: float = RATE_BURST,
+        tpm: float = RATE_TPM,
+        store: BucketStore = None,
+        batch_reserve: float = RATE_BATCH_RESERVE,
+        completion_estimate: int = RATE_COMPLETION_ESTIMATE
+    ):
+        self.rps = rps
+        self.burst = burst or max(1.0, rps)
+        self.tpm = tpm
+        self.store = store or BucketStore()
+        self.batch_reserve = batch_reserve
+        self.completion_estimate = completion_estimate
+        self._waiting = {p: 0 for p in PRIORITIES}
+        self._waits = {p: deque(maxlen=1000) for p in PRIORITIES}
+        self._counters = {p: {"acquired": 0, "delayed": 0, "wait_total": 0.0} for p in PRIORITIES}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """Задан ли хотя бы один лимит"""
+        return self.rps > 0 or self.tpm > 0
+
+    def estimate(self, messages: list) -> int:
+        """Оценка токенов запроса: промпт + ожидаемый ответ"""
+        prompt = sum(estimate_tokens(str(getattr(m, "content", m))) for m in messages)
+        return prompt + self.completion_estimate
+
+    def _needs(self, tokens: int, priority: str) -> list:
+        reserve = self.batch_reserve if priority == BATCH else 0.0
+        needs = []
+        if self.rps > 0:
+            needs.append(("rps", 1, self.burst, self.rps, reserve))
+        if self.tpm > 0:
+            needs.append(("tpm", tokens, self.tpm, self.tpm / 60, reserve))
+        return needs
+
+    def _blocked(self, priority: str) -> bool:
+        """Есть ли в процессе ожидающие запросы более высокого приоритета"""
+        with self._lock:
+            return any(self._waiting[p] for p in PRIORITIES[:PRIORITIES.index(priority)])
+
+    def _enter(self, priority: str) -> float:
+        with self._lock:
+            self._waiting[priority] += 1
+        return monotonic()
+
+    def _leave(self, priority: str, start: float) -> None:
+        waited = monotonic() - start
+        with self._lock:
+            self._waiting[priority] -= 1
+            counters = self._counters[priority]
+            counters["acquired"] += 1
+            counters["wait_total"] += waited
+            if waited > 0.001:
+                counters["delayed"] += 1
+            self._waits[priority].append(waited)
+        if waited > 1:
+            logger.info(f"Rate limiter GigaChat: ожидание {waited:.2f} с ({priority})")
+
+    def _next_wait(self, tokens: int, priority: str) -> float:
+        if self._blocked(priority):
+            return 0.05
+        return self.store.take(self._needs(tokens, priority))
+
+    async def _off_loop(self, func, *args):
+        """Вызов хранилища из корутины: SQLite - в потоке, память - сразу"""
+        if self.store.path is None:
+            return func(*args)
+        return await asyncio.to_thread(func, *args)
+
+    def acquire(self, tokens: int = 0, priority: str = None) -> float:
+        """Дождаться разрешения на запрос; вернуть время ожидания"""
+        if not self.enabled:
+            return 0.0
+        priority = priority or CALL_PRIORITY.get()
+        start = self._enter(priority)
+        try:
+            while True:
+                wait = self._next_wait(tokens, priority)
+                if wait <= 0:
+                    break
+                sleep(min(wait, 0.5))
+        finally:
+            self._leave(priority, start)
+        return monotonic() - start
+
+    async def aacquire(self, tokens: int = 0, priority: str = None) -> float:
+        """Асинхронный аналог acquire"""
+        if not self.enabled:
+            return 0.0
+        priority = priority or CALL_PRIORITY.get()
+        start = self._enter(priority)
+        try:
+            while True:
+                wait = await self._off_loop(self._next_wait, tokens, priority)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(min(wait, 0.5))
+        finally:
+            self._leave(priority, start)
+        return monotonic() - start
+
+    def settle(self, estimated: int, actual: int) -> None:
+        """Уточнить расход токенов по фактическому usage ответа"""
+        if self.tpm > 0 and actual and actual != estimated:
+            self.store.adjust("tpm", actual - estimated, self.tpm)
+
+    async def asettle(self, estimated: int, actual: int) -> None:
+        """Асинхронный аналог settle"""
+        await self._off_loop(self.settle, estimated, actual)
+
+    def stats(self) -> dict:
+        """Лимиты, ожидающие запросы и время ожидания в очереди по приоритетам"""
+        with self._lock:
+            queue = {}
+            for priority in PRIORITIES:
+                waits = list(self._waits[priority])
+                counters = self._counters[priority]
+                queue[priority] = {
+                    **counters,
+                    "wait_total": round(counters["wait_total"], 3),
+                    "waiting": self._waiting[priority],
+                    "wait_p50": round(percentile(waits, 50), 3),
+                    "wait_p95": round(percentile(waits, 95), 3),
+                }
+        return {
+            "enabled": self.enabled,
+            "rps": self.rps,
+            "burst": self.burst,
+            "tpm": self.tpm,
+            "shared_state": str(self.store.path) if self.store.path else None,
+            "queue": queue,
+        }
+
+
+LIMITER = RateLimiter()
@@ -0,0 +1,301 @@
+"""Локальный классификатор релевантности запросов
+
+Первая ступень перед LLM классификацией: логистическая регрессия на
+плотных векторах BGE-M3 (модель поиска, если установлен FlagEmbedding)
+или на хешированных символьных n-граммах. Вероятность релевантности вне
+полосы [AGENT_RELEVANCE_LOW, AGENT_RELEVANCE_HIGH] принимается без
+вызова GigaChat, внутри полосы запрос уходит в LLM классификацию.
+
+Вердикты LLM пишутся в журнал AGENT_RELEVANCE_LOG (если задан), по нему (и по
+размеченным вручную файлам того же формата) обучается модель:
+    python -m agent.tools.relevance --train output/relevance_queries.jsonl --encoder auto
+"""
+from agent.tools.settings import (
+    RELEVANCE_LOCAL,
+    RELEVANCE_MODEL_PATH,
+    RELEVANCE_LOG_PATH,
+    RELEVANCE_LOW,
+    RELEVANCE_HIGH,
+)
+from pathlib import Path
+from loguru import logger
+from time import time
+import threading
+import argparse
+import random
+import fcntl
+import json
+import math
+import zlib
+import os
+import re
+
+ENCODERS = ("auto", "bge", "ngram")
+
+
+class NgramEncoder:
+    """Хешированные символьные n-граммы: без внешних зависимостей"""
+    name = "ngram"
+
+    def __init__(self, sizes: tuple = (2, 3, 4), dim: int = 2 ** 18):
+        self.sizes = sizes
+        self.dim = dim
+
+    def _features(self, text: str) -> dict:
+        text = " " + re.sub(r"\s+", " ", text.lower()).strip() + " "
+        counts = {}
+        for n in self.sizes:
+            for i in range(len(text) - n + 1):
+                index = zlib.crc32(text[i:i + n].encode("utf-8")) % self.dim
+                counts[index] = counts.get(index, 0) + 1
+        weights = {i: 1 + math.log(c) for i, c in counts.items()}
+        norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+        return {i: w / norm for i, w in weights.items()}
+
+    def encode(self, texts: list) -> list:
+        """Разреженные векторы {индекс: вес}"""
+        return [self._features(text) for text in texts]
+
+
+class BgeEncoder:
+    """Плотные векторы BGE-M3 из уже загруженной модели поиска"""
+    name = "bge"
+
+    def __init__(self, model):
+        self.model = model
+
+    def encode(self, texts: list) -> list:
+        """Векторы в виде {индекс: значение}"""
+        vecs = self.model.encode(texts, return_dense=True)["dense_vecs"]
+        return [dict(enumerate(float(v) for v in vec)) for vec in vecs]
+
+
+def get_encoder(name: str = "auto"):
+    """Кодировщик по имени; auto - BGE-M3, если модель доступна (None - недоступен)"""
+    if name in ("auto", "bge"):
+        from tools.search_content import load_bge_model
+        model = load_bge_model(os.getenv("PATH_MODEL_M3"))
+        if model is not None:
+            return BgeEncoder(model)
+        if name == "bge":
+            return None
+    return NgramEncoder()
+
+
+def _sigmoid(z: float) -> float:
+    if z < -30:
+        return 0.0
+    if z > 30:
+        return 1.0
+    return 1 / (1 + math.exp(-z))
+
+
+class RelevanceClassifier:
+    """Логистическая регрессия релевантности с полосой неопределённости"""
+
+    def __init__(
+        self,
+        encoder: str = None,
+        weights: dict = None,
+        bias: float = 0.0,
+        low: float = RELEVANCE_LOW,
+        high: float = RELEVANCE_HIGH
+    ):
+        self.encoder_name = encoder
+        self.weights = weights or {}
+        self.bias = bias
+        self.low = low
+        self.high = high
+        self.counters = {"relevant": 0, "not_relevant": 0, "uncertain": 0}
+        self._encoder = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """Есть ли обученная модель"""
+        return bool(self.encoder_name and self.weights)
+
+    @property
+    def encoder(self):
+        """Кодировщик загружается при первом обращении"""
+        with self._lock:
+            if self._encoder is None and self.encoder_name:
+                self._encoder = get_encoder(self.encoder_name)
+                if self._encoder is None:
+                    logger.warning(f"Кодировщик {self.encoder_name} недоступен, классификатор релевантности отключён")
+                    self.encoder_name = None
+            return self._encoder
+
+    def _score(self, features: dict) -> float:
+        return _sigmoid(self.bias + sum(self.weights.get(i, 0.0) * v for i, v in features.items()))
+
+    def fit(
+        self,
+        queries: list,
+        labels: list,
+        encoder: str = "auto",
+        epochs: int = 30,
+        lr: float = 0.5,
+        l2: float = 1e-4,
+        seed: int = 13
+    ) -> "RelevanceClassifier":
+        """Обучить по запросам и меткам (True - релевантный)"""
+        self._encoder = get_encoder(encoder)
+        self.encoder_name = self._encoder.name
+        data = list(zip(self._encoder.encode(queries), labels))
+        positives = sum(1 for label in labels if label) or 1
+        negatives = (len(labels) - positives) or 1
+        # Веса классов уравнивают вклад редких нерелевантных запросов
+        class_weight = {True: len(labels) / (2 * positives), False: len(labels) / (2 * negatives)}
+        rng = random.Random(seed)
+        self.weights, self.bias = {}, 0.0
+        for epoch in range(epochs):
+            rng.shuffle(data)
+            step = lr / (1 + epoch * 0.1)
+            for features, label in data:
+                gradient = (self._score(features) - float(label)) * class_weight[bool(label)]
+                self.bias -= step * gradient
+                for i, v in features.items():
+                    w = self.weights.get(i, 0.0)
+                    self.weights[i] = w - step * (gradient * v + l2 * w)
+        return self
+
+    def probability(self, query: str) -> float:
+        """Вероятность, что запрос релевантен"""
+        return self._score(self.encoder.encode([query])[0])
+
+    def predict(self, query: str) -> tuple:
+        """(вердикт, уверенность): True/False или None в полосе неопределённости"""
+        if not self.enabled or self.encoder is None:
+            return None, 0.0
+        p = self.probability(query)
+        verdict = True if p >= self.high else False if p <= self.low else None
+        key = {True: "relevant", False: "not_relevant", None: "uncertain"}[verdict]
+        with self._lock:
+            self.counters[key] += 1
+        return verdict, round(max(p, 1 - p), 4)
+
+    def save(self, path: str = RELEVANCE_MODEL_PATH) -> None:
+        """Сохранить модель в JSON"""
+        file_path = Path(path)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "encoder": self.encoder_name,
+                "bias": self.bias,
+                "weights": {str(i): round(w, 6) for i, w in self.weights.items() if abs(w) > 1e-6},
+            }, f)
+
+    @classmethod
+    def load(
+        cls,
+        path: str = RELEVANCE_MODEL_PATH,
+        low: float = RELEVANCE_LOW,
+        high: float = RELEVANCE_HIGH
+    ) -> "RelevanceClassifier":
+        """Модель из JSON; нет файла - выключенный классификатор"""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Модель релевантности {path} не загружена: {e}")
+            return cls(low=low, high=high)
+        return cls(
+            encoder=data["encoder"],
+            weights={int(i): w for i, w in data["weights"].items()},
+            bias=data["bias"],
+            low=low,
+            high=high
+        )
+
+    def stats(self) -> dict:
+        """Решения локально и в полосе неопределённости"""
+        with self._lock:
+            result = dict(self.counters)
+        total = sum(result.values())
+        result["enabled"] = self.enabled
+        result["encoder"] = self.encoder_name
+        result["band"] = [self.low, self.high]
+        result["local_rate"] = round(1 - result["uncertain"] / total, 4) if total else 0.0
+        return result
+
+
+_LOG_LOCK = threading.Lock()
+
+
+def log_verdict(query: str, relevant: bool, source: str, path: str = RELEVANCE_LOG_PATH) -> None:
+    """Записать размеченный запрос в журнал обучения"""
+    if not path:
+        return
+    line = json.dumps({"ts": round(time(), 3), "query": query, "label": bool(relevant), "source": source}, ensure_ascii=False)
+    try:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with _LOG_LOCK, open(path, "a", encoding="utf-8") as f:
+            fcntl.lockf(f, fcntl.LOCK_EX)
+            try:
+                f.write(line + "\n")
+            finally:
+                fcntl.lockf(f, fcntl.LOCK_UN)
+    except OSError as e:
+        logger.warning(f"Не удалось записать журнал релевантности {path}: {e}")
+
+
+def read_labeled(paths: list) -> tuple:
+    """(запросы, метки) из журналов; повтор запроса - берётся последняя метка"""
+    labeled = {}
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if item.get("query"):
+                    labeled[item["query"]] = bool(item["label"])
+    return list(labeled), list(labeled.values())
+
+
+def evaluate(classifier: RelevanceClassifier, queries: list, labels: list) -> dict:
+    """Точность, доля локальных решений и точность на них"""
+    correct, covered, covered_correct = 0, 0, 0
+    for query, label in zip(queries, labels):
+        p = classifier.probability(query)
+        correct += (p >= 0.5) == label
+        if p >= classifier.high or p <= classifier.low:
+            covered += 1
+            covered_correct += (p >= classifier.high) == label
+    total = len(queries) or 1
+    return {
+        "examples": len(queries),
+        "accuracy": round(correct / total, 4),
+        "coverage": round(covered / total, 4),
+        "covered_accuracy": round(covered_correct / covered, 4) if covered else 0.0,
+    }
+
+
+RELEVANCE = RelevanceClassifier.load() if RELEVANCE_LOCAL else RelevanceClassifier()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Обучение локального классификатора релевантности")
+    parser.add_argument("--train", nargs="+", required=True, help="JSONL журналы {query, label}")
+    parser.add_argument("--encoder", default="auto", choices=ENCODERS)
+    parser.add_argument("--out", default=RELEVANCE_MODEL_PATH)
+    parser.add_argument("--holdout", type=float, default=0.2, help="Доля примеров для проверки")
+    parser.add_argument("--low", type=float, default=RELEVANCE_LOW, help="Полоса неопределённости для проверки")
+    parser.add_argument("--high", type=float, default=RELEVANCE_HIGH)
+    args = parser.parse_args()
+    all_queries, all_labels = read_labeled(args.train)
+    pairs = list(zip(all_queries, all_labels))
+    random.Random(13).shuffle(pairs)
+    split = int(len(pairs) * (1 - args.holdout))
+    train, test = pairs[:split], pairs[split:]
+    model = RelevanceClassifier(low=args.low, high=args.high).fit(
+        [q for q, _ in train], [label for _, label in train], encoder=args.encoder
+    )
+    if test:
+        print(json.dumps(evaluate(model, *map(list, zip(*test))), ensure_ascii=False, indent=2))
+    # Итоговая модель обучается на всех примерах
+    model.fit(all_queries, all_labels, encoder=args.encoder)
+    model.save(args.out)
+    print(f"Модель ({model.encoder_name}, {len(all_queries)} примеров) сохранена в {args.out}")
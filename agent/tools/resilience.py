@@ -0,0 +1,353 @@
+"""Устойчивость вызовов GigaChat: retry с backoff, бюджет повторов, circuit breaker
+
+- повторяются только временные ошибки: таймауты, сетевые сбои, 429 и 5xx;
+- пауза между попытками растёт экспоненциально со случайным jitter;
+- бюджет ограничивает долю повторов от всех запросов процесса, чтобы во
+  время инцидента воркеры не умножали нагрузку на GigaChat;
+- circuit breaker при высокой доле ошибок сразу отклоняет вызовы с
+  понятной ошибкой CircuitOpen, пока не пройдёт пауза восстановления.
+"""
+from agent.tools.exceptions import BlackList, CircuitOpen
+from agent.tools.settings import (
+    RETRY_ATTEMPTS,
+    RETRY_BASE_DELAY,
+    RETRY_MAX_DELAY,
+    RETRY_BUDGET_RATIO,
+    RETRY_BUDGET_MIN,
+    BREAKER_WINDOW,
+    BREAKER_MIN_CALLS,
+    BREAKER_THRESHOLD,
+    BREAKER_COOLDOWN,
+)
+from gigachat.exceptions import ResponseError
+from contextvars import ContextVar
+from collections import deque
+from time import sleep, monotonic
+from loguru import logger
+import threading
+import asyncio
+import random
+import httpx
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+# Счётчик попыток текущего вызова: изменяемый dict, чтобы его видели и
+# задачи asyncio, получившие копию контекста
+CALL_ATTEMPTS = ContextVar("giga_call_attempts", default=None)
+
+
+def track_attempts(counter: dict = None) -> dict:
+    """Начать подсчёт попыток вызова: {"attempts": n, "retries": k} после завершения
+
+    Все запросы одного ответа (включая дозапросы продолжений) расходуют
+    общий лимит повторов GIGA_RETRY_ATTEMPTS; counter - продолжить
+    уже начатый счётчик.
+    """
+    counter = counter if counter is not None else {"attempts": 0, "retries": 0}
+    CALL_ATTEMPTS.set(counter)
+    return counter
+
+
+def _count_attempt() -> dict:
+    counter = CALL_ATTEMPTS.get()
+    if counter is not None:
+        counter["attempts"] += 1
+    return counter
+
+
+def get_status_code(error: Exception):
+    """HTTP код из ResponseError (url, status_code, content, headers)"""
+    if isinstance(error, ResponseError) and len(error.args) > 1:
+        return error.args[1]
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """Временная ли ошибка (имеет смысл повторить запрос)"""
+    if isinstance(error, (BlackList, CircuitOpen)):
+        return False
+    if isinstance(error, ResponseError):
+        return get_status_code(error) in RETRYABLE_STATUS
+    return isinstance(error, (httpx.TimeoutException, httpx.TransportError, TimeoutError, ConnectionError))
+
+
+def get_retry_after(error: Exception) -> float:
+    """Пауза из заголовка Retry-After ответа 429/503"""
+    if not isinstance(error, ResponseError) or len(error.args) < 4:
+        return 0.0
+    try:
+        return float(error.args[3].get("retry-after", 0))
+    except (AttributeError, TypeError, ValueError):
+        return 0.0
+
+
+def backoff_delay(attempt: int, base: float = RETRY_BASE_DELAY, cap: float = RETRY_MAX_DELAY) -> float:
+    """Экспоненциальная пауза с full jitter"""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+class RetryBudget:
+    """Бюджет повторов: не больше ratio от запросов за окно (но не меньше minimum)"""
+
+    def __init__(self, ratio: float = RETRY_BUDGET_RATIO, minimum: int = RETRY_BUDGET_MIN, window: float = 60.0):
+        self.ratio = ratio
+        self.minimum = minimum
+        self.window = window
+        self._requests = deque()
+        self._retries = deque()
+        self._lock = threading.Lock()
+        self.exhausted = 0
+
+    def _trim(self, now: float) -> None:
+        for items in (self._requests, self._retries):
+            while items and now - items[0] > self.window:
+                items.popleft()
+
+    def on_request(self) -> None:
+        """Учесть первичный запрос"""
+        with self._lock:
+            now = monotonic()
+            self._trim(now)
+            self._requests.append(now)
+
+    def try_retry(self) -> bool:
+        """Забрать повтор из бюджета, если он не исчерпан"""
+        with self._lock:
+            now = monotonic()
+            self._trim(now)
+            if len(self._retries) >= max(self.minimum, self.ratio * len(self._requests)):
+                self.exhausted += 1
+                return False
+            self._retries.append(now)
+            return True
+
+    def stats(self) -> dict:
+        """Состояние бюджета за окно"""
+        with self._lock:
+            self._trim(monotonic())
+            return {
+                "requests": len(self._requests),
+                "retries": len(self._retries),
+                "exhausted": self.exhausted,
+            }
+
+
+class CircuitBreaker:
+    """Circuit breaker по доле ошибок upstream в скользящем окне"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        window: float = BREAKER_WINDOW,
+        min_calls: int = BREAKER_MIN_CALLS,
+        threshold: float = BREAKER_THRESHOLD,
+        cooldown: float = BREAKER_COOLDOWN
+    ):
+        self.window = window
+        self.min_calls = min_calls
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._outcomes = deque()
+        self._probe = False
+        self._lock = threading.Lock()
+
+    def _trim(self, now: float) -> None:
+        while self._outcomes and now - self._outcomes[0][0] > self.window:
+            self._outcomes.popleft()
+
+    def failure_rate(self) -> float:
+        """Доля ошибок в окне"""
+        if not self._outcomes:
+            return 0.0
+        return sum(1 for _, ok in self._outcomes if not ok) / len(self._outcomes)
+
+    def before_call(self) -> bool:
+        """Пропустить вызов или отклонить его при открытом breaker; True - пробный вызов"""
+        with self._lock:
+            now = monotonic()
+            if self.state == self.OPEN and now - self.opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+                self._probe = False
+            if self.state == self.HALF_OPEN and not self._probe:
+                # Один пробный запрос проверяет, восстановился ли GigaChat
+                self._probe = True
+                return True
+            if self.state != self.CLOSED:
+                self.rejected += 1
+                retry_in = max(0.0, self.cooldown - (now - self.opened_at))
+                raise CircuitOpen(
+                    f"GigaChat временно недоступен: доля ошибок {self.failure_rate():.0%}, "
+                    f"повторите через {retry_in:.0f} с"
+                )
+            return False
+
+    def release(self, probe: bool) -> None:
+        """Прерванный без результата вызов (отмена, выход из генератора)
+
+        Исход не учитывается, но пробный вызов освобождает место для
+        следующей пробы - иначе breaker отклонял бы вызовы навсегда.
+        """
+        if not probe:
+            return
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probe = False
+
+    def record(self, ok: bool) -> None:
+        """Учесть результат вызова"""
+        with self._lock:
+            now = monotonic()
+            if self.state == self.HALF_OPEN:
+                self._probe = False
+                self._outcomes.clear()
+                if ok:
+                    self.state = self.CLOSED
+                    logger.info("Circuit breaker GigaChat закрыт")
+                else:
+                    self._open(now)
+                return
+            self._outcomes.append((now, ok))
+            self._trim(now)
+            if (
+                self.state == self.CLOSED
+                and len(self._outcomes) >= self.min_calls
+                and self.failure_rate() >= self.threshold
+            ):
+                self._open(now)
+
+    def _open(self, now: float) -> None:
+        self.state = self.OPEN
+        self.opened_at = now
+        logger.warning(f"Circuit breaker GigaChat открыт на {self.cooldown} с")
+
+    def stats(self) -> dict:
+        """Состояние breaker"""
+        with self._lock:
+            self._trim(monotonic())
+            return {
+                "state": self.state,
+                "failure_rate": round(self.failure_rate(), 4),
+                "calls_in_window": len(self._outcomes),
+                "rejected": self.rejected,
+            }
+
+
+class Resilience:
+    """Политика вызова GigaChat: breaker + retry с backoff в пределах бюджета"""
+
+    def __init__(self, attempts: int = RETRY_ATTEMPTS):
+        self.attempts = attempts
+        self.budget = RetryBudget()
+        self.breaker = CircuitBreaker()
+        self.retries = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def _on_error(self, error: Exception, attempt: int, counter: dict = None) -> float:
+        """Решить, повторять ли вызов; вернуть паузу или пробросить ошибку
+
+        attempt - номер попытки этого запроса (для backoff), counter - общий
+        счётчик ответа: лимит повторов один на все его запросы.
+        """
+        retryable = is_retryable(error)
+        # Ошибкой upstream считается только временный сбой: на 4xx и
+        # blacklist GigaChat ответил, значит он доступен
+        self.breaker.record(not retryable)
+        if isinstance(error, BlackList):
+            raise BlackList("Невозможно обработать запрос. Система blacklist") from error
+        retries = counter["retries"] if counter is not None else attempt - 1
+        if not retryable or retries + 1 >= self.attempts or not self.budget.try_retry():
+            with self._lock:
+                self.failures += 1
+            raise error
+        with self._lock:
+            self.retries += 1
+        if counter is not None:
+            counter["retries"] += 1
+        delay = max(backoff_delay(attempt), get_retry_after(error))
+        logger.warning(f"Повтор запроса к GigaChat ({retries + 1}/{self.attempts - 1}) через {delay:.2f} с: {error!r}")
+        return delay
+
+    def call(self, func, *args, **kwargs):
+        """Синхронный вызов с политикой устойчивости"""
+        self.budget.on_request()
+        attempt = 0
+        while True:
+            attempt += 1
+            counter = _count_attempt()
+            probe = self.breaker.before_call()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:  # pylint:disable=broad-exception-caught
+                sleep(self._on_error(e, attempt, counter))
+                continue
+            except BaseException:
+                self.breaker.release(probe)
+                raise
+            self.breaker.record(True)
+            return result
+
+    async def acall(self, func, *args, **kwargs):
+        """Асинхронный вызов с той же политикой"""
+        self.budget.on_request()
+        attempt = 0
+        while True:
+            attempt += 1
+            counter = _count_attempt()
+            probe = self.breaker.before_call()
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:  # pylint:disable=broad-exception-caught
+                await asyncio.sleep(self._on_error(e, attempt, counter))
+                continue
+            except BaseException:
+                # asyncio.CancelledError (отменённый проигравший хедж) - не ошибка upstream
+                self.breaker.release(probe)
+                raise
+            self.breaker.record(True)
+            return result
+
+    def stream(self, factory):
+        """Потоковый вызов: повтор возможен только до первого фрагмента ответа"""
+        self.budget.on_request()
+        attempt = 0
+        while True:
+            attempt += 1
+            counter = _count_attempt()
+            probe = self.breaker.before_call()
+            started = False
+            try:
+                for item in factory():
+                    started = True
+                    yield item
+            except Exception as e:  # pylint:disable=broad-exception-caught
+                if started:
+                    self.breaker.record(not is_retryable(e))
+                    raise
+                sleep(self._on_error(e, attempt, counter))
+                continue
+            except BaseException:
+                # Потребитель закрыл поток (GeneratorExit) до конца ответа
+                self.breaker.release(probe)
+                raise
+            self.breaker.record(True)
+            return
+
+    def stats(self) -> dict:
+        """Наблюдаемое состояние: breaker, бюджет и счётчики повторов"""
+        with self._lock:
+            counters = {"retries": self.retries, "failures": self.failures}
+        return {
+            "breaker": self.breaker.stats(),
+            "budget": self.budget.stats(),
+            **counters,
+        }
+
+
+RESILIENCE = Resilience()
@@ -1,43 +1,71 @@
 """Вызов GigaChat API"""
-from langchain.schema import HumanMessage, SystemMessage
-from langchain_core.outputs import ChatResult, ChatGeneration
+from langchain.schema import HumanMessage, SystemMessage, AIMessage
+from langchain_core.outputs import ChatResult, ChatGeneration, ChatGenerationChunk
+from langchain_core.messages import AIMessageChunk
 from langchain_community.chat_models.gigachat import GigaChat
 from langchain_community.chat_models.gigachat import _convert_dict_to_message
-from gigachat.exceptions import ResponseError
 from agent.tools.exceptions import BlackList
+from agent.tools.client_pool import GigaChatPool
+from agent.tools.llm_loop import LLM_LOOP
+from agent.tools.token_ledger import LEDGER
+from agent.tools.llm_cache import CACHE, make_key
+from agent.tools.resilience import RESILIENCE, track_attempts
+from agent.tools.llm_profiler import record_call, record_cache_hit, current_request
+from agent.tools.settings import (
+    GIGA_BASE_URL,
+    CONTEXT_TOKENS,
+    COMPLETION_RESERVE,
+    LENGTH_CONTINUATIONS,
+)
+from agent.tools.model_router import ROUTER
+from agent.tools.rate_limiter import LIMITER, set_call_priority
+from agent.tools.hedging import HEDGER
+from agent.memory.prompt_budget import estimate_tokens, fit_prompt
+from agent.prompts.prompts import prompt_continue
 from typing import Any
-from time import sleep
-from pathlib import Path
+from loguru import logger
+from time import perf_counter
+import sys
 import os
-import json
+import atexit
+import asyncio
 
 
 def ignore_error(func, *args, **kwargs):
-    """Ингорирование ошибки к requests с retry механизмом"""
-    attempts = 0
-    while True:
-        try:
-            result = func(*args, **kwargs)
-            return result
-        except ResponseError as e:
-            attempts += 1
-            if attempts >= 10:
-                raise e
-            sleep(1)
-        except BlackList as e:
-            raise BlackList("Невозможно обработать запрос. Система blacklist") from e
-        except Exception as e:  # pylint:disable=broad-exception-caught
-            attempts += 1
-            if attempts >= 10:
-                raise e
-            sleep(1)
+    """Вызов с retry: backoff с jitter, бюджет повторов и circuit breaker"""
+    return RESILIENCE.call(func, *args, **kwargs)
+
+
+async def aignore_error(func, *args, **kwargs):
+    """Асинхронный аналог ignore_error с той же политикой retry"""
+    return await RESILIENCE.acall(func, *args, **kwargs)
 
 
 class CustomGigaChat(GigaChat):
     """Custom Giga Chat с обработкой ошибок"""
 
     def _generate(self, *args, **kwargs):
-        result = ignore_error(super()._generate, *args, **kwargs)
+        result = ignore_error(self._limited_generate, *args, **kwargs)
+        return result
+
+    async def _agenerate(self, *args, **kwargs):
+        result = await aignore_error(self._limited_agenerate, *args, **kwargs)
+        return result
+
+    def _limited_generate(self, messages, *args, **kwargs):
+        """Одна попытка запроса через rate limiter"""
+        estimate = LIMITER.estimate(messages)
+        LIMITER.acquire(estimate)
+        result = super()._generate(messages, *args, **kwargs)
+        LIMITER.settle(estimate, _total_tokens(result))
+        return result
+
+    async def _limited_agenerate(self, messages, *args, **kwargs):
+        """Асинхронная попытка запроса через rate limiter"""
+        estimate = LIMITER.estimate(messages)
+        await LIMITER.aacquire(estimate)
+        result = await super()._agenerate(messages, *args, **kwargs)
+        await LIMITER.asettle(estimate, _total_tokens(result))
         return result
 
     def _create_chat_result(self, response: Any) -> ChatResult:
@@ -51,52 +79,457 @@ class CustomGigaChat(GigaChat):
                 generation_info={"finish_reason": finish_reason},
             )
             generations.append(gen)
-            if finish_reason != "stop":
-                raise BlackList("Finish reason не 'stop'")
+            # length - ответ обрезан по лимиту, его дозапрашивает llm();
+            # blacklist - срабатывание фильтра контента
+            if finish_reason == "blacklist":
+                raise BlackList("Finish reason 'blacklist'")
         llm_output = {
             "token_usage": response.usage,
             "model_name": response.model
         }
         return ChatResult(generations=generations, llm_output=llm_output)
 
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        """Потоковая генерация с проверкой finish_reason и учётом токенов"""
+        payload = self._build_payload(messages, **kwargs)
+        estimate = LIMITER.estimate(messages)
+        LIMITER.acquire(estimate)
+        for chunk in self._client.stream(payload):
+            if not isinstance(chunk, dict):
+                chunk = chunk.dict()
+            generation_info = {}
+            if chunk.get("usage"):
+                generation_info["token_usage"] = chunk["usage"]
+                LIMITER.settle(estimate, chunk["usage"].get("total_tokens", 0))
+            content = ""
+            if chunk["choices"]:
+                choice = chunk["choices"][0]
+                content = choice.get("delta", {}).get("content") or ""
+                finish_reason = choice.get("finish_reason")
+                if finish_reason is not None:
+                    if finish_reason == "blacklist":
+                        raise BlackList("Finish reason 'blacklist'")
+                    generation_info["finish_reason"] = finish_reason
+            if not content and not generation_info:
+                continue
+            if run_manager and content:
+                run_manager.on_llm_new_token(content)
+            yield ChatGenerationChunk(
+                message=AIMessageChunk(content=content),
+                generation_info=generation_info or None
+            )
+
+
+def _total_tokens(result: ChatResult) -> int:
+    """Фактический расход токенов из ответа GigaChat"""
+    usage = (result.llm_output or {}).get("token_usage")
+    return getattr(usage, "total_tokens", 0) if usage else 0
+
+
+def write_tokens(
+    pr,
+    com,
+    to,
+    cached=0,
+    call_site="",
+    model="",
+    latency=0.0,
+    ttft=None,
+    retries=0,
+    prompt_chars=0,
+    profile=None
+):
+    """Учёт токенов в буферизованном журнале (без I/O на горячем пути) и профиле вызовов
+
+    cached - токены промпта, взятые из кэша сессии GigaChat.
+    """
+    LEDGER.record(
+        pr, com, to,
+        call_site=call_site,
+        model=model,
+        latency=latency,
+        ttft=ttft,
+        retries=retries,
+        prompt_chars=prompt_chars,
+        cached_tokens=cached
+    )
+    record_call(call_site, latency, retries, pr, com, prompt_chars, cached, profile=profile)
+
+
+def _valid(content: str, validate=None) -> bool:
+    """Ответ проходит проверку места вызова (без проверки - любой)"""
+    return validate is None or bool(validate(content))
+
+
+def _caller_name(depth: int = 2, default: str = "unknown") -> str:
+    """Место вызова llm() по умолчанию: модуль.функция вызывающего кода"""
+    frame = sys._getframe(depth)  # pylint:disable=protected-access
+    # Корутины из gather вызываются самим asyncio - его кадры пропускаем
+    while frame is not None and frame.f_globals.get("__name__", "").startswith(("asyncio", "threading")):
+        frame = frame.f_back
+    if frame is None:
+        return default
+    return f"{frame.f_globals.get('__name__', '')}.{frame.f_code.co_name}"
 
-def write_tokens(pr, com, to):
-    """Сохранение статистики токенов в JSON"""
-    file_path = Path("/home/datalab/nfs/json_tokens.json")
-    if file_path.exists():
-        with open(file_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            new_data = {
-                "prompt_tokens": data["prompt_tokens"] + pr,
-                "completion_tokens": data["completion_tokens"] + com,
-                "total_tokens": data["total_tokens"] + to
-            }
-            with open("/home/datalab/nfs/json_tokens.json", "w", encoding="utf-8") as f:
-                json.dump(new_data, f, ensure_ascii=False, indent=2)
-    else:
-        with open("/home/datalab/nfs/json_tokens.json", "w", encoding="utf-8") as f:
-            json.dump({
-                "prompt_tokens": pr,
-                "completion_tokens": com,
-                "total_tokens": to
-            }, f, ensure_ascii=False, indent=2)
-
-
-def llm(query, prompt, model_name="GigaChat-2-Max", temperature=0.35):
-    """Главная функция для вызова GigaChat"""
-    chat = CustomGigaChat(
-        base_url="http://liveaccess/v1/gc",
+
+POOL = GigaChatPool(CustomGigaChat)
+
+
+def shutdown() -> None:
+    """Закрыть соединения пула и фоновый loop при завершении процесса"""
+    if LLM_LOOP.started:
+        LLM_LOOP.run_sync(POOL.aclose())
+    POOL.close()
+    LLM_LOOP.close()
+
+
+atexit.register(shutdown)
+
+
+def _get_chat(model_name: str, temperature: float):
+    """Клиент GigaChat из пула на время вызова (контекстный менеджер)"""
+    return POOL.lease(
+        base_url=GIGA_BASE_URL,
         access_token=os.environ.get("JPY_API_TOKEN"),
         model=model_name,
         temperature=temperature
     )
+
+
+def _get_messages(query: str, prompt: str) -> list:
+    """Сообщения для GigaChat: системный промпт и запрос пользователя"""
     message = [
         SystemMessage(content=prompt)
     ]
     message.append(HumanMessage(content=query))
-    result = chat.invoke(message)
-    prompt_tokens = result.response_metadata["token_usage"].prompt_tokens
-    completion_tokens = result.response_metadata["token_usage"].completion_tokens
-    total_tokens = result.response_metadata["token_usage"].total_tokens
-    write_tokens(prompt_tokens, completion_tokens, total_tokens)
-    return result.content
+    return message
+
+
+def _fit_messages(query: str, prompt: str, call_site: str) -> list:
+    """Сообщения, ужатые до контекста модели с резервом под ответ"""
+    prompt, query, saved = fit_prompt(prompt, query, CONTEXT_TOKENS - COMPLETION_RESERVE)
+    if saved:
+        logger.warning(f"{call_site}: промпт превышает контекст модели, сокращён на ~{saved} токенов")
+    return _get_messages(query, prompt)
+
+
+def _get_usage(result) -> tuple:
+    """Статистика токенов из ответа GigaChat: (prompt, completion, total, cached)"""
+    usage = result.response_metadata["token_usage"]
+    cached = getattr(usage, "precached_prompt_tokens", None) or 0
+    return usage.prompt_tokens, usage.completion_tokens, usage.total_tokens, cached
+
+
+def _add_usage(first: tuple, second: tuple) -> tuple:
+    return tuple(a + b for a, b in zip(first, second))
+
+
+def _is_truncated(result) -> bool:
+    """Ответ оборван по лимиту длины"""
+    return result.response_metadata.get("finish_reason") == "length"
+
+
+def _continuation(messages: list, content: str) -> list:
+    """Сообщения для запроса продолжения оборванного ответа"""
+    return messages + [AIMessage(content=content), HumanMessage(content=prompt_continue)]
+
+
+def _stitch(head: str, tail: str) -> str:
+    """Склеить ответ и продолжение, убрав повтор на стыке"""
+    for size in range(min(len(head), len(tail), 200), 15, -1):
+        if head.endswith(tail[:size]):
+            return head + tail[size:]
+    return head + tail
+
+
+def _complete(chat: CustomGigaChat, messages: list, result, call_site: str) -> tuple:
+    """Дозапросить продолжения оборванного ответа: (текст, токены)
+
+    Повторы продолжений расходуют общий с первым запросом лимит (track_attempts).
+    """
+    content, usage = result.content, _get_usage(result)
+    for _ in range(LENGTH_CONTINUATIONS):
+        if not _is_truncated(result):
+            return content, usage
+        result = chat.invoke(_continuation(messages, content))
+        content, usage = _stitch(content, result.content), _add_usage(usage, _get_usage(result))
+    if _is_truncated(result):
+        logger.warning(f"{call_site}: ответ обрезан по длине после {LENGTH_CONTINUATIONS} продолжений")
+    return content, usage
+
+
+async def _acomplete(chat: CustomGigaChat, messages: list, result, call_site: str) -> tuple:
+    """Асинхронный аналог _complete"""
+    content, usage = result.content, _get_usage(result)
+    for _ in range(LENGTH_CONTINUATIONS):
+        if not _is_truncated(result):
+            return content, usage
+        result = await chat.ainvoke(_continuation(messages, content))
+        content, usage = _stitch(content, result.content), _add_usage(usage, _get_usage(result))
+    if _is_truncated(result):
+        logger.warning(f"{call_site}: ответ обрезан по длине после {LENGTH_CONTINUATIONS} продолжений")
+    return content, usage
+
+
+def llm(
+    query,
+    prompt,
+    model_name=None,
+    temperature=None,
+    call_site=None,
+    cache=None,
+    hedge=None,
+    validate=None
+):
+    """Главная функция для вызова GigaChat
+
+    model_name/temperature: None - по таблице маршрутов для call_site.
+    cache: False - не кэшировать ответы места вызова; кэш работает только
+    при GIGA_CACHE_ENABLED=1.
+    hedge: True/False - хеджировать вызов, None - по GIGA_HEDGE_SITES.
+    validate(content) -> bool: в кэш попадает (и берётся из него) только
+    прошедший проверку ответ, например разобранный JSON.
+    """
+    call_site = call_site or _caller_name()
+    model_name, temperature = ROUTER.resolve(call_site, model_name, temperature)
+    if HEDGER.use(call_site, hedge):
+        # Дубликат запроса выполняется конкурентно - через фоновый loop
+        content, _ = LLM_LOOP.run_sync(_acall(
+            query, prompt, model_name, temperature, call_site, cache, current_request(), hedge=True, validate=validate
+        ))
+        return content
+    key = make_key(model_name, temperature, prompt, query) if CACHE.use(cache) else None
+    if key:
+        cached = CACHE.get(key)
+        if cached is not None and _valid(cached, validate):
+            record_cache_hit(call_site)
+            return cached
+    attempts = track_attempts()
+    set_call_priority(call_site)
+    start = perf_counter()
+    messages = _fit_messages(query, prompt, call_site)
+    with _get_chat(model_name, temperature) as chat:
+        content, usage = _complete(chat, messages, chat.invoke(messages), call_site)
+    write_tokens(
+        *usage,
+        call_site=call_site,
+        model=model_name,
+        latency=perf_counter() - start,
+        retries=attempts["retries"],
+        prompt_chars=len(prompt) + len(query)
+    )
+    if key and _valid(content, validate):
+        CACHE.put(key, content)
+    return content
+
+
+async def _acall(
+    query, prompt, model_name, temperature, call_site, cache, profile=None, hedge=False, validate=None
+) -> tuple:
+    """Асинхронный вызов: (ответ, (prompt, completion, total, cached) токенов)
+
+    profile - профиль запроса вызывающего кода (явно, если корутина
+    создана вне его контекста). hedge - отправить
+    дубликат, если ответ задерживается (см. agent.tools.hedging).
+    validate - как у llm().
+    """
+    key = make_key(model_name, temperature, prompt, query) if CACHE.use(cache) else None
+    if key:
+        cached = CACHE.get(key)
+        if cached is not None and _valid(cached, validate):
+            record_cache_hit(call_site, profile)
+            return cached, (0, 0, 0, 0)
+
+    async def _attempt(messages):
+        """Запрос (основной или дубликат хеджирования) со своим слотом
+        семафора и своим счётчиком повторов"""
+        async with LLM_LOOP.semaphore:
+            attempts = track_attempts()
+            with _get_chat(model_name, temperature) as chat:
+                return await chat.ainvoke(messages), attempts
+
+    async def _call():
+        set_call_priority(call_site)
+        start = perf_counter()
+        messages = _fit_messages(query, prompt, call_site)
+        if hedge:
+            result, attempts = await HEDGER.run(
+                lambda: _attempt(messages),
+                call_site,
+                usage=lambda answer: _get_usage(answer[0]),
+                on_extra=lambda tokens, latency: write_tokens(
+                    *tokens, call_site=f"{call_site}.hedge", model=model_name, latency=latency, profile=profile
+                ),
+                estimate=estimate_tokens(prompt) + estimate_tokens(query)
+            )
+        else:
+            result, attempts = await _attempt(messages)
+        # Продолжения ответа расходуют лимит повторов выигравшего запроса
+        track_attempts(attempts)
+        async with LLM_LOOP.semaphore:
+            with _get_chat(model_name, temperature) as chat:
+                content, usage = await _acomplete(chat, messages, result, call_site)
+        write_tokens(
+            *usage,
+            call_site=call_site,
+            model=model_name,
+            latency=perf_counter() - start,
+            retries=attempts["retries"],
+            prompt_chars=len(prompt) + len(query),
+            profile=profile
+        )
+        if key and _valid(content, validate):
+            CACHE.put(key, content)
+        return content, usage
+
+    return await LLM_LOOP.run(_call())
+
+
+async def allm(
+    query,
+    prompt,
+    model_name=None,
+    temperature=None,
+    call_site=None,
+    cache=None,
+    hedge=None,
+    validate=None
+):
+    """Асинхронный вызов GigaChat с ограничением конкурентности
+
+    Выполняется в фоновом loop LLM_LOOP, поэтому может вызываться
+    из любого event loop. Параметры model_name, temperature, cache,
+    hedge и validate - как у llm().
+    """
+    call_site = call_site or _caller_name(default="allm")
+    model_name, temperature = ROUTER.resolve(call_site, model_name, temperature)
+    content, _ = await _acall(
+        query, prompt, model_name, temperature, call_site, cache,
+        profile=current_request(),
+        hedge=HEDGER.use(call_site, hedge),
+        validate=validate
+    )
+    return content
+
+
+def llm_batch(
+    items: list,
+    max_concurrency: int = 4,
+    state=None,
+    model_name=None,
+    temperature=None,
+    call_site=None,
+    cache=None,
+    hedge=None,
+    validate=None
+) -> list:
+    """Конкурентный вызов GigaChat для независимых промптов
+
+    items: [(query, prompt), ...]. Ответы возвращаются в том же порядке,
+    время выполнения - как у самого долгого вызова, а не сумма. Ошибка
+    одного элемента не прерывает остальные: на его месте будет объект
+    исключения. Токены всех вызовов добавляются в state.count_tokens().
+    """
+    call_site = call_site or _caller_name()
+    model_name, temperature = ROUTER.resolve(call_site, model_name, temperature)
+    profile = current_request()
+    hedge = HEDGER.use(call_site, hedge)
+
+    async def _run():
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def _one(query, prompt):
+            async with semaphore:
+                return await _acall(query, prompt, model_name, temperature, call_site, cache, profile, hedge, validate)
+
+        return await asyncio.gather(
+            *(_one(query, prompt) for query, prompt in items),
+            return_exceptions=True
+        )
+
+    answers = []
+    for item in LLM_LOOP.run_sync(_run()):
+        if isinstance(item, Exception):
+            logger.warning(f"{call_site}: ошибка в пачке вызовов LLM: {item!r}")
+            answers.append(item)
+            continue
+        content, usage = item
+        if state is not None:
+            state.count_tokens({
+                "prompt_tokens": usage[0],
+                "completion_tokens": usage[1],
+                "total_tokens": usage[2],
+            })
+        answers.append(content)
+    return answers
+
+
+def llm_stream(
+    query,
+    prompt,
+    model_name=None,
+    temperature=None,
+    call_site=None,
+    metrics=None
+):
+    """Потоковый вызов GigaChat: генератор фрагментов ответа
+
+    metrics (dict) после завершения содержит ttft (время до первого
+    токена) и latency в секундах.
+    """
+    call_site = call_site or _caller_name()
+    model_name, temperature = ROUTER.resolve(call_site, model_name, temperature)
+    metrics = {} if metrics is None else metrics
+    messages = _fit_messages(query, prompt, call_site)
+    request = messages
+    parts = []
+    tokens = (0, 0, 0, 0)
+    attempts = track_attempts()
+    set_call_priority(call_site)
+    start = perf_counter()
+    # Ответ, оборванный по длине, продолжается следующим потоком
+    with _get_chat(model_name, temperature) as chat:
+        for _ in range(LENGTH_CONTINUATIONS + 1):
+            usage, finish_reason = None, None
+            for chunk in RESILIENCE.stream(lambda: chat.stream(request)):
+                usage = chunk.response_metadata.get("token_usage") or usage
+                finish_reason = chunk.response_metadata.get("finish_reason") or finish_reason
+                if not chunk.content:
+                    continue
+                if "ttft" not in metrics:
+                    metrics["ttft"] = perf_counter() - start
+                parts.append(chunk.content)
+                yield chunk.content
+            if usage:
+                tokens = _add_usage(tokens, (
+                    usage["prompt_tokens"],
+                    usage["completion_tokens"],
+                    usage["total_tokens"],
+                    usage.get("precached_prompt_tokens") or 0
+                ))
+            if finish_reason != "length":
+                break
+            request = _continuation(messages, "".join(parts))
+        else:
+            logger.warning(f"{call_site}: ответ обрезан по длине после {LENGTH_CONTINUATIONS} продолжений")
+    metrics["latency"] = perf_counter() - start
+    metrics.setdefault("ttft", metrics["latency"])
+    logger.info(f"{call_site}: время до первого токена {metrics['ttft']:.2f} с, всего {metrics['latency']:.2f} с")
+    write_tokens(
+        *tokens,
+        call_site=call_site,
+        model=model_name,
+        latency=metrics["latency"],
+        ttft=metrics["ttft"],
+        retries=attempts["retries"],
+        prompt_chars=len(prompt) + len(query)
+    )
+
+
+def run_llm_batch(coros: list, return_exceptions: bool = False) -> list:
+    """Синхронно выполнить пачку корутин allm конкурентно
+
+    Пример:
+        part_1, part_2 = run_llm_batch([allm(q1, p1), allm(q2, p2)])
+    """
+    return LLM_LOOP.run_batch(coros, return_exceptions=return_exceptions)
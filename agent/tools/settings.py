@@ -0,0 +1,151 @@
+"""Настройки слоя вызова GigaChat (переменные окружения)"""
+import os
+
+# Адрес GigaChat API (для офлайн замеров - локальная заглушка benchmarks.giga_standin)
+GIGA_BASE_URL = os.getenv("GIGA_BASE_URL", "http://liveaccess/v1/gc")
+
+# Маршрутизация моделей: основная и лёгкая модель, температура по умолчанию,
+# таблица маршрутов call_site -> модель (JSON файл и/или JSON в переменной)
+MODEL_DEFAULT = os.getenv("GIGA_MODEL_DEFAULT", "GigaChat-2-Max")
+MODEL_LIGHT = os.getenv("GIGA_MODEL_LIGHT", "GigaChat-2")
+MODEL_TEMPERATURE = float(os.getenv("GIGA_TEMPERATURE", "0.35"))
+ROUTES_FILE = os.getenv("GIGA_ROUTES_FILE", "")
+ROUTES_JSON = os.getenv("GIGA_ROUTES", "")
+
+# Размер промпта и длина ответа: контекст модели и резерв под ответ (токены),
+# сколько раз запрашивать продолжение ответа, оборванного по длине
+CONTEXT_TOKENS = int(os.getenv("GIGA_CONTEXT_TOKENS", "32768"))
+COMPLETION_RESERVE = int(os.getenv("GIGA_COMPLETION_RESERVE", "4096"))
+LENGTH_CONTINUATIONS = int(os.getenv("GIGA_LENGTH_CONTINUATIONS", "3"))
+
+# Максимум одновременных async запросов к GigaChat
+GIGA_MAX_CONCURRENCY = int(os.getenv("GIGA_MAX_CONCURRENCY", "8"))
+
+# Журнал токенов: append-only JSONL, общий для всех процессов
+TOKENS_LEDGER_PATH = os.getenv("GIGA_TOKENS_LEDGER", "/home/datalab/nfs/json_tokens.jsonl")
+TOKENS_FLUSH_INTERVAL = float(os.getenv("GIGA_TOKENS_FLUSH_INTERVAL", "5"))
+TOKENS_FLUSH_THRESHOLD = int(os.getenv("GIGA_TOKENS_FLUSH_THRESHOLD", "50"))
+
+# Профиль вызовов: сколько последних замеров на место вызова хранить для перцентилей
+PROFILE_SAMPLES = int(os.getenv("GIGA_PROFILE_SAMPLES", "2000"))
+
+# Rate limiter: запросов в секунду (0 - без лимита) и допустимый всплеск,
+# токенов в минуту (0 - без лимита), общий SQLite для процессов хоста
+# (пусто - только в процессе), доля ёмкости, недоступная batch запросам,
+# префиксы call_site с приоритетом batch, ожидаемая длина ответа в токенах
+RATE_RPS = float(os.getenv("GIGA_RATE_RPS", "0"))
+RATE_BURST = float(os.getenv("GIGA_RATE_BURST", "0"))
+RATE_TPM = float(os.getenv("GIGA_RATE_TPM", "0"))
+RATE_STATE_PATH = os.getenv("GIGA_RATE_STATE", "output/giga_rate.sqlite")
+RATE_BATCH_RESERVE = float(os.getenv("GIGA_RATE_BATCH_RESERVE", "0.2"))
+RATE_BATCH_SITES = tuple(
+    s.strip() for s in os.getenv("GIGA_RATE_BATCH_SITES", "evalution_repo,gen_readme,evalution_code").split(",")
+    if s.strip()
+)
+RATE_COMPLETION_ESTIMATE = int(os.getenv("GIGA_RATE_COMPLETION_ESTIMATE", "400"))
+
+# Хеджирование запросов (включается явно): префиксы call_site, перцентиль
+# времени ответа для задержки дубликата, минимум замеров, задержка до набора
+# замеров и нижняя граница (сек), максимальная доля хеджей, отменять ли
+# проигравший запрос (0 - дождаться в фоне и точно учесть токены)
+HEDGE_ENABLED = os.getenv("GIGA_HEDGE_ENABLED", "0") == "1"
+HEDGE_SITES = tuple(
+    s.strip() for s in os.getenv("GIGA_HEDGE_SITES", "agent.step,classification").split(",")
+    if s.strip()
+)
+HEDGE_PERCENTILE = float(os.getenv("GIGA_HEDGE_PERCENTILE", "90"))
+HEDGE_MIN_SAMPLES = int(os.getenv("GIGA_HEDGE_MIN_SAMPLES", "20"))
+HEDGE_DEFAULT_DELAY = float(os.getenv("GIGA_HEDGE_DEFAULT_DELAY", "10"))
+HEDGE_MIN_DELAY = float(os.getenv("GIGA_HEDGE_MIN_DELAY", "0.5"))
+HEDGE_MAX_RATE = float(os.getenv("GIGA_HEDGE_MAX_RATE", "0.1"))
+HEDGE_CANCEL = os.getenv("GIGA_HEDGE_CANCEL", "1") == "1"
+
+# Сессии GigaChat (X-Session-ID): один идентификатор на запуск агента или
+# инструмента, чтобы сервер кэшировал общий префикс промптов между шагами
+SESSION_CACHE = os.getenv("GIGA_SESSION_CACHE", "1") == "1"
+
+# Кэш ответов LLM: включён ли по умолчанию, путь SQLite, TTL (сек), размеры
+CACHE_ENABLED = os.getenv("GIGA_CACHE_ENABLED", "0") == "1"
+CACHE_PATH = os.getenv("GIGA_CACHE_PATH", "output/llm_cache.sqlite")
+CACHE_TTL = float(os.getenv("GIGA_CACHE_TTL", str(7 * 24 * 3600)))
+CACHE_MEMORY_SIZE = int(os.getenv("GIGA_CACHE_MEMORY_SIZE", "512"))
+CACHE_MAX_ROWS = int(os.getenv("GIGA_CACHE_MAX_ROWS", "20000"))
+
+# Retry: число попыток, экспоненциальная пауза (сек) и бюджет повторов
+RETRY_ATTEMPTS = int(os.getenv("GIGA_RETRY_ATTEMPTS", "5"))
+RETRY_BASE_DELAY = float(os.getenv("GIGA_RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("GIGA_RETRY_MAX_DELAY", "8"))
+RETRY_BUDGET_RATIO = float(os.getenv("GIGA_RETRY_BUDGET_RATIO", "0.2"))
+RETRY_BUDGET_MIN = int(os.getenv("GIGA_RETRY_BUDGET_MIN", "10"))
+
+# Circuit breaker: окно (сек), минимум вызовов, порог доли ошибок, пауза (сек)
+BREAKER_WINDOW = float(os.getenv("GIGA_BREAKER_WINDOW", "30"))
+BREAKER_MIN_CALLS = int(os.getenv("GIGA_BREAKER_MIN_CALLS", "10"))
+BREAKER_THRESHOLD = float(os.getenv("GIGA_BREAKER_THRESHOLD", "0.5"))
+BREAKER_COOLDOWN = float(os.getenv("GIGA_BREAKER_COOLDOWN", "30"))
+
+# Бюджет промптов (в оценочных токенах): на вывод инструмента в истории
+# агента, на все выводы в финальном ответе; доля бюджета под начало текста
+PROMPT_HISTORY_BUDGET = int(os.getenv("PROMPT_HISTORY_BUDGET", "1500"))
+PROMPT_FINAL_BUDGET = int(os.getenv("PROMPT_FINAL_BUDGET", "12000"))
+PROMPT_HEAD_RATIO = float(os.getenv("PROMPT_HEAD_RATIO", "0.7"))
+
+# Режим одного вызова: релевантность запроса оценивает первый шаг агента
+# вместо отдельной классификации (экономит вызов GigaChat на релевантных запросах)
+AGENT_FAST_CLASSIFY = os.getenv("AGENT_FAST_CLASSIFY", "0") == "1"
+
+# Локальный классификатор релевантности перед LLM: включён ли, файл модели,
+# журнал размеченных запросов для обучения (пусто - не писать), полоса
+# неопределённости вероятности релевантности, в которой решает LLM
+RELEVANCE_LOCAL = os.getenv("AGENT_RELEVANCE_LOCAL", "0") == "1"
+RELEVANCE_MODEL_PATH = os.getenv("AGENT_RELEVANCE_MODEL", "output/relevance_model.json")
+RELEVANCE_LOG_PATH = os.getenv("AGENT_RELEVANCE_LOG", "")
+RELEVANCE_LOW = float(os.getenv("AGENT_RELEVANCE_LOW", "0.2"))
+RELEVANCE_HIGH = float(os.getenv("AGENT_RELEVANCE_HIGH", "0.8"))
+
+# Максимум инструментов, выполняемых параллельно в одном шаге агента
+AGENT_MAX_PARALLEL_TOOLS = int(os.getenv("AGENT_MAX_PARALLEL_TOOLS", "4"))
+
+# Режим агента по умолчанию: react (шаг планирования на каждый инструмент) или
+# plan (один план с зависимостями); сколько раз перепланировать при ошибках шагов
+AGENT_MODE = os.getenv("AGENT_MODE", "react")
+AGENT_PLAN_REPLANS = int(os.getenv("AGENT_PLAN_REPLANS", "1"))
+
+# Спекулятивная предзагрузка в run_agent: поиск по базе знаний и клон репозитория,
+# названного в запросе; сколько ждать незавершённую предзагрузку и сколько
+# секунд готовый клон считается свежим, как часто обновлять список репозиториев
+PREFETCH_ENABLED = os.getenv("AGENT_PREFETCH", "1") == "1"
+PREFETCH_WAIT = float(os.getenv("AGENT_PREFETCH_WAIT", "60"))
+PREFETCH_CLONE_TTL = float(os.getenv("AGENT_PREFETCH_CLONE_TTL", "600"))
+PREFETCH_REPOS_TTL = float(os.getenv("AGENT_PREFETCH_REPOS_TTL", "600"))
+
+# Многоходовые сессии агента: файл SQLite, сколько секунд хранить сессию без
+# обращений, сколько сессий держать в памяти и сколько результатов инструментов
+# (штук и символов JSON) хранить в одной сессии
+SESSION_DB_PATH = os.getenv("AGENT_SESSION_DB", "output/agent_sessions.sqlite")
+SESSION_TTL = float(os.getenv("AGENT_SESSION_TTL", "3600"))
+SESSIONS_IN_MEMORY = int(os.getenv("AGENT_SESSIONS_IN_MEMORY", "100"))
+SESSION_MAX_TOOLS = int(os.getenv("AGENT_SESSION_MAX_TOOLS", "20"))
+SESSION_MAX_CHARS = int(os.getenv("AGENT_SESSION_MAX_CHARS", "200000"))
+
+# Мемоизация инструментов по коммиту: show_files, awerage_repo, rate_repository
+# и gen_readme по (инструмент, репозиторий, sha головы ветки, хэш конфигурации);
+# файл SQLite, срок хранения, записей в памяти и на диске
+TOOL_CACHE_ENABLED = os.getenv("TOOL_CACHE_ENABLED", "1") == "1"
+TOOL_CACHE_PATH = os.getenv("TOOL_CACHE_PATH", "output/tool_cache.sqlite")
+TOOL_CACHE_TTL = float(os.getenv("TOOL_CACHE_TTL", str(30 * 24 * 3600)))
+TOOL_CACHE_MEMORY_SIZE = int(os.getenv("TOOL_CACHE_MEMORY_SIZE", "64"))
+TOOL_CACHE_MAX_ROWS = int(os.getenv("TOOL_CACHE_MAX_ROWS", "2000"))
+
+# Детерминированный маршрутизатор очевидных запросов перед графом агента:
+# JSON файл правил (пусто - правила по умолчанию), журнал выбора инструментов
+# агентом LLM для отчёта о покрытии и точности правил (пусто - не писать)
+INTENT_ROUTER_ENABLED = os.getenv("AGENT_INTENT_ROUTER", "1") == "1"
+INTENT_RULES_PATH = os.getenv("AGENT_INTENT_RULES", "")
+INTENT_LOG_PATH = os.getenv("AGENT_INTENT_LOG", "")
+
+# Возобновление запусков агента: State после каждого узла графа и ответы
+# инструментов запуска в SQLite; сколько секунд хранить незавершённый запуск
+CHECKPOINT_ENABLED = os.getenv("AGENT_CHECKPOINT", "0") == "1"
+CHECKPOINT_PATH = os.getenv("AGENT_CHECKPOINT_DB", "output/agent_checkpoints.sqlite")
+CHECKPOINT_TTL = float(os.getenv("AGENT_CHECKPOINT_TTL", str(7 * 24 * 3600)))
@@ -0,0 +1,202 @@
+"""Буферизованный журнал расхода токенов GigaChat
+
+Вызов LLM только кладёт запись в память. Фоновый поток раз в
+TOKENS_FLUSH_INTERVAL секунд (или при накоплении TOKENS_FLUSH_THRESHOLD
+записей) дописывает их в append-only JSONL под файловой блокировкой,
+поэтому несколько Flask воркеров не теряют счётчики.
+
+Итоги в старом формате json_tokens.json:
+    python -m agent.tools.token_ledger --export /home/datalab/nfs/json_tokens.json
+"""
+from agent.tools.settings import (
+    TOKENS_LEDGER_PATH,
+    TOKENS_FLUSH_INTERVAL,
+    TOKENS_FLUSH_THRESHOLD,
+)
+from pathlib import Path
+from loguru import logger
+from time import time
+import threading
+import argparse
+import atexit
+import fcntl
+import json
+import os
+
+
+class TokenLedger:
+    """Агрегатор токенов с фоновой записью в журнал"""
+
+    def __init__(
+        self,
+        path: str = TOKENS_LEDGER_PATH,
+        interval: float = TOKENS_FLUSH_INTERVAL,
+        threshold: int = TOKENS_FLUSH_THRESHOLD
+    ):
+        self.path = Path(path)
+        self.interval = interval
+        self.threshold = threshold
+        self.totals = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def record(
+        self,
+        prompt_tokens: int,
+        completion_tokens: int,
+        total_tokens: int,
+        call_site: str = "",
+        model: str = "",
+        latency: float = 0.0,
+        ttft: float = None,
+        retries: int = 0,
+        prompt_chars: int = 0,
+        cached_tokens: int = 0
+    ) -> None:
+        """Добавить запись о вызове (не блокируется на I/O)"""
+        item = {
+            "ts": round(time(), 3),
+            "pid": os.getpid(),
+            "call_site": call_site,
+            "model": model,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": total_tokens,
+            "latency": round(latency, 3),
+            "retries": retries,
+            "prompt_chars": prompt_chars,
+            "cached_tokens": cached_tokens,
+        }
+        if ttft is not None:
+            item["ttft"] = round(ttft, 3)
+        with self._lock:
+            self._buffer.append(item)
+            self.totals["prompt_tokens"] += prompt_tokens
+            self.totals["completion_tokens"] += completion_tokens
+            self.totals["total_tokens"] += total_tokens
+            size = len(self._buffer)
+            if self._thread is None:
+                self._start()
+        if size >= self.threshold:
+            self._wakeup.set()
+
+    def _start(self) -> None:
+        """Запустить фоновый поток записи"""
+        self._thread = threading.Thread(
+            target=self._run,
+            name="token-ledger",
+            daemon=True
+        )
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """Дописать накопленные записи в журнал"""
+        with self._lock:
+            items, self._buffer = self._buffer, []
+        if not items:
+            return 0
+        lines = "".join(json.dumps(i, ensure_ascii=False) + "\n" for i in items)
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                fcntl.lockf(f, fcntl.LOCK_EX)
+                try:
+                    f.write(lines)
+                    f.flush()
+                finally:
+                    fcntl.lockf(f, fcntl.LOCK_UN)
+        except OSError as e:
+            # Не теряем записи: вернуть в буфер до следующей попытки
+            with self._lock:
+                self._buffer = items + self._buffer
+            logger.warning(f"Не удалось записать журнал токенов {self.path}: {e}")
+            return 0
+        return len(items)
+
+    def close(self) -> None:
+        """Остановить фоновый поток и сбросить остаток"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+
+
+def read_records(path: str = TOKENS_LEDGER_PATH) -> list:
+    """Прочитать все записи журнала"""
+    file_path = Path(path)
+    if not file_path.exists():
+        return []
+    records = []
+    with open(file_path, "r", encoding="utf-8") as f:
+        fcntl.lockf(f, fcntl.LOCK_SH)
+        try:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Оборванная строка после аварийного завершения процесса
+                    continue
+        finally:
+            fcntl.lockf(f, fcntl.LOCK_UN)
+    return records
+
+
+def read_totals(path: str = TOKENS_LEDGER_PATH) -> dict:
+    """Итоги в формате старого json_tokens.json"""
+    totals = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    for record in read_records(path):
+        for key in totals:
+            totals[key] += record.get(key, 0)
+    return totals
+
+
+def export_totals(json_path: str, path: str = TOKENS_LEDGER_PATH) -> dict:
+    """Записать итоги в старый JSON формат"""
+    totals = read_totals(path)
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(totals, f, ensure_ascii=False, indent=2)
+    return totals
+
+
+def import_legacy(json_path: str, ledger: "TokenLedger") -> None:
+    """Перенести итоги из старого json_tokens.json в журнал (один раз)"""
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    ledger.record(
+        data["prompt_tokens"],
+        data["completion_tokens"],
+        data["total_tokens"],
+        call_site="legacy"
+    )
+    ledger.flush()
+
+
+LEDGER = TokenLedger()
+atexit.register(LEDGER.close)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Итоги журнала токенов GigaChat")
+    parser.add_argument("--ledger", default=TOKENS_LEDGER_PATH)
+    parser.add_argument("--export", help="Путь для JSON в старом формате")
+    parser.add_argument("--import-legacy", help="Старый json_tokens.json для переноса")
+    args = parser.parse_args()
+    if args.import_legacy:
+        import_legacy(args.import_legacy, TokenLedger(args.ledger))
+    if args.export:
+        print(json.dumps(export_totals(args.export, args.ledger), ensure_ascii=False, indent=2))
+    else:
+        print(json.dumps(read_totals(args.ledger), ensure_ascii=False, indent=2))
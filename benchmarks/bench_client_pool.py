@@ -0,0 +1,75 @@
+"""Бенчмарк: новый CustomGigaChat на каждый вызов против пула клиентов
+
+Запуск:
+    python -m benchmarks.bench_client_pool --calls 200
+"""
+from langchain.schema import HumanMessage, SystemMessage
+from agent.tools.run_giga import CustomGigaChat
+from agent.tools.client_pool import GigaChatPool
+from benchmarks.giga_standin import start_server, base_url as server_url
+from time import perf_counter
+import argparse
+
+
+def messages() -> list:
+    """Сообщения, аналогичные llm()"""
+    return [SystemMessage(content="prompt"), HumanMessage(content="query")]
+
+
+def bench_fresh(base_url: str, calls: int) -> float:
+    """Старое поведение: новый клиент на каждый вызов"""
+    start = perf_counter()
+    for _ in range(calls):
+        chat = CustomGigaChat(
+            base_url=base_url,
+            access_token="bench",
+            model="GigaChat-2-Max",
+            temperature=0.35
+        )
+        chat.invoke(messages())
+        chat._client.close()  # pylint:disable=protected-access
+    return perf_counter() - start
+
+
+def bench_pooled(base_url: str, calls: int) -> float:
+    """Новое поведение: клиент из пула"""
+    pool = GigaChatPool(CustomGigaChat)
+    start = perf_counter()
+    for _ in range(calls):
+        chat = pool.get(
+            base_url=base_url,
+            model="GigaChat-2-Max",
+            temperature=0.35,
+            access_token="bench"
+        )
+        chat.invoke(messages())
+    elapsed = perf_counter() - start
+    pool.close()
+    return elapsed
+
+
+def main():
+    """Запуск бенчмарка"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    server = start_server()
+    base_url = server_url(server)
+    # Прогрев импортов и сервера
+    bench_pooled(base_url, 5)
+
+    fresh = bench_fresh(base_url, args.calls)
+    pooled = bench_pooled(base_url, args.calls)
+    server.shutdown()
+
+    per_fresh = fresh / args.calls * 1000
+    per_pooled = pooled / args.calls * 1000
+    print(f"Вызовов: {args.calls}")
+    print(f"Новый клиент на вызов: {per_fresh:.2f} мс/вызов")
+    print(f"Пул клиентов:          {per_pooled:.2f} мс/вызов")
+    print(f"Экономия на вызов:     {per_fresh - per_pooled:.2f} мс ({fresh / pooled:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Бенчмарк: сборка графа агента против накладных расходов invoke
+
+Узлы заменены заглушками без LLM, поэтому замер показывает только
+стоимость LangGraph: компиляцию StateGraph на каждый запрос (как было)
+и вызов уже скомпилированного графа, в т.ч. из нескольких потоков.
+
+Запуск:
+    python -m benchmarks.bench_graph --iterations 200 --threads 8
+"""
+from agent.state_graph.graph import build_graph
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+import argparse
+
+
+class StubState:
+    """Минимальное состояние запроса: шаги до финального ответа"""
+
+    def __init__(self, steps: int):
+        self.steps = steps
+        self.final = None
+
+
+def show_tools(data: dict) -> dict:
+    return {"list_tools": "stub"}
+
+
+def run_tool(data: dict) -> dict:
+    state = data["pars_quest"]
+    state.steps -= 1
+    if state.steps <= 0:
+        state.final = data["user_query"]
+    return {"user_query": data["user_query"]}
+
+
+def invoke(graph, i: int, steps: int) -> bool:
+    """Вызов графа; True - ответ принадлежит своему запросу"""
+    result = graph.invoke({"user_query": f"запрос {i}", "pars_quest": StubState(steps)})
+    return result["pars_quest"].final == f"запрос {i}"
+
+
+def timed(func, iterations: int) -> float:
+    """Среднее время вызова, мс"""
+    start = perf_counter()
+    for i in range(iterations):
+        func(i)
+    return (perf_counter() - start) / iterations * 1000
+
+
+def main():
+    """Запуск бенчмарка"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--steps", type=int, default=3, help="Шагов run_tool на запрос")
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    graph = build_graph(show_tools, run_tool)
+    build = timed(lambda i: build_graph(show_tools, run_tool), args.iterations)
+    cached = timed(lambda i: invoke(graph, i, args.steps), args.iterations)
+    rebuilt = timed(lambda i: invoke(build_graph(show_tools, run_tool), i, args.steps), args.iterations)
+
+    start = perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        ok = list(pool.map(lambda i: invoke(graph, i, args.steps), range(args.iterations)))
+    threaded = (perf_counter() - start) / args.iterations * 1000
+
+    print(f"Итераций: {args.iterations}, шагов на запрос: {args.steps}")
+    print(f"Сборка и компиляция графа:       {build:.3f} мс")
+    print(f"Запрос со сборкой графа (было):  {rebuilt:.3f} мс")
+    print(f"Запрос к общему графу:           {cached:.3f} мс")
+    print(f"{f'Общий граф, {args.threads} потоков:':<33}{threaded:.3f} мс на запрос, "
+          f"ответы своим запросам: {sum(ok)}/{len(ok)}")
+
+
+if __name__ == "__main__":
+    main()
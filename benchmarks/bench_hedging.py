@@ -0,0 +1,57 @@
+"""Бенчмарк: хвост задержек с хеджированием и без на заглушке GigaChat
+
+Запуск:
+    python -m benchmarks.bench_hedging --calls 300 --latency lognormal:0.05,1.0 --percentile 90 --max-rate 0.1
+"""
+from benchmarks.giga_standin import start_server, base_url, StandInConfig
+from agent.tools.hedging import Hedger
+from agent.tools.llm_profiler import percentile, PROFILER
+from agent.tools import run_giga
+from time import perf_counter
+import argparse
+
+
+def bench(calls: int, hedger: Hedger, warmup: int) -> list:
+    """Задержки последовательных вызовов (без прогрева)"""
+    PROFILER.reset()
+    run_giga.HEDGER = hedger
+    latencies = []
+    for i in range(calls):
+        start = perf_counter()
+        run_giga.llm(f"запрос {i}", "prompt", call_site="bench.hedging", hedge=hedger.enabled)
+        latencies.append(perf_counter() - start)
+    return latencies[warmup:]
+
+
+def main():
+    """Запуск бенчмарка"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--latency", default="lognormal:0.05,1.0")
+    parser.add_argument("--percentile", type=float, default=90)
+    parser.add_argument("--max-rate", type=float, default=0.1)
+    args = parser.parse_args()
+
+    server = start_server(StandInConfig(latency=args.latency))
+    run_giga.GIGA_BASE_URL = base_url(server)
+    warmup = min(50, args.calls // 4)
+    plain = bench(args.calls, Hedger(enabled=False), warmup)
+    hedger = Hedger(enabled=True, q=args.percentile, min_samples=warmup, min_delay=0.01, max_rate=args.max_rate)
+    hedged = bench(args.calls, hedger, warmup)
+    server.shutdown()
+
+    print(f"Вызовов: {len(plain)} (после прогрева {warmup})")
+    for name, values in (("Без хеджирования", plain), ("С хеджированием", hedged)):
+        print(
+            f"{name:<18} p50 {percentile(values, 50):.3f} с  "
+            f"p95 {percentile(values, 95):.3f} с  p99 {percentile(values, 99):.3f} с"
+        )
+    stats = hedger.stats()
+    print(
+        f"Хеджей: {stats['hedged']} ({stats['hedge_rate']:.1%}), выиграл дубликат: {stats['hedge_wins']}, "
+        f"лишние токены (оценка): {stats['extra_tokens'] + stats['extra_tokens_estimated']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
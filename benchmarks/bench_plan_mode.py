@@ -0,0 +1,95 @@
+"""Бенчмарк: режим react против plan на заглушке GigaChat
+
+Сценарий из трёх инструментов (show_files, awerage_repo, rate_repository):
+в react модель выбирает их по одному на шаг, в plan возвращает весь план
+одним вызовом (awerage_repo после show_files, rate_repository независимо).
+Инструменты заменены паузой --tool-latency с успешным ответом.
+
+Запуск:
+    python -m benchmarks.bench_plan_mode --runs 5 --latency fixed:0.3 --tool-latency 0.5
+"""
+from benchmarks.giga_standin import start_server, base_url, StandInConfig
+from agent.tools.llm_profiler import percentile
+from agent.tools import run_giga
+from time import perf_counter, sleep
+import tools.tools as tools_module
+import argparse
+import json
+import main as agent_main
+
+TASK = "Оцени репозиторий demo_repo: оформление и качество кода"
+SCENARIO = ["show_files", "awerage_repo", "rate_repository"]
+
+
+def _json(data: dict) -> str:
+    return "```json\n" + json.dumps(data, ensure_ascii=False) + "\n```"
+
+
+def _step(name_tool: str) -> str:
+    return _json({
+        "answer_tools": "",
+        "thought": f"Следующий шаг: {name_tool}",
+        "action": name_tool,
+        "action_input": {"name_tool": name_tool, "repository": "demo_repo"},
+    })
+
+
+def script() -> list:
+    """Ответы заглушки: шаги react по истории инструментов и план"""
+    rules = [{"match": r"Составь полный план", "response": _json({
+        "thought": "Все инструменты известны заранее",
+        "plan": [
+            {"id": "s1", "name_tool": "show_files", "args": {"repository": "demo_repo"}, "depends_on": []},
+            {"id": "s2", "name_tool": "awerage_repo", "args": {"repository": "demo_repo"}, "depends_on": ["s1"]},
+            {"id": "s3", "name_tool": "rate_repository", "args": {"repository": "demo_repo"}, "depends_on": []},
+        ],
+    })}]
+    # Последний выполненный инструмент определяет следующий шаг react
+    for done, following in reversed(list(zip(SCENARIO, SCENARIO[1:] + ["answer"]))):
+        rules.append({"match": rf"Ответ в JSON формате.*Инструмент {done}\*\* ->", "response": _step(following)})
+    rules.append({"match": r"Ответ в JSON формате.*Инструменты не использовались", "response": _step(SCENARIO[0])})
+    return rules
+
+
+def bench(runs: int, mode: str) -> list:
+    """(время, вызовов LLM) по запускам агента"""
+    rows = []
+    for _ in range(runs):
+        start = perf_counter()
+        answer = agent_main.run_agent(TASK, mode=mode)
+        rows.append((perf_counter() - start, answer.llm_profile["totals"]["calls"]))
+    return rows
+
+
+def main():
+    """Запуск бенчмарка"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency", default="fixed:0.3")
+    parser.add_argument("--tool-latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    def fake_tool(content: dict) -> dict:
+        sleep(args.tool_latency)
+        return {"status": 200, "answer": f"Результат {content['name_tool']}"}
+
+    tools_module.run_tools_local = fake_tool
+    server = start_server(StandInConfig(latency=args.latency, script=script()))
+    run_giga.GIGA_BASE_URL = base_url(server)
+    # Сторонний порт без сервера: инструменты сразу уходят в локальное выполнение
+    tools_module.run_tools.__defaults__ = ("http://127.0.0.1:9",)
+    results = {mode: bench(args.runs, mode) for mode in ("react", "plan")}
+    server.shutdown()
+
+    print(f"Запусков: {args.runs}, задержка LLM {args.latency}, инструмента {args.tool_latency} с")
+    for mode, rows in results.items():
+        latencies = [r[0] for r in rows]
+        calls = sum(r[1] for r in rows) / len(rows)
+        print(
+            f"{mode:<6} вызовов LLM {calls:.1f}  "
+            f"p50 {percentile(latencies, 50):.2f} с  max {max(latencies):.2f} с"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Бенчмарк: кэш префикса сессии GigaChat на запусках агента (заглушка)
+
+Заглушка начисляет --prompt-delay секунд на каждый токен промпта вне
+кэша сессии, поэтому разница во времени показывает выигрыш обработки
+промпта, а cached_tokens - сколько токенов сервер взял из кэша.
+
+Запуск:
+    python -m benchmarks.bench_session_cache --runs 5 --prompt-delay 0.0005
+"""
+from benchmarks.giga_standin import start_server, base_url, StandInConfig
+from agent.tools.llm_session import llm_session
+from agent.tools import run_giga
+from functools import partial
+from time import perf_counter
+import argparse
+import main as agent_main
+
+
+def bench(runs: int, task: str, session: bool) -> list:
+    """Время, токены промпта и токены из кэша по запускам агента"""
+    agent_main.llm_session = partial(llm_session, enabled=session)
+    # Маршрутизатор ответил бы на запрос одним вызовом без графа - измеряется цикл агента
+    agent_main.INTENT_ROUTER.enabled = False
+    rows = []
+    for _ in range(runs):
+        start = perf_counter()
+        answer = agent_main.run_agent(task)
+        totals = answer.llm_profile["totals"]
+        rows.append((perf_counter() - start, totals["prompt_tokens"], totals["cached_tokens"], totals["calls"]))
+    return rows
+
+
+def main():
+    """Запуск бенчмарка"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--prompt-delay", type=float, default=0.0005)
+    parser.add_argument("--task", default="Какие инструменты есть у агента?")
+    args = parser.parse_args()
+
+    server = start_server(StandInConfig(prompt_delay=args.prompt_delay))
+    run_giga.GIGA_BASE_URL = base_url(server)
+    results = {
+        "Без сессии": bench(args.runs, args.task, session=False),
+        "С сессией": bench(args.runs, args.task, session=True),
+    }
+    server.shutdown()
+
+    print(f"Запусков: {args.runs}, обработка промпта вне кэша {args.prompt_delay * 1000:.2f} мс/токен")
+    for name, rows in results.items():
+        runs = len(rows)
+        latency = sum(r[0] for r in rows) / runs
+        prompt = sum(r[1] for r in rows) / runs
+        cached = sum(r[2] for r in rows) / runs
+        calls = sum(r[3] for r in rows) / runs
+        print(
+            f"{name:<12} время {latency:.3f} с  вызовов {calls:.1f}  "
+            f"токенов промпта {prompt:.0f}  из кэша {cached:.0f} ({cached / prompt if prompt else 0:.0%})"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+"""Локальная заглушка GigaChat API для офлайн замеров и нагрузочных тестов
+
+Поддерживает POST /chat/completions (обычный ответ и SSE поток) и
+GET /models. Ответ выбирается по системному промпту: планирование
+агента, классификация, оценка README и поиск получают валидный JSON
+или текст в том же формате, что и настоящая модель.
+
+Запуск:
+    python -m benchmarks.giga_standin --port 8090 --latency lognormal:0.8,0.5 --error-rate 0.05
+    GIGA_BASE_URL=http://127.0.0.1:8090 python main.py "Оцени код репозитория my_repo"
+
+Кэш префикса сессии: для повторного X-Session-ID общий с прошлым запросом
+сессии префикс сообщений возвращается в usage.precached_prompt_tokens,
+а --prompt-delay (сек на токен) начисляется только за остальной промпт.
+
+Собственные ответы: --script file.json со списком
+[{"match": "регулярное выражение по промпту", "response": "текст", "model": "GigaChat-2"}]
+(model необязателен - правило только для этой модели).
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from agent.prompts.prompts import (
+    sys_prompt,
+    prompt_classification,
+    final_classification,
+    sys_final_answer,
+    sys_prompt_search,
+    prompt_repair_json,
+    prompt_relevance_step,
+    sys_prompt_plan,
+)
+from tools.evalution_repo.prompts import (
+    sys_prompt_evalution_readme_1,
+    sys_prompt_evalution_readme_2,
+)
+from agent.memory.prompt_budget import estimate_tokens
+from collections import OrderedDict
+from time import sleep, time
+import threading
+import argparse
+import random
+import sys
+import json
+import os
+import re
+
+
+def _prefix(prompt: str) -> str:
+    """Начало шаблона промпта до первой подстановки"""
+    return prompt.split("{")[0][:80]
+
+
+def _json(data: dict) -> str:
+    return "```json\n" + json.dumps(data, ensure_ascii=False, indent=2) + "\n```"
+
+
+def answer_agent(user: str) -> str:
+    """Шаг ReAct: сначала info_tools, после выполненного инструмента - answer"""
+    used = "Инструменты не использовались" not in user
+    answer = {
+        "answer_tools": "Инструмент выполнен" if used else "Инструменты не использовались",
+        "thought": "Данных достаточно для ответа" if used else "Нужно узнать возможности агента",
+        "action": "answer" if used else "info_tools",
+        "action_input": {"name_tool": "answer" if used else "info_tools"},
+    }
+    if _prefix(prompt_relevance_step.strip()) in user:
+        answer.update({
+            "classification": "релевантные",
+            "reason": "Запрос относится к работе с репозиториями",
+            "answer": "",
+        })
+    return _json(answer)
+
+
+def answer_readme_1(user: str) -> str:
+    return _json({
+        "text_content": {"grade": 3, "comment": "Содержание есть"},
+        "check_sections": {"grade": 1, "comment": "Разделы есть"},
+        "check_description_title": {"grade": 2, "comment": "Название и описание есть"},
+    })
+
+
+def answer_readme_2(user: str) -> str:
+    return _json({
+        "availability_contacts": {"grade": 2, "comment": "Контакты указаны"},
+        "description_scripts": {"grade": 3, "comment": "Описано большинство скриптов"},
+        "data_sources": {"grade": 1, "comment": "Источники указаны"},
+        "launch_instruction": {"grade": 1, "comment": "Инструкция есть"},
+    })
+
+
+# Шаблоны ответов по системному промпту
+TEMPLATES = [
+    (_prefix(sys_prompt), answer_agent),
+    (_prefix(prompt_classification), lambda user: _json({
+        "classification": "релевантные",
+        "reason": "Запрос относится к работе с репозиториями",
+    })),
+    (_prefix(final_classification), lambda user: "К сожалению, Agent SPC не может помочь с этим вопросом."),
+    (_prefix(sys_prompt_evalution_readme_1), answer_readme_1),
+    (_prefix(sys_prompt_evalution_readme_2), answer_readme_2),
+    (_prefix(sys_prompt_search), lambda user: f"По базе знаний найдено следующее по запросу «{user[:100]}»."),
+    (_prefix(prompt_repair_json), answer_agent),
+    (_prefix(sys_prompt_plan), lambda user: _json({
+        "thought": "Нужно узнать возможности агента",
+        "plan": [{"id": "s1", "name_tool": "info_tools", "args": {}, "depends_on": []}],
+    })),
+    (_prefix(sys_final_answer), lambda user: "## Ответ\n\nЗапрос выполнен. Результаты инструментов приведены выше."),
+]
+
+
+class Latency:
+    """Распределение задержки: fixed:x, uniform:a,b, lognormal:median,sigma"""
+
+    def __init__(self, spec: str = "fixed:0"):
+        kind, _, args = spec.partition(":")
+        self.kind = kind
+        self.args = [float(a) for a in args.split(",") if a]
+
+    def sample(self) -> float:
+        """Задержка в секундах"""
+        if self.kind == "uniform":
+            return random.uniform(*self.args)
+        if self.kind == "lognormal":
+            median, sigma = self.args
+            return random.lognormvariate(0, sigma) * median
+        return self.args[0] if self.args else 0.0
+
+
+class StandInConfig:
+    """Параметры поведения заглушки"""
+
+    def __init__(
+        self,
+        latency: str = "fixed:0",
+        token_delay: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        length_rate: float = 0.0,
+        blacklist_rate: float = 0.0,
+        script: list = None,
+        prompt_delay: float = 0.0,
+        session_cache: bool = True
+    ):
+        self.latency = Latency(latency)
+        self.token_delay = token_delay
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.length_rate = length_rate
+        self.blacklist_rate = blacklist_rate
+        self.script = script or []
+        self.prompt_delay = prompt_delay
+        self.session_cache = session_cache
+        self.sessions = OrderedDict()
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def cached_tokens(self, session_id: str, text: str) -> int:
+        """Токены общего префикса с прошлым запросом той же сессии"""
+        if not self.session_cache or not session_id:
+            return 0
+        with self.lock:
+            previous = self.sessions.pop(session_id, "")
+            self.sessions[session_id] = text
+            if len(self.sessions) > 1000:
+                self.sessions.popitem(last=False)
+        return estimate_tokens(os.path.commonprefix([previous, text]))
+
+    def respond(self, system: str, user: str, model: str = "") -> str:
+        """Текст ответа по системному промпту, запросу и модели"""
+        for rule in self.script:
+            if rule.get("model", model) != model:
+                continue
+            if re.search(rule["match"], system + "\n" + user, re.DOTALL):
+                return rule["response"]
+        for prefix, template in TEMPLATES:
+            if system.startswith(prefix):
+                return template(user)
+        return "Ответ заглушки GigaChat"
+
+    def finish_reason(self) -> str:
+        """stop, length или blacklist согласно заданным долям"""
+        roll = random.random()
+        if roll < self.length_rate:
+            return "length"
+        if roll < self.length_rate + self.blacklist_rate:
+            return "blacklist"
+        return "stop"
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Обработчик протокола chat/completions"""
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    config = StandInConfig()
+
+    def _send(self, status: int, data: dict) -> None:
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _chunk(self, data: str) -> None:
+        raw = data.encode("utf-8")
+        self.wfile.write(f"{len(raw):x}\r\n".encode() + raw + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):  # pylint:disable=invalid-name
+        """Список моделей"""
+        self._send(200, {"object": "list", "data": [
+            {"id": "GigaChat-2-Max", "object": "model", "owned_by": "standin"},
+            {"id": "GigaChat-2", "object": "model", "owned_by": "standin"},
+        ]})
+
+    def do_POST(self):  # pylint:disable=invalid-name
+        """Генерация ответа"""
+        config = self.config
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        with config.lock:
+            config.requests += 1
+        messages = payload.get("messages", [])
+        prompt_tokens = sum(estimate_tokens(m.get("content", "")) for m in messages)
+        text = "".join(f"{m.get('role')}\n{m.get('content', '')}\n" for m in messages)
+        cached = min(prompt_tokens, config.cached_tokens(self.headers.get("X-Session-ID"), text))
+        sleep(config.latency.sample() + config.prompt_delay * (prompt_tokens - cached))
+        if random.random() < config.error_rate:
+            self._send(config.error_status, {"status": config.error_status, "message": "Injected error"})
+            return
+        system = next((m["content"] for m in messages if m.get("role") == "system"), "")
+        user = next((m["content"] for m in messages if m.get("role") == "user"), "")
+        model = payload.get("model", "GigaChat-2-Max")
+        content = config.respond(system, user, model)
+        # Запрос продолжения: вернуть остаток ответа после уже выданной части
+        written = "".join(m["content"] for m in messages if m.get("role") == "assistant")
+        if written and content.startswith(written):
+            content = content[len(written):]
+        finish_reason = config.finish_reason()
+        if finish_reason == "length":
+            content = content[:max(1, len(content) // 2)]
+        completion_tokens = estimate_tokens(content)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "precached_prompt_tokens": cached,
+        }
+        if payload.get("stream"):
+            self._stream(content, finish_reason, usage, model)
+            return
+        self._send(200, {
+            "choices": [{
+                "message": {"role": "assistant", "content": content},
+                "index": 0,
+                "finish_reason": finish_reason,
+            }],
+            "created": int(time()),
+            "model": model,
+            "usage": usage,
+            "object": "chat.completion",
+        })
+
+    def _stream(self, content: str, finish_reason: str, usage: dict, model: str) -> None:
+        """Ответ в формате SSE по словам"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        pieces = re.findall(r"\S+\s*|\s+", content) or [""]
+        for i, piece in enumerate(pieces):
+            last = i == len(pieces) - 1
+            choice = {"delta": {"content": piece, "role": "assistant"}, "index": 0}
+            chunk = {"choices": [choice], "created": int(time()), "model": model, "object": "chat.completion"}
+            if last:
+                choice["finish_reason"] = finish_reason
+                chunk["usage"] = usage
+            self._chunk("data: " + json.dumps(chunk, ensure_ascii=False) + "\n\n")
+            if self.config.token_delay and not last:
+                sleep(self.config.token_delay)
+        self._chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, *args):
+        """Без логов на каждый запрос"""
+
+
+class StandInServer(ThreadingHTTPServer):
+    """HTTP сервер заглушки без трассировок на оборванных клиентом соединениях"""
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+def start_server(config: StandInConfig = None, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Поднять заглушку в фоновом потоке (port=0 - свободный порт)"""
+    handler = type("ConfiguredHandler", (StandInHandler,), {"config": config or StandInConfig()})
+    server = StandInServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def base_url(server: ThreadingHTTPServer) -> str:
+    """URL для GIGA_BASE_URL"""
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+def main():
+    """Запуск заглушки из командной строки"""
+    parser = argparse.ArgumentParser(description="Локальная заглушка GigaChat API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", default="fixed:0", help="fixed:x | uniform:a,b | lognormal:median,sigma")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Пауза между фрагментами потока, сек")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--length-rate", type=float, default=0.0, help="Доля ответов с finish_reason=length")
+    parser.add_argument("--blacklist-rate", type=float, default=0.0, help="Доля ответов с finish_reason=blacklist")
+    parser.add_argument("--script", help="JSON со сценарием ответов")
+    parser.add_argument("--prompt-delay", type=float, default=0.0, help="Обработка токена промпта вне кэша, сек")
+    parser.add_argument("--no-session-cache", action="store_true", help="Не кэшировать префикс по X-Session-ID")
+    args = parser.parse_args()
+    script = None
+    if args.script:
+        with open(args.script, "r", encoding="utf-8") as f:
+            script = json.load(f)
+    config = StandInConfig(
+        latency=args.latency,
+        token_delay=args.token_delay,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        length_rate=args.length_rate,
+        blacklist_rate=args.blacklist_rate,
+        script=script,
+        prompt_delay=args.prompt_delay,
+        session_cache=not args.no_session_cache
+    )
+    server = start_server(config, args.host, args.port)
+    print(f"Заглушка GigaChat: {base_url(server)} (GIGA_BASE_URL)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,67 +1,206 @@
 """Главная точка входа агента"""
-from agent.state_graph.graph import agent
+from agent.state_graph.graph import agent, agent_direct, resume_graph, has_checkpoint
 from agent.parsing.parsing_llm import classification_query
 from schemas.answer import Answer
+from agent.tools.llm_profiler import profile_request, format_report
+from agent.tools.llm_session import llm_session
+from agent.tools.settings import AGENT_FAST_CLASSIFY, AGENT_MODE
+from agent.tools.relevance import RELEVANCE
+from agent.tools.prefetch import PREFETCHER
+from agent.memory.session_store import SESSIONS
+from agent.tools.intent_router import INTENT_ROUTER
+from agent.memory.run_journal import JOURNAL
+from agent.prompts.prompts import not_relevant_reply
 from loguru import logger
+from uuid import uuid4
 
 
-def run_agent(task: str) -> Answer:
+def run_agent(task: str, on_token=None, mode: str = None, session_id: str = None) -> Answer:
     """
     Главная функция агента для обработки запросов
     
     Args:
         task: Запрос пользователя на естественном языке
+        on_token: Callback для потоковой выдачи финального ответа
+        mode: Режим агента react или plan (None - AGENT_MODE)
+        session_id: Идентификатор диалога: результаты инструментов прошлых
+            запросов переиспользуются (None - запрос без сессии)
     
     Returns:
-        Answer: Структурированный ответ агента
+        Answer: Структурированный ответ агента с профилем вызовов LLM;
+            после ошибки запуск продолжается через resume(answer.run_id)
     """
+    mode = mode or AGENT_MODE
+    run_id = str(uuid4())
+    JOURNAL.start(run_id, task, mode, session_id)
+    # Все вызовы LLM запуска (и всех запросов диалога) идут в одной сессии GigaChat (кэш префикса)
+    # Поиск и клон репозитория из запроса готовятся параллельно с классификацией
+    with (
+        profile_request() as profile,
+        llm_session(session_id) as llm_session_id,
+        SESSIONS.use(session_id),
+        JOURNAL.use(run_id),
+        PREFETCHER.run(task) as prefetch,
+    ):
+        answer = _run_agent(task, on_token, mode, run_id)
+    _close_run(run_id, answer)
+    answer.session_id = session_id or ""
+    _attach_profile(answer, profile, llm_session_id)
+    answer.llm_profile["prefetch"] = prefetch.summary() if prefetch else None
+    return answer
+
+
+def resume(run_id: str, on_token=None) -> Answer:
+    """
+    Продолжить запуск, прерванный ошибкой, таймаутом или падением процесса
+    
+    Граф продолжается с последнего сохранённого узла; инструменты, уже
+    выполненные в запуске, берутся из журнала. Запуск без checkpoint
+    (сбой до графа) выполняется заново с тем же журналом инструментов.
+    """
+    run = JOURNAL.get(run_id)
+    if run is None:
+        return Answer(text=f"Запуск {run_id} не найден или уже завершён", score="error", run_id=run_id)
+    JOURNAL.mark(run_id, "resumed")
+    session_id = run["session_id"]
+    with (
+        profile_request() as profile,
+        llm_session(session_id) as llm_session_id,
+        SESSIONS.use(session_id),
+        JOURNAL.use(run_id),
+    ):
+        if has_checkpoint(run_id):
+            try:
+                answer = _state_answer(*resume_graph(run["task"], run_id, run["mode"], on_token=on_token))
+            except Exception as e:
+                answer = _error_answer(e)
+        else:
+            answer = _run_agent(run["task"], on_token, run["mode"], run_id)
+    _close_run(run_id, answer)
+    answer.session_id = session_id or ""
+    _attach_profile(answer, profile, llm_session_id)
+    return answer
+
+
+def _close_run(run_id: str, answer: Answer) -> None:
+    """Успешный запуск удаляется из журнала, упавший остаётся для resume"""
+    if not JOURNAL.enabled:
+        return
+    answer.run_id = run_id
+    if answer.score == "error":
+        JOURNAL.mark(run_id, "failed")
+        logger.info(f"Запуск {run_id} можно продолжить: resume('{run_id}')")
+    else:
+        JOURNAL.finish(run_id)
+
+
+def _attach_profile(answer: Answer, profile, llm_session_id: str) -> None:
+    """Профиль вызовов LLM запуска в ответе и в логе"""
+    rows = profile.report("p95")
+    if rows:
+        logger.info("Профиль вызовов LLM запроса:\n" + format_report(rows))
+    answer.llm_profile = {
+        "session_id": llm_session_id,
+        "totals": profile.totals(),
+        "report": rows,
+        "histogram": profile.histogram(),
+    }
+
+
+def _not_relevant(text: str) -> Answer:
+    """Ответ на нерелевантный запрос"""
+    logger.info("Запрос классифицирован как нерелевантный")
+    return Answer(
+        text=text,
+        relevant_docs={},
+        context="",
+        score="not_relevant",
+        tokens_used=0
+    )
+
+
+def _run_agent(task: str, on_token=None, mode: str = AGENT_MODE, run_id: str = None) -> Answer:
+    """Классификация запроса и запуск агента"""
     logger.info(f"Получен запрос: {task[:100]}...")
     
-    # Проверка релевантности запроса
-    query_result = classification_query(task)
+    # Очевидный запрос (инструмент + репозиторий) - сразу инструмент, без классификации и планирования
+    route = INTENT_ROUTER.route(task)
+    
+    # Локальный классификатор решает уверенные случаи без вызова GigaChat
+    verdict = True
+    if route is None:
+        verdict, confidence = RELEVANCE.predict(task)
+        if verdict is not None:
+            logger.info(f"Локальный классификатор: релевантен={verdict}, уверенность {confidence}")
+    if verdict is False:
+        return _not_relevant(not_relevant_reply)
     
-    # Если запрос нерелевантен
-    if isinstance(query_result, dict) and "not_rel" in query_result:
-        logger.info("Запрос классифицирован как нерелевантный")
-        return Answer(
-            text=query_result["not_rel"],
-            relevant_docs={},
-            context="",
-            score="not_relevant",
-            tokens_used=0
-        )
+    # Иначе - отдельным вызовом LLM или в первом шаге агента (только react)
+    fast = AGENT_FAST_CLASSIFY and mode == "react"
+    if verdict is None and not fast:
+        query_result = classification_query(task)
+        if isinstance(query_result, dict) and "not_rel" in query_result:
+            return _not_relevant(query_result["not_rel"])
     
     # Обработка релевантного запроса через агента
     try:
-        answer_text, state = agent(task)
-        
-        logger.info("Запрос успешно обработан")
-        
-        return Answer(
-            text=answer_text,
-            relevant_docs=state.relevant_doc if hasattr(state, "relevant_doc") else {},
-            context=state.texts if hasattr(state, "texts") else "",
-            score=state.score if hasattr(state, "score") else "",
-            prompt_tokens_used=state.prompt_tokens if hasattr(state, "prompt_tokens") else 0,
-            completion_tokens_used=state.completion_tokens if hasattr(state, "completion_tokens") else 0,
-            tokens_used=state.total_tokens if hasattr(state, "total_tokens") else 0
-        )
+        if route:
+            answer_text, state = agent_direct(task, route, on_token=on_token)
+        else:
+            answer_text, state = agent(
+                task,
+                on_token=on_token,
+                check_relevance=fast and verdict is None,
+                mode=mode,
+                run_id=run_id
+            )
+        return _state_answer(answer_text, state)
     
     except Exception as e:
-        logger.error(f"Ошибка выполнения агента: {str(e)}")
-        return Answer(
-            text=f"Произошла ошибка при обработке запроса: {str(e)}",
-            relevant_docs={},
-            context="",
-            score="error",
-            tokens_used=0
-        )
+        return _error_answer(e)
+
+
+def _state_answer(answer_text: str, state) -> Answer:
+    """Ответ агента по итоговому State"""
+    if state.score == "not_relevant":
+        return _not_relevant(answer_text)
+    
+    logger.info("Запрос успешно обработан")
+    if state.stream_metrics:
+        logger.info(f"Время до первого токена: {state.stream_metrics['ttft']:.2f} с")
+    
+    return Answer(
+        text=answer_text,
+        relevant_docs=state.relevant_doc if hasattr(state, "relevant_doc") else {},
+        context=state.texts if hasattr(state, "texts") else "",
+        score=state.score if hasattr(state, "score") else "",
+        prompt_tokens_used=state.prompt_tokens if hasattr(state, "prompt_tokens") else 0,
+        completion_tokens_used=state.completion_tokens if hasattr(state, "completion_tokens") else 0,
+        tokens_used=state.total_tokens if hasattr(state, "total_tokens") else 0,
+        time_to_first_token=state.stream_metrics.get("ttft", 0.0)
+    )
+
+
+def _error_answer(e: Exception) -> Answer:
+    """Ответ на ошибку выполнения агента"""
+    logger.error(f"Ошибка выполнения агента: {str(e)}")
+    return Answer(
+        text=f"Произошла ошибка при обработке запроса: {str(e)}",
+        relevant_docs={},
+        context="",
+        score="error",
+        tokens_used=0
+    )
 
 
 if __name__ == "__main__":
     import sys
     
-    if len(sys.argv) > 1:
+    # python main.py --resume <run_id> - продолжить упавший запуск
+    resume_id = sys.argv[2] if len(sys.argv) > 2 and sys.argv[1] == "--resume" else None
+    if resume_id:
+        query = resume_id
+    elif len(sys.argv) > 1:
         query = " ".join(sys.argv[1:])
     else:
         print("Agent SPC - Интеллектуальный помощник для работы с репозиториями")
@@ -69,14 +208,33 @@ if __name__ == "__main__":
         query = input("Введите ваш запрос: ")
     
     if query.strip():
-        result = run_agent(query)
-        print("\n" + "=" * 60)
-        print("ОТВЕТ АГЕНТА:")
-        print("=" * 60)
-        print(result.text)
+        streamed = []
+
+        def print_token(piece: str):
+            """Печать фрагментов ответа по мере генерации"""
+            if not streamed:
+                print("\n" + "=" * 60)
+                print("ОТВЕТ АГЕНТА:")
+                print("=" * 60)
+            streamed.append(piece)
+            print(piece, end="", flush=True)
+
+        if resume_id:
+            result = resume(resume_id, on_token=print_token)
+        else:
+            result = run_agent(query, on_token=print_token)
+        if streamed:
+            print()
+        else:
+            print("\n" + "=" * 60)
+            print("ОТВЕТ АГЕНТА:")
+            print("=" * 60)
+            print(result.text)
         
         if result.score:
             print(f"\nОценка: {result.score}")
+        if result.score == "error" and result.run_id:
+            print(f"Продолжить запуск: python main.py --resume {result.run_id}")
         if result.tokens_used:
             print(f"Использовано токенов: {result.tokens_used}")
     else:
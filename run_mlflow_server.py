@@ -1,7 +1,9 @@
 """Flask API сервер для Agent SPC"""
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from loguru import logger
 import threading
+import queue
+import json
 
 # Импорты инструментов
 from tools.search_content import Search
@@ -11,6 +13,18 @@ from tools.info_tool import InfoTools
 from tools.evalution_repo.evalution_repo import EvalutionRepo
 from tools.evalution_code.awerage_main import EvalutionCode
 from tools.tools import TOOLS_DESCRIPTION
+from tools.tool_memo import TOOL_CACHE
+from agent.tools.llm_cache import CACHE
+from agent.tools.resilience import RESILIENCE
+from agent.tools.llm_profiler import PROFILER, SORT_KEYS
+from agent.tools.model_router import ROUTER
+from agent.tools.rate_limiter import LIMITER
+from agent.tools.hedging import HEDGER
+from agent.tools.relevance import RELEVANCE
+from agent.tools.prefetch import PREFETCHER
+from agent.memory.session_store import SESSIONS
+from agent.tools.intent_router import INTENT_ROUTER
+from agent.memory.run_journal import JOURNAL
 
 app = Flask(__name__)
 
@@ -42,6 +56,98 @@ def search_content():
         return jsonify({"status": 500, "answer": f"Ошибка: {str(e)}"})
 
 
+def sse(event: str, data) -> str:
+    """Событие Server-Sent-Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.route("/search_content_stream", methods=["POST"])
+def search_content_stream():
+    """Семантический поиск с потоковой генерацией ответа (SSE)
+
+    События: meta (найденные документы), token (фрагмент ответа),
+    done (ttft и latency в секундах) или error.
+    """
+    data = request.json or {}
+    query = data.get("query", "")
+    
+    if not query:
+        return jsonify({"status": 400, "answer": "Не указан поисковый запрос"})
+    
+    def generate():
+        try:
+            search = Search()
+            result = search.get_relevant(query)
+            if result["status"] != 200:
+                yield sse("error", result)
+                return
+            yield sse("meta", {
+                "relevant_doc": result["relevant_doc"],
+                "score": result["score"],
+            })
+            metrics = {}
+            for piece in search.answer_llm_stream(query, result["chunks"], metrics=metrics):
+                yield sse("token", {"text": piece})
+            yield sse("done", metrics)
+        except Exception as e:
+            logger.error(f"Ошибка search_content_stream: {str(e)}")
+            yield sse("error", {"status": 500, "answer": f"Ошибка: {str(e)}"})
+    
+    return Response(stream_with_context(generate()), mimetype="text/event-stream")
+
+
+@app.route("/agent_stream", methods=["POST"])
+def agent_stream():
+    """Запуск агента с потоковой выдачей финального ответа (SSE)
+
+    Параметр mode: react или plan (по умолчанию AGENT_MODE);
+    session_id - диалог, в котором переиспользуются результаты инструментов.
+    События: token (фрагмент ответа), done (итоговый Answer) или error.
+    """
+    from main import run_agent
+    data = request.json or {}
+    query = data.get("query", "")
+    mode = data.get("mode")
+    session_id = data.get("session_id")
+    
+    if not query:
+        return jsonify({"status": 400, "answer": "Не указан запрос"})
+    if mode not in (None, "react", "plan"):
+        return jsonify({"status": 400, "answer": "mode должен быть react или plan"})
+    
+    events = queue.Queue()
+    
+    def worker():
+        try:
+            answer = run_agent(query, on_token=lambda piece: events.put(("token", {"text": piece})), mode=mode, session_id=session_id)
+            events.put(("done", answer.model_dump()))
+        except Exception as e:
+            logger.error(f"Ошибка agent_stream: {str(e)}")
+            events.put(("error", {"status": 500, "answer": f"Ошибка: {str(e)}"}))
+    
+    threading.Thread(target=worker, daemon=True).start()
+    
+    def generate():
+        while True:
+            event, payload = events.get()
+            yield sse(event, payload)
+            if event in ("done", "error"):
+                return
+    
+    return Response(generate(), mimetype="text/event-stream")
+
+
+@app.route("/agent_session", methods=["DELETE"])
+def agent_session():
+    """Завершить диалог: результаты инструментов сессии удаляются"""
+    data = request.json or {}
+    session_id = data.get("session_id")
+    if not session_id:
+        return jsonify({"status": 400, "answer": "Не указан session_id"})
+    SESSIONS.drop(session_id)
+    return jsonify({"status": 200, "answer": f"Сессия {session_id} завершена"})
+
+
 @app.route("/read_file", methods=["POST"])
 def read_file():
     """Чтение файла из репозитория BitBucket"""
@@ -140,6 +246,48 @@ def info_tools():
         return jsonify({"status": 500, "answer": f"Ошибка: {str(e)}"})
 
 
+@app.route("/llm_stats", methods=["GET"])
+def llm_stats():
+    """Статистика слоя LLM: кэш ответов, retry, circuit breaker, маршруты моделей, rate limiter,
+    хеджирование, локальный классификатор релевантности, предзагрузка и сессии агента,
+    кэш инструментов по коммиту, маршрутизатор очевидных запросов и журнал запусков"""
+    return jsonify({
+        "status": 200,
+        "answer": {
+            "cache": CACHE.stats(),
+            "resilience": RESILIENCE.stats(),
+            "routing": ROUTER.stats(),
+            "rate_limit": LIMITER.stats(),
+            "hedging": HEDGER.stats(),
+            "relevance": RELEVANCE.stats(),
+            "prefetch": PREFETCHER.stats(),
+            "sessions": SESSIONS.stats(),
+            "tool_cache": TOOL_CACHE.stats(),
+            "intents": INTENT_ROUTER.stats(),
+            "runs": JOURNAL.stats(),
+        }
+    })
+
+
+@app.route("/llm_profile", methods=["GET"])
+def llm_profile():
+    """Профиль вызовов LLM процесса по местам вызова
+
+    Параметр sort: p50, p95 (по умолчанию), total_tokens или calls.
+    """
+    sort = request.args.get("sort", "p95")
+    if sort not in SORT_KEYS:
+        return jsonify({"status": 400, "answer": f"sort должен быть одним из {list(SORT_KEYS)}"})
+    return jsonify({
+        "status": 200,
+        "answer": {
+            "totals": PROFILER.totals(),
+            "report": PROFILER.report(sort),
+            "histogram": PROFILER.histogram(),
+        }
+    })
+
+
 @app.route("/health", methods=["GET"])
 def health():
     """Проверка здоровья сервера"""
@@ -166,11 +314,16 @@ if __name__ == "__main__":
     logger.info("API endpoints:")
     logger.info("  GET  /show_tools - список инструментов")
     logger.info("  POST /search_content - поиск контента")
+    logger.info("  POST /search_content_stream - поиск с потоковым ответом (SSE)")
+    logger.info("  POST /agent_stream - агент с потоковым ответом (SSE)")
+    logger.info("  DELETE /agent_session - завершить диалог агента")
     logger.info("  POST /read_file - чтение файла")
     logger.info("  POST /show_files - список файлов")
     logger.info("  POST /gen_readme - генерация README")
     logger.info("  POST /awerage_repo - оценка оформления")
     logger.info("  POST /rate_repository - оценка кода")
     logger.info("  GET  /info_tools - информация")
+    logger.info("  GET  /llm_stats - статистика слоя LLM")
+    logger.info("  GET  /llm_profile - профиль вызовов LLM по местам вызова")
     
     app.run(host="0.0.0.0", port=5001, debug=False)
@@ -11,3 +11,7 @@ class Answer(BaseModel):
     prompt_tokens_used: int = 0
     completion_tokens_used: int = 0
     tokens_used: int = 0
+    time_to_first_token: float = 0.0
+    llm_profile: dict = {}
+    session_id: str = ''
+    run_id: str = ''
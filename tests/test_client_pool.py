@@ -0,0 +1,44 @@
+"""Пул клиентов GigaChat: смена токена не закрывает занятый клиент"""
+from agent.tools.client_pool import GigaChatPool
+
+
+class FakeClient:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeChat:
+    def __init__(self, **kwargs):
+        self.access_token = kwargs["access_token"]
+        self._client = FakeClient()
+
+
+def lease(pool, token):
+    return pool.lease(base_url="http://giga", model="GigaChat", temperature=0.1, access_token=token)
+
+
+def test_retired_client_closes_after_last_user():
+    pool = GigaChatPool(FakeChat)
+    with lease(pool, "old") as old:
+        with lease(pool, "old") as same:
+            assert same is old
+            with lease(pool, "new") as new:
+                assert new is not old
+                assert not old._client.closed
+                assert pool.stats()["retired"] == 1
+            assert not old._client.closed
+        assert not old._client.closed
+    assert old._client.closed
+    assert not new._client.closed
+    assert pool.stats()["retired"] == 0
+
+
+def test_idle_client_closes_on_token_change():
+    pool = GigaChatPool(FakeChat)
+    with lease(pool, "old") as old:
+        pass
+    with lease(pool, "new"):
+        assert old._client.closed
@@ -0,0 +1,65 @@
+"""Хеджирование: учёт проигравшего запроса, слоты семафора и повторы"""
+from agent.tools.hedging import Hedger
+from agent.tools.llm_loop import LLM_LOOP
+from agent.tools.resilience import CALL_ATTEMPTS
+from agent.tools import run_giga
+from langchain_core.messages import AIMessage
+from contextlib import nullcontext
+from types import SimpleNamespace
+import asyncio
+
+
+def test_loser_reports_measured_latency():
+    delays = iter([0.3, 0.01])
+    extra = []
+
+    async def call():
+        delay = next(delays)
+        await asyncio.sleep(delay)
+        return delay
+
+    async def scenario():
+        hedger = Hedger(enabled=True, min_samples=10 ** 6, default_delay=0.05, max_rate=1.0, cancel=False)
+        result = await hedger.run(
+            call, "bench.hedging", usage=lambda r: (1, 2, 3), on_extra=lambda tokens, latency: extra.append((tokens, latency))
+        )
+        await asyncio.sleep(0.4)
+        return result
+
+    assert asyncio.run(scenario()) == 0.01
+    (tokens, latency), = extra
+    assert tokens == (1, 2, 3)
+    assert 0.25 < latency < 0.6
+
+
+class SlowPrimaryChat:
+    """Основной запрос повторяется и отвечает поздно, дубликат - сразу"""
+
+    def __init__(self):
+        self.calls = 0
+        self.free_slots = []
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        self.free_slots.append(LLM_LOOP.semaphore._value)
+        if self.calls == 1:
+            await asyncio.sleep(0.1)
+            CALL_ATTEMPTS.get()["retries"] += 1
+            await asyncio.sleep(0.3)
+        else:
+            await asyncio.sleep(0.1)
+        usage = SimpleNamespace(prompt_tokens=1, completion_tokens=1, total_tokens=2)
+        return AIMessage(content=f"ответ {self.calls}", response_metadata={"finish_reason": "stop", "token_usage": usage})
+
+
+def test_hedge_has_own_slot_and_retry_counter(monkeypatch):
+    chat = SlowPrimaryChat()
+    written = []
+    monkeypatch.setattr(run_giga, "_get_chat", lambda model_name, temperature: nullcontext(chat))
+    monkeypatch.setattr(run_giga, "write_tokens", lambda *usage, **kwargs: written.append(kwargs))
+    monkeypatch.setattr(run_giga, "HEDGER", Hedger(min_samples=10 ** 6, default_delay=0.05, max_rate=1.0))
+    content, _ = asyncio.run(run_giga._acall("вопрос", "промпт", "GigaChat", 0.1, "bench.hedging", False, hedge=True))
+    assert content == "ответ 2"
+    free = LLM_LOOP.max_concurrency
+    assert chat.free_slots == [free - 1, free - 2]
+    assert written[0]["retries"] == 0
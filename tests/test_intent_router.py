@@ -0,0 +1,48 @@
+"""Маршрутизация очевидных запросов"""
+from agent.tools.intent_router import IntentRouter
+import pytest
+
+
+@pytest.fixture
+def router():
+    return IntentRouter(enabled=True, known_repos=lambda: {"api", "demo"})
+
+
+@pytest.mark.parametrize("query, content", [
+    ("Оцени код репозитория demo", {"name_tool": "rate_repository", "repository": "demo"}),
+    ("Прогони pylint по demo", {"name_tool": "rate_repository", "repository": "demo"}),
+    ("Проверь оформление demo", {"name_tool": "awerage_repo", "repository": "demo"}),
+    ("Покажи файлы репозитория demo ветка dev", {"name_tool": "show_files", "repository": "demo", "branch": "dev"}),
+    ("Сгенерируй README для demo", {"name_tool": "gen_readme", "repository": "demo"}),
+    ("Покажи свои инструменты", {"name_tool": "info_tools"}),
+])
+def test_routes_single_tool(router, query, content):
+    assert router.match(query) == content
+
+
+@pytest.mark.parametrize("query", [
+    "Что такое pylint? Объясни на примере demo",
+    "Почему pylint ругается на demo",
+    "Как настроить линтер в репозитории demo?",
+    "Какой линтер используется в demo",
+    "какие инструменты есть в репозитории demo",
+    "Покажи инструменты репозитория demo",
+    "Оцени код demo?",
+    "Расскажи, как оценить код demo",
+])
+def test_questions_and_nouns_fall_through(router, query):
+    assert router.match(query) is None
+
+
+@pytest.mark.parametrize("query", [
+    "Не надо оценивать код, расскажи про api",
+    "Не проверяй код, оцени код api",
+    "Расскажи про demo без pylint",
+    "Не показывай файлы demo",
+])
+def test_negation_falls_through(router, query):
+    assert router.match(query) is None
+
+
+def test_compound_falls_through(router):
+    assert router.match("Оцени код и оформление demo") is None
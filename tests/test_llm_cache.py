@@ -0,0 +1,43 @@
+"""Кэш ответов LLM"""
+from agent.tools.llm_cache import LLMCache
+from agent.tools import run_giga
+from benchmarks.giga_standin import start_server, base_url, StandInConfig
+import pytest
+
+
+def test_corrupt_file_does_not_break_stats(tmp_path):
+    path = tmp_path / "cache.sqlite"
+    path.write_bytes(b"not a sqlite database" * 100)
+    cache = LLMCache(path=str(path), enabled=True)
+    assert cache.stats()["disk_items"] is None
+    cache.clear()
+    cache.put("k", "v")
+    assert cache.get("k") == "v"
+
+
+def test_global_switch_wins_over_call_site():
+    assert not LLMCache(path="", enabled=False).use(True)
+    assert LLMCache(path="", enabled=True).use(None)
+    assert not LLMCache(path="", enabled=True).use(False)
+
+
+@pytest.fixture
+def standin(monkeypatch):
+    server = start_server(StandInConfig(latency="fixed:0", script=[
+        {"match": "cache-test-bad", "response": "не JSON"},
+        {"match": "cache-test-good", "response": "{\"ok\": 1}"},
+    ]))
+    monkeypatch.setattr(run_giga, "GIGA_BASE_URL", base_url(server))
+    monkeypatch.setattr(run_giga, "CACHE", LLMCache(path="", enabled=True))
+    yield run_giga.CACHE
+    server.shutdown()
+
+
+def test_only_validated_answers_are_cached(standin):
+    valid = lambda text: text.startswith("{")
+    run_giga.llm("q", "cache-test-bad", call_site="test.cache", validate=valid)
+    assert standin.stats()["stores"] == 0
+    run_giga.llm("q", "cache-test-good", call_site="test.cache", validate=valid)
+    run_giga.llm("q", "cache-test-good", call_site="test.cache", validate=valid)
+    stats = standin.stats()
+    assert stats["stores"] == 1 and stats["memory_hits"] == 1
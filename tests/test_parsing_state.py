@@ -0,0 +1,23 @@
+"""Результаты инструментов в State"""
+from agent.memory.memory_state import State
+from agent.parsing.parsing_state import post_form_instrument, tool_keys
+
+
+def test_same_tool_twice_in_step_keeps_both_results():
+    actions = [
+        {"name_tool": "read_file", "repository": "demo", "file_path": "a.py"},
+        {"name_tool": "read_file", "repository": "demo", "file_path": "b.py"},
+        {"name_tool": "show_files", "repository": "demo"},
+    ]
+    outputs = [{"status": 200, "answer": "A"}, {"status": 200, "answer": "B"}, {"status": 200, "answer": "a.py b.py"}]
+    state = State()
+    keys = tool_keys(actions)
+    for action, output, key in zip(actions, outputs, keys):
+        post_form_instrument(action, output, state, key)
+    assert keys[2] == "show_files"
+    assert sorted(v for k, v in state.result_tools.items() if k.startswith("read_file")) == ["A", "B"]
+
+
+def test_identical_calls_share_plain_key():
+    actions = [{"name_tool": "search_content", "query": "q"}] * 2
+    assert tool_keys(actions) == ["search_content", "search_content"]
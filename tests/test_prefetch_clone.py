@@ -0,0 +1,90 @@
+"""Спекулятивный клон забирается инструментами оценки"""
+from tools.evalution_code.awerage_main import EvalutionCode
+from tools.evalution_repo.evalution_repo import EvalutionRepo
+from tools.settings import Configure
+from tools.git import Git, PREFETCH_DIR
+from agent.tools import prefetch
+from agent.tools.prefetch import Prefetcher
+from pathlib import Path
+from time import perf_counter, sleep
+import contextvars
+import json
+import pytest
+
+
+@pytest.fixture
+def clones(tmp_path, monkeypatch):
+    """Git без BitBucket: клонирование создаёт каталог и учитывается"""
+    calls = []
+
+    def fake_clone(self, repo, path, branch=''):
+        calls.append((repo, branch))
+        Path(path).mkdir(parents=True)
+        (Path(path) / "README.md").write_text(f"# {repo}", encoding="utf-8")
+
+    monkeypatch.setenv("GIT_NAME_PROJECT_BB", "P")
+    monkeypatch.setenv("PATH_CLONE", str(tmp_path))
+    monkeypatch.setattr(Configure, "_check_auth", lambda self: True)
+    monkeypatch.setattr(Git, "_clone", fake_clone)
+    return calls
+
+
+@pytest.mark.parametrize("tool", [EvalutionRepo, EvalutionCode])
+def test_prefetched_clone_is_taken(clones, tool, tmp_path):
+    assert Git().prefetch_clone("demo")["status"] == 200
+    evaluator = tool({"repository": "demo"})
+    result = evaluator.git_clone(evaluator.repo, evaluator.branch)
+    assert result["status"] == 200
+    assert (tmp_path / "demo" / "README.md").exists()
+    assert clones == [("demo", "master")]
+
+
+def test_other_branch_does_not_wait(clones, tmp_path):
+    git = Git()
+    _, lock, _, _ = git._prefetch_paths("demo")
+    lock.parent.mkdir(parents=True)
+    lock.write_text(json.dumps({"pid": 0, "branch": "master"}), encoding="utf-8")
+    start = perf_counter()
+    assert git.git_clone("demo", "dev")["status"] == 200
+    assert perf_counter() - start < 1
+    assert clones == [("demo", "dev")]
+
+
+@pytest.fixture
+def prefetcher(clones, monkeypatch):
+    monkeypatch.setattr(prefetch, "_list_repos", lambda: {"demo"})
+    monkeypatch.setattr(prefetch, "_search_relevant", lambda query: {"status": 200})
+    return Prefetcher(enabled=True)
+
+
+def wait_clone(run):
+    for _ in range(100):
+        future = run.clones.get("demo")
+        if future is not None and future.done():
+            return
+        sleep(0.02)
+    raise AssertionError("клон не подготовлен")
+
+
+def test_overlapping_runs_share_clone(prefetcher, tmp_path):
+    first = contextvars.copy_context()
+    first_run = first.run(prefetcher.run, "оцени код demo")
+    wait_clone(first.run(first_run.__enter__))
+    with prefetcher.run("покажи файлы demo") as second:
+        wait_clone(second)
+        # Первый запуск завершается раньше - клон второго не удаляется
+        first.run(first_run.__exit__, None, None, None)
+        assert (tmp_path / PREFETCH_DIR / "demo").exists()
+        evaluator = EvalutionCode({"repository": "demo"})
+        evaluator.git_clone(evaluator.repo, evaluator.branch)
+    stats = prefetcher.stats()
+    assert stats["clone_hits"] == 1 and stats["clone_wasted"] == 0
+    assert (tmp_path / "demo" / "README.md").exists()
+
+
+def test_unused_clone_is_wasted(prefetcher, tmp_path):
+    with prefetcher.run("оцени код demo") as run:
+        wait_clone(run)
+    stats = prefetcher.stats()
+    assert stats["clone_hits"] == 0 and stats["clone_wasted"] == 1
+    assert not (tmp_path / PREFETCH_DIR / "demo").exists()
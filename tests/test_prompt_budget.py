@@ -0,0 +1,17 @@
+"""Сокращение выводов инструментов до бюджета"""
+from agent.memory.prompt_budget import markdown_outline, estimate_tokens
+
+
+def test_outline_without_markdown_keeps_text():
+    text = "Plain pylint output line\n" * 2000
+    result = markdown_outline(text, 200)
+    assert result.startswith("Plain pylint output line")
+    assert 0 < estimate_tokens(result) <= 200
+
+
+def test_small_outline_is_filled_from_text():
+    text = "# Report\nscore 7/10\n" + "plain text here\n" * 2000
+    result = markdown_outline(text, 200)
+    assert result.startswith("# Report\nscore 7/10")
+    assert "plain text here" in result
+    assert estimate_tokens(result) <= 200
@@ -0,0 +1,40 @@
+"""Rate limiter не блокирует event loop обращениями к общему SQLite"""
+from agent.tools.rate_limiter import RateLimiter, BucketStore
+import asyncio
+import threading
+
+
+class RecordingStore(BucketStore):
+    """Хранилище SQLite, запоминающее потоки вызовов"""
+
+    def __init__(self, path):
+        super().__init__(str(path))
+        self.threads = []
+
+    def take(self, needs):
+        self.threads.append(threading.get_ident())
+        return super().take(needs)
+
+    def adjust(self, name, delta, capacity):
+        self.threads.append(threading.get_ident())
+        super().adjust(name, delta, capacity)
+
+
+def test_async_acquire_leaves_event_loop(tmp_path):
+    store = RecordingStore(tmp_path / "rate.sqlite")
+    limiter = RateLimiter(rps=100, burst=10, tpm=100000, store=store)
+
+    async def call():
+        await limiter.aacquire(100)
+        await limiter.asettle(100, 150)
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(call())
+    assert len(store.threads) == 2
+    assert loop_thread not in store.threads
+
+
+def test_in_memory_async_acquire_waits_for_refill():
+    limiter = RateLimiter(rps=5, burst=1, tpm=0, store=BucketStore(""))
+    assert asyncio.run(limiter.aacquire()) < 0.05
+    assert asyncio.run(limiter.aacquire()) > 0.1
@@ -0,0 +1,65 @@
+"""Circuit breaker и лимит повторов GigaChat"""
+from agent.tools import resilience as resilience_module
+from agent.tools.resilience import Resilience, CircuitBreaker, track_attempts
+import asyncio
+import pytest
+
+
+def open_breaker() -> Resilience:
+    resilience = Resilience(attempts=1)
+    resilience.breaker = CircuitBreaker(window=60, min_calls=1, threshold=0.5, cooldown=0)
+    resilience.breaker.record(False)
+    assert resilience.breaker.state == CircuitBreaker.OPEN
+    return resilience
+
+
+def test_cancelled_probe_frees_half_open():
+    resilience = open_breaker()
+
+    async def slow():
+        await asyncio.sleep(10)
+
+    async def fast():
+        return "ok"
+
+    async def scenario():
+        probe = asyncio.ensure_future(resilience.acall(slow))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        assert resilience.breaker.state == CircuitBreaker.HALF_OPEN
+        return await resilience.acall(fast)
+
+    assert asyncio.run(scenario()) == "ok"
+    assert resilience.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_closed_stream_frees_half_open():
+    resilience = open_breaker()
+    stream = resilience.stream(lambda: iter(["a", "b"]))
+    assert next(stream) == "a"
+    stream.close()
+    assert resilience.call(lambda: "ok") == "ok"
+    assert resilience.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_continuations_share_retry_limit(monkeypatch):
+    monkeypatch.setattr(resilience_module, "backoff_delay", lambda attempt: 0.0)
+    resilience = Resilience(attempts=3)
+    failures = iter([True, False, True, False, True])
+
+    def flaky():
+        if next(failures):
+            raise ConnectionError("сбой сети")
+        return "ok"
+
+    counter = track_attempts()
+    # Первый запрос и продолжение ответа - по одному повтору
+    assert resilience.call(flaky) == "ok"
+    assert resilience.call(flaky) == "ok"
+    assert counter == {"attempts": 4, "retries": 2}
+    # Лимит в 2 повтора исчерпан - следующий сбой не повторяется
+    with pytest.raises(ConnectionError):
+        resilience.call(flaky)
+    assert counter == {"attempts": 5, "retries": 2}
@@ -0,0 +1,27 @@
+"""Ошибка генерации в потоковом поиске приходит событием error"""
+from tools import search_content
+from tools.search_content import Search
+import run_mlflow_server
+
+
+class FoundSearch(Search):
+    """Поиск без базы знаний: один найденный документ"""
+
+    def __init__(self):
+        pass
+
+    def get_relevant(self, quest):
+        return {"status": 200, "relevant_doc": {"a.md": "1"}, "score": "1", "chunks": ["текст"]}
+
+
+def test_generation_error_is_sse_error(monkeypatch):
+    def broken_stream(query, prompt, call_site=None, metrics=None):
+        yield "начало"
+        raise RuntimeError("обрыв соединения")
+
+    monkeypatch.setattr(search_content, "llm_stream", broken_stream)
+    monkeypatch.setattr(run_mlflow_server, "Search", FoundSearch)
+    response = run_mlflow_server.app.test_client().post("/search_content_stream", json={"query": "вопрос"})
+    events = [block.split("\n", 1)[0] for block in response.get_data(as_text=True).strip().split("\n\n")]
+    assert events == ["event: meta", "event: token", "event: error"]
+    assert "обрыв соединения" in response.get_data(as_text=True)
@@ -0,0 +1,30 @@
+"""Результаты инструментов в сессии агента"""
+from agent.memory.memory_state import State
+from agent.memory.session_store import AgentSession
+
+READ = {"name_tool": "read_file", "repository": "demo", "file_path": "a.py"}
+FILES = {"name_tool": "show_files", "repository": "demo"}
+INFO = {"name_tool": "info_tools"}
+
+
+def test_repository_tools_are_not_kept():
+    session = AgentSession("s")
+    session.remember(READ, {"status": 200, "answer": "print(1)"})
+    session.remember(FILES, {"status": 200, "answer": "a.py"})
+    session.remember(INFO, {"status": 200, "answer": "инструменты"})
+    assert session.lookup(READ) is None
+    assert session.lookup(FILES) is None
+    assert session.lookup(INFO) == {"status": 200, "answer": "инструменты"}
+
+
+def test_seed_skips_stored_repository_tools():
+    stored = [
+        {"content": READ, "output": {"status": 200, "answer": "print(1)"}},
+        {"content": FILES, "output": {"status": 200, "answer": "a.py"}},
+        {"content": INFO, "output": {"status": 200, "answer": "инструменты"}},
+    ]
+    state = State()
+    AgentSession("s", tools=stored).seed(state)
+    assert "info_tools" in state.history_tools
+    assert "read_file" not in state.history_tools
+    assert "show_files" not in state.history_tools
@@ -140,6 +140,24 @@ class ConnectionAPI(Configure):
             return {"status": 200, "answer": commits}
         return {"status": 404, "answer": "Коммиты не найдены"}
 
+    def get_head_commit(self, repo: str, branch: str = "master") -> dict:
+        """Получить sha последнего коммита ветки"""
+        url = f'/rest/api/1.0/projects/{self.proj}/repos/{repo}/commits'
+        response = requests.get(
+            self.main_url + url,
+            verify=False,
+            headers=self.headers,
+            auth=self.auth,
+            params={'until': branch, 'limit': 1},
+            timeout=30
+        )
+        
+        if response.status_code == 200:
+            commits = response.json().get("values", [])
+            if commits:
+                return {"status": 200, "answer": commits[0]["id"]}
+        return {"status": 404, "answer": f"Ветка {branch} не найдена"}
+
     def _get_main_user(self, repo: str, commits: list) -> dict:
         """Получить статистику изменений по пользователям"""
         users = {}
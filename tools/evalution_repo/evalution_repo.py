@@ -2,13 +2,19 @@
 from tools.git import Git
 from tools.evalution_repo.check_dir_repo import EvalDir
 from tools.evalution_repo.prompts import sys_prompt_evalution_readme_1, sys_prompt_evalution_readme_2
-from agent.tools.run_giga import llm
+from agent.tools.run_giga import llm, llm_batch
+from agent.tools.llm_session import llm_session
 from agent.parsing.parsing_text import parsing_input
 from pathlib import Path
 import markdown
 from bs4 import BeautifulSoup
 
 
+def is_json(text: str) -> bool:
+    """Ответ оценки разобран в словарь баллов"""
+    return isinstance(parsing_input(text), dict)
+
+
 class EvalutionRepo(Git):
     """Класс для оценки оформления репозитория (0-26 баллов)"""
 
@@ -65,19 +71,10 @@ class EvalutionRepo(Git):
         
         return {"score": None, "comment": "Требуется LLM оценка"}
 
-    def score_readme_part_1(self, readme_content: str, files: list) -> dict:
-        """Оценка README по первой части критериев (0-6 баллов)"""
-        if not readme_content:
-            return {
-                "text_content": {"grade": 0, "comment": "README отсутствует"},
-                "check_sections": {"grade": 0, "comment": "README отсутствует"},
-                "check_description_title": {"grade": 0, "comment": "README отсутствует"},
-                "total": 0
-            }
-        
-        # Формируем запрос для LLM
+    def _query_readme_1(self, readme_content: str, files: list) -> str:
+        """Запрос к LLM для первой части критериев README"""
         files_str = "\n".join(files[:50])
-        query = f"""README.md содержимое:
+        return f"""README.md содержимое:
 ```markdown
 {readme_content[:3000]}
 ```
@@ -85,9 +82,43 @@ class EvalutionRepo(Git):
 Список файлов репозитория:
 {files_str}
 """
+
+    def _query_readme_2(self, readme_content: str, files: list) -> str:
+        """Запрос к LLM для второй части критериев README"""
+        code_files = [f for f in files if any(f.endswith(ext) for ext in [".py", ".ipynb", ".sql"])]
+        code_files_str = "\n".join(code_files[:30])
+        return f"""README.md содержимое:
+```markdown
+{readme_content[:3000]}
+```
+
+Файлы с кодом, которые должны быть описаны:
+{code_files_str}
+"""
+
+    def score_readme_part_1(self, readme_content: str, files: list, response=None) -> dict:
+        """Оценка README по первой части критериев (0-6 баллов)
+
+        response - готовый ответ LLM (например, из llm_batch); None - запросить
+        """
+        if not readme_content:
+            return {
+                "text_content": {"grade": 0, "comment": "README отсутствует"},
+                "check_sections": {"grade": 0, "comment": "README отсутствует"},
+                "check_description_title": {"grade": 0, "comment": "README отсутствует"},
+                "total": 0
+            }
         
         try:
-            response = llm(query, sys_prompt_evalution_readme_1)
+            if response is None:
+                response = llm(
+                    self._query_readme_1(readme_content, files),
+                    sys_prompt_evalution_readme_1,
+                    call_site="evalution_repo.readme_1",
+                    validate=is_json
+                )
+            if isinstance(response, Exception):
+                raise response
             result = parsing_input(response)
             
             if isinstance(result, dict):
@@ -128,8 +159,11 @@ class EvalutionRepo(Git):
             "total": toc_score + sections_score + title_score
         }
 
-    def score_readme_part_2(self, readme_content: str, files: list) -> dict:
-        """Оценка README по второй части критериев (0-8 баллов)"""
+    def score_readme_part_2(self, readme_content: str, files: list, response=None) -> dict:
+        """Оценка README по второй части критериев (0-8 баллов)
+
+        response - готовый ответ LLM (например, из llm_batch); None - запросить
+        """
         if not readme_content:
             return {
                 "availability_contacts": {"grade": 0, "comment": "README отсутствует"},
@@ -141,19 +175,17 @@ class EvalutionRepo(Git):
         
         # Список скриптов для проверки
         code_files = [f for f in files if any(f.endswith(ext) for ext in [".py", ".ipynb", ".sql"])]
-        code_files_str = "\n".join(code_files[:30])
-        
-        query = f"""README.md содержимое:
-```markdown
-{readme_content[:3000]}
-```
-
-Файлы с кодом, которые должны быть описаны:
-{code_files_str}
-"""
         
         try:
-            response = llm(query, sys_prompt_evalution_readme_2)
+            if response is None:
+                response = llm(
+                    self._query_readme_2(readme_content, files),
+                    sys_prompt_evalution_readme_2,
+                    call_site="evalution_repo.readme_2",
+                    validate=is_json
+                )
+            if isinstance(response, Exception):
+                raise response
             result = parsing_input(response)
             
             if isinstance(result, dict):
@@ -236,11 +268,21 @@ class EvalutionRepo(Git):
         readme_content = self._get_readme_content(local_path)
         files = self.get_local_files(self.repo)
         
-        # Оценка README часть 1 (0-6)
-        readme_1 = self.score_readme_part_1(readme_content, files)
-        
-        # Оценка README часть 2 (0-8)
-        readme_2 = self.score_readme_part_2(readme_content, files)
+        # Вызовы LLM оценки (включая повторные запросы частей) - в одной сессии GigaChat
+        with llm_session():
+            # Оба запроса оценки README независимы - отправляем их параллельно
+            responses = [None, None]
+            if readme_content:
+                responses = llm_batch([
+                    (self._query_readme_1(readme_content, files), sys_prompt_evalution_readme_1),
+                    (self._query_readme_2(readme_content, files), sys_prompt_evalution_readme_2),
+                ], max_concurrency=2, call_site="evalution_repo.readme", validate=is_json)
+
+            # Оценка README часть 1 (0-6)
+            readme_1 = self.score_readme_part_1(readme_content, files, responses[0])
+
+            # Оценка README часть 2 (0-8)
+            readme_2 = self.score_readme_part_2(readme_content, files, responses[1])
         
         # Итоговые баллы
         score_structure = structure_score["total"]  # 0-9
@@ -107,7 +107,8 @@ class GenReadme(Git):
         try:
             readme_content = llm(
                 "Сгенерируй README.md файл для репозитория",
-                prompt
+                prompt,
+                call_site="gen_readme"
             )
             
             # Сохраняем README
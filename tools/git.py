@@ -1,10 +1,19 @@
 """Git операции для работы с репозиториями"""
 from tools.bitbucket import ConnectionAPI
+from agent.tools.settings import PREFETCH_WAIT, PREFETCH_CLONE_TTL
 from git import Repo
 from pathlib import Path
+from time import time, sleep
 import shutil
+import json
 import os
 
+# Каталог спекулятивных клонов внутри clone_repo_path
+PREFETCH_DIR = ".prefetch"
+
+# Ветка инструментов оценки без явного branch (data.get("branch", "master"))
+DEFAULT_BRANCH = "master"
+
 
 class Git(ConnectionAPI):
     """Класс для Git операций"""
@@ -12,43 +21,131 @@ class Git(ConnectionAPI):
     def __init__(self):
         super().__init__()
 
+    def _clone_url(self, repo: str) -> str:
+        return f'{self.main_url}/scm/{self.proj}/{repo}.git'
+
+    def _clone(self, repo: str, path: Path, branch: str = '') -> None:
+        """git clone в path (исключение при ошибке)"""
+        kwargs = {"branch": branch} if branch else {}
+        Repo.clone_from(
+            self._clone_url(repo),
+            path,
+            env={
+                'GIT_ASKPASS': 'echo',
+                'GIT_USERNAME': self.login,
+                'GIT_PASSWORD': self.psw
+            },
+            **kwargs
+        )
+
     def git_clone(self, repo: str, branch: str = '') -> dict:
         """Клонирование репозитория из BitBucket"""
         clone_path = Path(self.clone_repo_path) / repo
         
+        # Готовый спекулятивный клон из run_agent забирается вместо нового
+        if self._take_prefetched(repo, branch):
+            return {"status": 200, "answer": f"Репозиторий {repo} успешно склонирован", "path": str(clone_path)}
+        
         # Удалить если существует
         if clone_path.exists():
             self._dell_repo(repo)
         
-        # Формируем URL
-        clone_url = f'{self.main_url}/scm/{self.proj}/{repo}.git'
-        
         try:
-            if branch:
-                Repo.clone_from(
-                    clone_url,
-                    clone_path,
-                    branch=branch,
-                    env={
-                        'GIT_ASKPASS': 'echo',
-                        'GIT_USERNAME': self.login,
-                        'GIT_PASSWORD': self.psw
-                    }
-                )
-            else:
-                Repo.clone_from(
-                    clone_url,
-                    clone_path,
-                    env={
-                        'GIT_ASKPASS': 'echo',
-                        'GIT_USERNAME': self.login,
-                        'GIT_PASSWORD': self.psw
-                    }
-                )
+            self._clone(repo, clone_path, branch)
             return {"status": 200, "answer": f"Репозиторий {repo} успешно склонирован", "path": str(clone_path)}
         except Exception as e:
             return {"status": 500, "answer": f"Ошибка клонирования: {str(e)}"}
 
+    def _prefetch_paths(self, repo: str) -> tuple:
+        """(каталог клона, файл блокировки, маркер готовности, маркер использования) предзагрузки"""
+        base = Path(self.clone_repo_path) / PREFETCH_DIR
+        return base / repo, base / f"{repo}.lock", base / f"{repo}.done", base / f"{repo}.taken"
+
+    def prefetch_clone(self, repo: str, branch: str = '') -> dict:
+        """Спекулятивно склонировать репозиторий для последующего git_clone
+
+        cloned=True в ответе - клонирование выполнено этим вызовом.
+        """
+        target, lock, done, taken = self._prefetch_paths(repo)
+        branch = branch or DEFAULT_BRANCH
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fresh = done.exists() and time() - done.stat().st_mtime < PREFETCH_CLONE_TTL
+        if fresh and self._prefetched_branch(lock, done) == branch:
+            return {"status": 200, "answer": "Клон уже подготовлен", "path": str(target)}
+        try:
+            # Эксклюзивное создание: один процесс клонирует, остальные ждут
+            with open(lock, "x", encoding="utf-8") as f:
+                f.write(json.dumps({"pid": os.getpid(), "branch": branch}))
+        except FileExistsError:
+            return {"status": 409, "answer": "Клонирование уже выполняется"}
+        try:
+            taken.unlink(missing_ok=True)
+            if target.exists():
+                shutil.rmtree(target)
+            self._clone(repo, target, branch)
+            done.write_text(json.dumps({"branch": branch}), encoding="utf-8")
+            return {"status": 200, "answer": f"Репозиторий {repo} подготовлен", "path": str(target), "cloned": True}
+        except Exception as e:
+            shutil.rmtree(target, ignore_errors=True)
+            return {"status": 500, "answer": f"Ошибка клонирования: {str(e)}"}
+        finally:
+            lock.unlink(missing_ok=True)
+
+    def _take_prefetched(self, repo: str, branch: str = '') -> bool:
+        """Переместить свежий спекулятивный клон на место клона репозитория"""
+        target, lock, done, taken = self._prefetch_paths(repo)
+        branch = branch or DEFAULT_BRANCH
+        # Клон другой ветки (или его отсутствие) не ждём
+        if self._prefetched_branch(lock, done) != branch:
+            return False
+        deadline = time() + PREFETCH_WAIT
+        while lock.exists() and time() < deadline:
+            sleep(0.2)
+        try:
+            marker = json.loads(done.read_text(encoding="utf-8"))
+            fresh = time() - done.stat().st_mtime < PREFETCH_CLONE_TTL
+            if not fresh or marker.get("branch") != branch:
+                return False
+            # Удаление маркера - захват клона: settle_prefetched его уже не удалит
+            done.unlink()
+        except (OSError, json.JSONDecodeError):
+            return False
+        clone_path = Path(self.clone_repo_path) / repo
+        try:
+            if clone_path.exists():
+                self._dell_repo(repo)
+            os.replace(target, clone_path)
+        except OSError:
+            return False
+        taken.write_text(json.dumps({"branch": branch}), encoding="utf-8")
+        return True
+
+    @staticmethod
+    def _prefetched_branch(lock: Path, done: Path):
+        """Ветка клона в работе (файл блокировки) или готового (маркер); None - клона нет"""
+        for path in (lock, done):
+            try:
+                return json.loads(path.read_text(encoding="utf-8")).get("branch")
+            except (OSError, json.JSONDecodeError, AttributeError):
+                continue
+        return None
+
+    def settle_prefetched(self, repo: str) -> str:
+        """Итог спекулятивного клона: taken - забран git_clone, discarded - не
+        востребован и удалён, missing - готового клона нет (клонируется или
+        уже убран)"""
+        target, _, done, taken = self._prefetch_paths(repo)
+        try:
+            # Захват маркера: клон, уже забираемый git_clone, не удаляется
+            done.unlink()
+        except FileNotFoundError:
+            if taken.exists():
+                taken.unlink(missing_ok=True)
+                return "taken"
+            return "missing"
+        shutil.rmtree(target, ignore_errors=True)
+        return "discarded"
+
     def ensure_branch_and_update(self, repo: str, branch: str) -> dict:
         """Переключение на ветку и обновление"""
         clone_path = Path(self.clone_repo_path) / repo
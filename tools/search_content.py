@@ -1,8 +1,9 @@
 """Семантический поиск по базе знаний"""
 from tools.bitbucket import ConnectionAPI
-from agent.tools.run_giga import llm
+from agent.tools.run_giga import llm, llm_stream
 from agent.prompts.prompts import sys_prompt_search
 from pathlib import Path
+import threading
 import pickle
 import os
 
@@ -12,6 +13,24 @@ try:
 except ImportError:
     HAS_FLAG_EMBEDDING = False
 
+# Загруженные модели BGE-M3 по пути: одна на процесс для поиска и классификатора
+_MODELS = {}
+_MODELS_LOCK = threading.Lock()
+
+
+def load_bge_model(path: str):
+    """Модель BGEM3FlagModel, общая для процесса (None - недоступна)"""
+    if not HAS_FLAG_EMBEDDING or not path:
+        return None
+    with _MODELS_LOCK:
+        if path not in _MODELS:
+            try:
+                _MODELS[path] = BGEM3FlagModel(path, use_fp16=True)
+            except Exception as e:
+                print(f"Ошибка загрузки модели: {e}")
+                return None
+        return _MODELS[path]
+
 
 class Search(ConnectionAPI):
     """Класс для семантического поиска с BGEM3FlagModel"""
@@ -28,17 +47,7 @@ class Search(ConnectionAPI):
 
     def initial_model(self):
         """Инициализация модели BGEM3FlagModel"""
-        if not HAS_FLAG_EMBEDDING:
-            return
-        
-        try:
-            self.model = BGEM3FlagModel(
-                self.path_model,
-                use_fp16=True
-            )
-        except Exception as e:
-            print(f"Ошибка загрузки модели: {e}")
-            self.model = None
+        self.model = load_bge_model(self.path_model)
 
     def get_texts(self) -> list:
         """Загрузка текстов из базы знаний (data_cards)"""
@@ -173,13 +182,23 @@ class Search(ConnectionAPI):
         prompt = sys_prompt_search.format(content=content)
         
         try:
-            answer = llm(query, prompt)
+            answer = llm(query, prompt, call_site="search.answer")
             return answer
         except Exception as e:
             return f"Ошибка генерации ответа: {str(e)}"
 
-    def run_tool(self, quest: str) -> dict:
-        """Главная функция поиска"""
+    def answer_llm_stream(self, query: str, chunks: list, metrics: dict = None):
+        """Потоковая генерация ответа: фрагменты текста по мере готовности
+
+        Ошибка генерации пробрасывается вызывающему коду (SSE событие error),
+        а не выдаётся как фрагмент ответа.
+        """
+        content = "\n\n---\n\n".join(chunks)
+        prompt = sys_prompt_search.format(content=content)
+        yield from llm_stream(query, prompt, call_site="search.answer", metrics=metrics)
+
+    def get_relevant(self, quest: str) -> dict:
+        """Поиск релевантных документов без генерации ответа"""
         if not quest:
             return {"status": 400, "answer": "Пустой запрос"}
         
@@ -211,11 +230,9 @@ class Search(ConnectionAPI):
             
             if matching:
                 chunks = [m["content"] for m in matching[:self.top_k]]
-                answer = self.answer_llm(quest, chunks)
                 
                 return {
                     "status": 200,
-                    "answer": answer,
                     "relevant_doc": {m["file"]: {"content": m["content"]} for m in matching[:3]},
                     "chunks": chunks,
                     "score": "keyword_match"
@@ -274,14 +291,19 @@ class Search(ConnectionAPI):
                 "score": "0"
             }
         
-        # Генерируем ответ
-        answer = self.answer_llm(quest, chunks)
         avg_score = sum(s for _, s in sorted_results) / len(sorted_results)
         
         return {
             "status": 200,
-            "answer": answer,
             "relevant_doc": relevant_doc,
             "chunks": chunks,
             "score": f"{avg_score:.4f}"
         }
+
+    def run_tool(self, quest: str, prefetched: dict = None) -> dict:
+        """Главная функция поиска; prefetched - готовый результат get_relevant"""
+        result = prefetched if prefetched else self.get_relevant(quest)
+        if result["status"] == 200:
+            # Генерируем ответ
+            result["answer"] = self.answer_llm(quest, result["chunks"])
+        return result
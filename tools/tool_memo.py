@@ -0,0 +1,132 @@
+"""Мемоизация инструментов по коммиту репозитория
+
+show_files, awerage_repo, rate_repository и gen_readme - чистые функции
+(репозиторий, голова ветки, конфигурация инструмента). Перед запуском
+ветка разрешается в sha последнего коммита (один запрос к BitBucket),
+ответ ищется по ключу (инструмент, репозиторий, sha, хэш конфигурации).
+Новый коммит в ветке даёт новый ключ, поэтому старый результат больше не
+используется без явной инвалидации; изменение кода, конфигов линтеров или
+моделей LLM меняет хэш конфигурации.
+
+Статистика:
+    python -m tools.tool_memo
+"""
+from agent.tools.llm_cache import LLMCache
+from agent.tools.settings import (
+    TOOL_CACHE_ENABLED,
+    TOOL_CACHE_PATH,
+    TOOL_CACHE_TTL,
+    TOOL_CACHE_MEMORY_SIZE,
+    TOOL_CACHE_MAX_ROWS,
+    MODEL_DEFAULT,
+    MODEL_LIGHT,
+    MODEL_TEMPERATURE,
+    ROUTES_FILE,
+    ROUTES_JSON,
+)
+from contextvars import ContextVar
+from functools import lru_cache
+from pathlib import Path
+from loguru import logger
+import hashlib
+import json
+import os
+
+# Файлы и каталоги, от которых зависит ответ инструмента (относительно корня проекта)
+TOOL_SOURCES = {
+    "show_files": ["tools/bitbucket.py"],
+    "awerage_repo": ["tools/evalution_repo", "tools/git.py"],
+    "rate_repository": ["tools/evalution_code", "tools/git.py"],
+    "gen_readme": ["tools/gen_main.py", "tools/git.py"],
+}
+
+# Переменные окружения с путями к конфигам линтеров вне проекта
+TOOL_CONFIG_ENV = {
+    "rate_repository": ["PYLINTRC", "PYLINTRC_IPYNB", "TOX"],
+}
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Вложенный вызов (локальный fallback run_tools) не разрешает ветку повторно
+_MEMO_ACTIVE = ContextVar("tool_memo_active", default=False)
+
+TOOL_CACHE = LLMCache(
+    path=TOOL_CACHE_PATH,
+    ttl=TOOL_CACHE_TTL,
+    memory_size=TOOL_CACHE_MEMORY_SIZE,
+    max_rows=TOOL_CACHE_MAX_ROWS,
+    enabled=TOOL_CACHE_ENABLED
+)
+
+
+def _source_files(path: Path) -> list:
+    if path.is_file():
+        return [path]
+    if path.is_dir():
+        return sorted(p for p in path.rglob("*") if p.is_file() and "__pycache__" not in p.parts)
+    return []
+
+
+@lru_cache(maxsize=None)
+def config_hash(name_tool: str) -> str:
+    """Хэш кода и конфигурации инструмента (считается один раз на процесс)"""
+    digest = hashlib.sha256(name_tool.encode("utf-8"))
+    paths = [ROOT / p for p in TOOL_SOURCES.get(name_tool, [])]
+    paths += [Path(os.environ[env]) for env in TOOL_CONFIG_ENV.get(name_tool, []) if os.getenv(env)]
+    for path in paths:
+        for file_path in _source_files(path):
+            digest.update(str(file_path.relative_to(ROOT) if file_path.is_relative_to(ROOT) else file_path).encode("utf-8"))
+            digest.update(file_path.read_bytes())
+    digest.update(json.dumps([MODEL_DEFAULT, MODEL_LIGHT, MODEL_TEMPERATURE, ROUTES_FILE, ROUTES_JSON]).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def head_commit(repo: str, branch: str) -> str:
+    """sha головы ветки или None, если BitBucket недоступен"""
+    from tools.bitbucket import ConnectionAPI
+    try:
+        result = ConnectionAPI().get_head_commit(repo, branch)
+    except Exception as e:
+        logger.debug(f"Голова ветки {repo}@{branch} не получена: {str(e)}")
+        return None
+    return result["answer"] if result.get("status") == 200 else None
+
+
+def memo_key(content: dict, sha: str) -> str:
+    """Ключ (инструмент, репозиторий, sha, хэш конфигурации, прочие параметры)"""
+    name_tool = content["name_tool"]
+    extra = {k: v for k, v in content.items() if k not in ("name_tool", "repository", "branch", "query")}
+    raw = json.dumps(
+        [name_tool, content.get("repository"), sha, config_hash(name_tool), extra],
+        ensure_ascii=False, sort_keys=True, default=str
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def memoized(content: dict, run) -> dict:
+    """Ответ инструмента из кэша по коммиту или run(content) с сохранением"""
+    name_tool = content.get("name_tool")
+    repo = content.get("repository")
+    if not TOOL_CACHE.enabled or name_tool not in TOOL_SOURCES or not repo or _MEMO_ACTIVE.get():
+        return run(content)
+    # Ветка по умолчанию та же, что у самих инструментов
+    sha = head_commit(repo, content.get("branch") or "master")
+    if sha is None:
+        return run(content)
+    key = memo_key(content, sha)
+    cached = TOOL_CACHE.get(key)
+    if cached is not None:
+        logger.info(f"Инструмент {name_tool}: ответ из кэша для {repo}@{sha[:10]}")
+        return json.loads(cached)
+    token = _MEMO_ACTIVE.set(True)
+    try:
+        output = run(content)
+    finally:
+        _MEMO_ACTIVE.reset(token)
+    if isinstance(output, dict) and output.get("status") == 200:
+        TOOL_CACHE.put(key, json.dumps(output, ensure_ascii=False))
+    return output
+
+
+if __name__ == "__main__":
+    print(json.dumps(TOOL_CACHE.stats(), ensure_ascii=False, indent=2))
@@ -1,6 +1,8 @@
 """Менеджер инструментов агента"""
-import requests
+from concurrent.futures import ThreadPoolExecutor
 from loguru import logger
+import contextvars
+import requests
 
 
 TOOLS_DESCRIPTION = """
@@ -41,6 +43,35 @@ def get_tools(data: dict) -> dict:
 
 
 def run_tools(content: dict, api_url: str = "http://localhost:5001") -> dict:
+    """Выполнить инструмент
+
+    Инструменты репозитория мемоизируются по sha головы ветки (tools.tool_memo)
+    и в сессию не пишутся, остальные в сессии агента берут ответ на те же
+    параметры из сессии;
+    в возобновлённом запуске готовые ответы берутся из журнала запуска.
+    """
+    from agent.memory.session_store import SESSIONS
+    from agent.memory.run_journal import JOURNAL
+    from tools.tool_memo import TOOL_SOURCES, memoized
+    # Возобновлённый запуск не повторяет инструменты, выполненные до сбоя
+    output = JOURNAL.lookup(content)
+    if output is not None:
+        logger.info(f"Инструмент {content.get('name_tool')}: ответ из журнала запуска")
+        return output
+    if content.get("name_tool") in TOOL_SOURCES:
+        output = memoized(content, lambda c: _run_tools_http(c, api_url))
+    else:
+        output = SESSIONS.lookup(content)
+        if output is not None:
+            logger.info(f"Инструмент {content.get('name_tool')}: ответ из сессии")
+            return output
+        output = _run_tools_http(content, api_url)
+        SESSIONS.remember(content, output)
+    JOURNAL.remember(content, output)
+    return output
+
+
+def _run_tools_http(content: dict, api_url: str = "http://localhost:5001") -> dict:
     """
     Выполнить инструмент через HTTP запрос к Flask API
     
@@ -73,6 +104,14 @@ def run_tools(content: dict, api_url: str = "http://localhost:5001") -> dict:
         logger.warning(f"Неизвестный инструмент: {name_tool}")
         return {"status": 404, "answer": f"Инструмент не найден: {name_tool}"}
     
+    # Результат поиска, заранее выполненного в run_agent для того же запроса,
+    # используется только в этом процессе: по HTTP он не передаётся
+    if name_tool == "search_content":
+        from agent.tools.prefetch import PREFETCHER
+        prefetched = PREFETCHER.take_search(content.get("query", ""))
+        if prefetched is not None:
+            return run_tools_local({**content, "prefetched": prefetched})
+    
     try:
         response = requests.post(
             f"{api_url}{endpoint}",
@@ -94,14 +133,20 @@ def run_tools(content: dict, api_url: str = "http://localhost:5001") -> dict:
 
 
 def run_tools_local(content: dict) -> dict:
-    """Локальное выполнение инструментов (без HTTP)"""
+    """Локальное выполнение инструментов (без HTTP) с мемоизацией по коммиту"""
+    from tools.tool_memo import memoized
+    return memoized(content, _run_tools_local)
+
+
+def _run_tools_local(content: dict) -> dict:
+    """Локальное выполнение инструмента"""
     name_tool = content.get("name_tool")
     
     try:
         if name_tool == "search_content":
             from tools.search_content import Search
             search = Search()
-            return search.run_tool(content.get("query", ""))
+            return search.run_tool(content.get("query", ""), prefetched=content.get("prefetched"))
         
         elif name_tool == "read_file":
             from tools.bitbucket import ConnectionAPI
@@ -139,3 +184,26 @@ def run_tools_local(content: dict) -> dict:
     except Exception as e:
         logger.error(f"Ошибка локального выполнения: {str(e)}")
         return {"status": 500, "answer": f"Ошибка: {str(e)}"}
+
+
+def run_tools_parallel(contents: list, max_workers: int = 4, api_url: str = "http://localhost:5001") -> list:
+    """Конкурентно выполнить независимые инструменты; результаты в порядке contents
+
+    Каждый инструмент выполняется в копии контекста вызывающего кода
+    (сессия GigaChat, профиль запроса), ошибка одного не прерывает остальные.
+    """
+    if len(contents) == 1:
+        return [run_tools(content=contents[0], api_url=api_url)]
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(contents)))) as pool:
+        futures = [
+            pool.submit(contextvars.copy_context().run, run_tools, content, api_url)
+            for content in contents
+        ]
+        results = []
+        for content, future in zip(contents, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                logger.error(f"Ошибка выполнения инструмента {content.get('name_tool')}: {str(e)}")
+                results.append({"status": 500, "answer": f"Ошибка: {str(e)}"})
+        return results